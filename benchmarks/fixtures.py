@@ -0,0 +1,113 @@
+"""
+Deterministic inputs for the benchmarks, generated in memory or in a
+temporary directory so the suite runs offline. Text is built from the words
+of tests/test_input.txt so it tokenizes like real subtitles.
+"""
+import json
+import os
+import random
+from typing import Any, Dict, Iterator, List
+
+SAMPLE_SRT = os.path.join(os.path.dirname(__file__), "..", "tests", "test_input.txt")
+
+
+def _words() -> List[str]:
+    with open(SAMPLE_SRT, encoding="utf-8") as f:
+        blocks = f.read().strip().split("\n\n")
+    words = []
+    for block in blocks:
+        for line in block.splitlines()[2:]:
+            words.extend(line.split())
+    return words
+
+
+def _sentence(rng: random.Random, words: List[str], low: int, high: int) -> str:
+    return " ".join(rng.choice(words) for _ in range(rng.randint(low, high)))
+
+
+def format_srt_time(ms: int) -> str:
+    hours, ms = divmod(ms, 3600_000)
+    minutes, ms = divmod(ms, 60_000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def make_srt(cues: int, seed: int = 0) -> str:
+    """An SRT with ``cues`` entries of one or two lines, like a long talk's subtitles."""
+    rng = random.Random(seed)
+    words = _words()
+    blocks = []
+    start = 1000
+    for index in range(1, cues + 1):
+        end = start + rng.randint(800, 6000)
+        lines = [_sentence(rng, words, 3, 12) for _ in range(rng.randint(1, 2))]
+        blocks.append(f"{index}\n{format_srt_time(start)} --> {format_srt_time(end)}\n" + "\n".join(lines))
+        start = end + rng.randint(0, 500)
+    return "\n\n".join(blocks) + "\n"
+
+
+def make_srt_times(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [format_srt_time(rng.randint(0, 10 * 3600_000)) for _ in range(count)]
+
+
+def make_text(size_bytes: int, seed: int = 0) -> str:
+    """Plain prose of about ``size_bytes``, in paragraphs, as sent to /translate/chunks."""
+    rng = random.Random(seed)
+    words = _words()
+    paragraphs = []
+    size = 0
+    while size < size_bytes:
+        paragraph = ". ".join(_sentence(rng, words, 6, 20) for _ in range(rng.randint(2, 6))) + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 2
+    return "\n\n".join(paragraphs)
+
+
+def make_progress_events(files: int, updates_per_file: int) -> Iterator[Dict[str, Any]]:
+    """yt-dlp progress hook payloads for fragment downloads: many ``downloading`` updates, then ``finished``."""
+    total = 50 * 1024 * 1024
+    for n in range(files):
+        filename = f"/downloads/abc/Video.f{n}.mp4"
+        for i in range(1, updates_per_file + 1):
+            yield {
+                "status": "downloading", "filename": filename,
+                "downloaded_bytes": total * i // updates_per_file, "total_bytes": total,
+                "fragment_index": i, "fragment_count": updates_per_file,
+                "speed": 5e6, "eta": updates_per_file - i, "elapsed": i * 0.1,
+            }
+        yield {"status": "finished", "filename": filename, "downloaded_bytes": total, "total_bytes": total}
+
+
+def make_video_dir(root: str, video_id: str, languages: int, cues: int, thumbnail_bytes: int) -> Dict[str, Any]:
+    """
+    Writes a downloaded video's directory (subtitles, an incompressible
+    thumbnail and a small mp4) and returns a manifest listing the files.
+    """
+    path = os.path.join(root, video_id)
+    os.makedirs(path, exist_ok=True)
+    files = {}
+    for n in range(languages):
+        name = f"Benchmark video.l{n}.srt"
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            f.write(make_srt(cues, seed=n))
+        files[name] = {}
+    rng = random.Random(0)
+    for name, size in (("Benchmark video.webp", thumbnail_bytes), ("Benchmark video.mp4", 1024)):
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(rng.randbytes(size))
+        files[name] = {}
+    manifest = {"version": 1, "title": "Benchmark video", "files": files}
+    with open(os.path.join(path, ".manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def make_bilibili_meta(cover: str) -> Dict[str, Any]:
+    return {
+        "tid": 17,
+        "title": "Benchmark video " * 4,
+        "tags": [f"tag{n}" for n in range(10)],
+        "desc": "A description. " * 120,
+        "cover": cover,
+    }
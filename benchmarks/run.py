@@ -0,0 +1,190 @@
+"""
+Runs the offline micro-benchmarks and saves the results as JSON.
+
+    python -m benchmarks                       # full sizes, saved under benchmarks/results/
+    python -m benchmarks --quick -k srt        # smaller inputs, only matching benchmarks
+    python -m benchmarks --compare benchmarks/results/baseline.json --threshold 0.2
+
+With ``--compare`` the run exits with status 1 when a benchmark's fastest
+round is more than ``--threshold`` slower than in the given results file;
+the minimum is the figure least affected by other load on the machine.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+class Benchmark:
+    """
+    A named benchmark. ``setup(scale)`` builds the inputs once and returns
+    the function to time plus the amount of work one call does (e.g.
+    ``{"bytes": n}``), used to report throughput.
+    """
+
+    def __init__(self, name: str, setup: Callable[[float], Tuple[Callable[[], Any], Dict[str, int]]]):
+        self.name = name
+        self.setup = setup
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS.append(Benchmark(name, setup))
+        return setup
+    return register
+
+
+def measure(fn: Callable[[], Any], rounds: int = 5, min_time: float = 0.2, clock=time.perf_counter) -> Dict[str, Any]:
+    """
+    Times ``fn`` like timeit's autorange: the loop count per round doubles
+    until a round takes ``min_time``, then ``rounds`` rounds are timed.
+    Times are per call.
+    """
+    loops = 1
+    while True:
+        started = clock()
+        for _ in range(loops):
+            fn()
+        elapsed = clock() - started
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+    times = [elapsed / loops]
+    for _ in range(rounds - 1):
+        started = clock()
+        for _ in range(loops):
+            fn()
+        times.append((clock() - started) / loops)
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "mean": statistics.fmean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "loops": loops,
+        "rounds": len(times),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(benchmarks: List[Benchmark], scale: float, rounds: int, min_time: float) -> Dict[str, Any]:
+    results = {}
+    for bench in benchmarks:
+        fn, work = bench.setup(scale)
+        stats = measure(fn, rounds, min_time)
+        stats["work"] = work
+        stats["throughput"] = {unit: amount / stats["median"] for unit, amount in work.items()}
+        results[bench.name] = stats
+        print(f"{bench.name:<40} {format_seconds(stats['median']):>10}  "
+              f"{format_throughput(stats['throughput'])}", flush=True)
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "benchmarks": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Ratios of the fastest rounds (current / baseline) for benchmarks in both runs, flagged beyond ``threshold``."""
+    rows = []
+    for name, stats in current["benchmarks"].items():
+        before = baseline.get("benchmarks", {}).get(name)
+        if not before:
+            continue
+        ratio = stats["min"] / before["min"]
+        rows.append({"name": name, "before": before["min"], "after": stats["min"],
+                     "ratio": ratio, "regression": ratio > 1 + threshold})
+    return rows
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, factor in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= factor:
+            return f"{seconds / factor:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def format_throughput(throughput: Dict[str, float]) -> str:
+    parts = []
+    for unit, rate in throughput.items():
+        if unit == "bytes":
+            parts.append(f"{rate / 1024 / 1024:.1f} MiB/s")
+        else:
+            parts.append(f"{rate:,.0f} {unit}/s")
+    return ", ".join(parts)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for the service's hot functions.")
+    parser.add_argument("-k", dest="keyword", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="Quarter-size inputs and 3 rounds, e.g. for CI")
+    parser.add_argument("--scale", type=float, help="Input size multiplier (default: 1, or 0.25 with --quick)")
+    parser.add_argument("--rounds", type=int, help="Timed rounds per benchmark (default: 5, or 3 with --quick)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per round (default: 0.2)")
+    parser.add_argument("--save", help="Results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--no-save", action="store_true", help="Do not write a results file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown before a benchmark counts as regressed (default: 0.2)")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    from . import suite  # noqa: F401  (registers the benchmarks)
+
+    selected = [b for b in BENCHMARKS if not args.keyword or args.keyword in b.name]
+    if args.list:
+        for bench in selected:
+            print(bench.name)
+        return 0
+    if not selected:
+        print(f"No benchmarks match '{args.keyword}'.", file=sys.stderr)
+        return 2
+
+    scale = args.scale if args.scale is not None else (0.25 if args.quick else 1.0)
+    rounds = args.rounds if args.rounds is not None else (3 if args.quick else 5)
+    results = run(selected, scale, rounds, args.min_time)
+
+    if not args.no_save:
+        path = args.save
+        if not path:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit'] or 'nogit'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != scale:
+            print(f"Warning: baseline was run with --scale {baseline.get('scale')}, this run with {scale}.")
+        rows = compare(results, baseline, args.threshold)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<40} {format_seconds(row['before']):>10} -> {format_seconds(row['after']):>10}"
+                  f"  x{row['ratio']:.2f} {flag}")
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
@@ -0,0 +1,119 @@
+"""
+The benchmarks. Each setup builds its inputs from benchmarks.fixtures and
+returns the call to time; service modules are imported lazily so ``-k``
+only pays for what it runs.
+"""
+import asyncio
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+from . import fixtures
+from .run import ROOT, benchmark
+
+sys.path.insert(0, ROOT)
+# The tokenizer files ship in data/; without this tiktoken would download them.
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", os.path.join(ROOT, "data"))
+
+_workdir = tempfile.mkdtemp(prefix="yt-bench-")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+# Read by the youtube and storage modules at import and on each call.
+os.environ["VIDEO_DOWNLOAD_PATH"] = _workdir
+
+
+def _scaled(n: int, scale: float) -> int:
+    return max(1, int(n * scale))
+
+
+@benchmark("srt_time_to_seconds")
+def srt_time_to_seconds(scale):
+    from src.bilibili.uploader import srt_time_to_seconds
+    times = fixtures.make_srt_times(_scaled(10_000, scale))
+
+    def run():
+        for t in times:
+            srt_time_to_seconds(t)
+    return run, {"timestamps": len(times)}
+
+
+@benchmark("parse_srt_to_bilibili_body")
+def parse_srt(scale):
+    from src.bilibili.uploader import parse_srt_to_bilibili_body
+    srt = fixtures.make_srt(_scaled(20_000, scale))
+    return (lambda: parse_srt_to_bilibili_body(srt)), {"bytes": len(srt.encode("utf-8"))}
+
+
+@benchmark("num_tokens_in_string")
+def num_tokens(scale):
+    from src.translate.utils import num_tokens_in_string
+    text = fixtures.make_text(_scaled(4 * 1024 * 1024, scale))
+    return (lambda: num_tokens_in_string(text)), {"bytes": len(text.encode("utf-8"))}
+
+
+@benchmark("calculate_chunk_size")
+def chunk_size(scale):
+    from src.translate.utils import MAX_TOKENS_PER_CHUNK, calculate_chunk_size
+    counts = range(1, _scaled(100_000, scale), 7)
+
+    def run():
+        for count in counts:
+            calculate_chunk_size(count, MAX_TOKENS_PER_CHUNK)
+    return run, {"calls": len(counts)}
+
+
+@benchmark("translate_chunks_splitter")
+def chunks_splitter(scale):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from src.translate.utils import MAX_TOKENS_PER_CHUNK, calculate_chunk_size, num_tokens_in_string
+    text = fixtures.make_text(_scaled(2 * 1024 * 1024, scale))
+    # Same splitter configuration as /translate/chunks for a text of this size.
+    token_size = calculate_chunk_size(num_tokens_in_string(text), MAX_TOKENS_PER_CHUNK)
+    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name="gpt-4", chunk_size=token_size, chunk_overlap=0)
+    return (lambda: splitter.split_text(text)), {"bytes": len(text.encode("utf-8"))}
+
+
+@benchmark("progress_logger_hook")
+def progress_hook(scale):
+    from src.youtube.router import ProgressLogger
+    events = list(fixtures.make_progress_events(files=4, updates_per_file=_scaled(5_000, scale)))
+
+    def run():
+        hook = ProgressLogger().hook
+        for event in events:
+            hook(event)
+    return run, {"calls": len(events)}
+
+
+@benchmark("download_zip_response")
+def zip_response(scale):
+    from src.youtube.router import build_zip_response
+    video_id = "benchzip"
+    manifest = fixtures.make_video_dir(_workdir, video_id, languages=8, cues=_scaled(4_000, scale),
+                                       thumbnail_bytes=_scaled(8 * 1024 * 1024, scale))
+    size = sum(os.path.getsize(os.path.join(_workdir, video_id, name))
+               for name in manifest["files"] if not name.endswith(".mp4"))
+
+    async def drain():
+        response = build_zip_response(manifest, video_id)
+        async for _ in response.body_iterator:
+            pass
+
+    return (lambda: asyncio.run(drain())), {"bytes": size}
+
+
+@benchmark("enhanced_video_meta_validator")
+def meta_validator(scale):
+    from src.bilibili.robust_uploader import EnhancedVideoMetaValidator
+    cover = os.path.join(_workdir, "cover.jpg")
+    with open(cover, "wb") as f:
+        f.write(b"\xff\xd8\xff")
+    meta = fixtures.make_bilibili_meta(cover)
+    batch = _scaled(1_000, scale)
+
+    def run():
+        for _ in range(batch):
+            EnhancedVideoMetaValidator(meta).validate()
+    return run, {"calls": batch}
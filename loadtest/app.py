@@ -0,0 +1,43 @@
+"""
+The API gateway as launched by the load-test harness:
+
+    LOADTEST_BILIBILI_URL=http://127.0.0.1:<port> uvicorn loadtest.app:app
+
+Before importing the app it registers a bilibili_api request client that
+sends every request to the FakeBilibili stand-in instead, putting the
+original host in front of the path
+(``https://member.bilibili.com/preupload`` becomes
+``<LOADTEST_BILIBILI_URL>/member.bilibili.com/preupload``). YouTube needs no
+patching here: the stub extractor in loadtest/plugins only matches the fake
+site's URLs.
+"""
+import os
+from urllib.parse import urlsplit, urlunsplit
+
+from bilibili_api import request_settings
+from bilibili_api.clients.HTTPXClient import HTTPXClient
+from bilibili_api.utils.network import register_client
+
+STANDIN_URL = os.environ["LOADTEST_BILIBILI_URL"].rstrip("/")
+
+
+def rewrite(url: str) -> str:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or f"{parts.scheme}://{parts.netloc}" == STANDIN_URL:
+        return url
+    standin = urlsplit(STANDIN_URL)
+    return urlunsplit((standin.scheme, standin.netloc, f"/{parts.netloc}{parts.path}", parts.query, ""))
+
+
+class StandInClient(HTTPXClient):
+    """HTTPXClient that sends every request to the Bilibili stand-in."""
+
+    async def request(self, method: str = "", url: str = "", *args, **kwargs):
+        return await super().request(method, rewrite(url), *args, **kwargs)
+
+
+register_client("loadtest", StandInClient, {"http2": False})
+# Local traffic must not go through a proxy picked up from the environment.
+request_settings.set_trust_env(False)
+
+from src.api_gateway.main import app  # noqa: E402
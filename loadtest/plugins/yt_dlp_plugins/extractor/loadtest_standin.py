@@ -0,0 +1,17 @@
+"""
+yt-dlp extractor for the load-test harness's fake video site
+(loadtest.standins.FakeYouTube). yt-dlp loads it as a plugin when
+loadtest/plugins is on the app's PYTHONPATH; it only matches
+http://127.0.0.1:<port>/watch?v=<id>, so real URLs are unaffected.
+"""
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class LoadTestStandInIE(InfoExtractor):
+    IE_NAME = 'loadtest:standin'
+    _VALID_URL = r'https?://(?:127\.0\.0\.1|localhost):(?P<port>\d+)/watch\?v=(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        port, video_id = self._match_valid_url(url).group('port', 'id')
+        # The stand-in answers with a complete info dict (formats, subtitles, thumbnail).
+        return self._download_json(f'http://127.0.0.1:{port}/api/videos/{video_id}', video_id)
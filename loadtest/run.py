@@ -0,0 +1,367 @@
+"""
+End-to-end load test: starts the API gateway (loadtest.app) under uvicorn
+against local YouTube and Bilibili stand-ins, sends a mix of /info,
+/download, /translate/chunks and /bilibili/upload requests at fixed rates
+and reports throughput, latency percentiles and error rates per endpoint.
+
+    python -m loadtest                                  # default mix for 30s
+    python -m loadtest --quick                          # 10s, e.g. for CI
+    python -m loadtest --rate info=20 --rate upload=0   # change the mix
+    python -m loadtest --compare loadtest/results/baseline.json --threshold 0.2
+
+Arrivals are open-loop (Poisson, seeded), so a slow server shows up as
+growing latency rather than as fewer requests sent. With ``--compare`` the
+run exits with status 1 when an endpoint's p95 is more than ``--threshold``
+slower than in the given results file or its error rate rose by more than
+``--error-threshold``; any endpoint above ``--max-error-rate`` fails the run
+on its own.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks import fixtures
+from benchmarks.run import ROOT, format_seconds, git_commit
+
+from .standins import FakeBilibili, FakeYouTube
+
+RESULTS_DIR = os.path.join(ROOT, "loadtest", "results")
+PLUGINS_DIR = os.path.join(ROOT, "loadtest", "plugins")
+
+DEFAULT_RATES = {"info": 4.0, "download": 2.0, "translate": 2.0, "upload": 0.5}
+
+
+class Context:
+    """What the request builders need: the stand-ins and the pools of ids and inputs to draw from."""
+
+    def __init__(self, youtube: FakeYouTube, videos: List[str], upload_videos: List[str], text: str, seed: int):
+        self.youtube = youtube
+        self.videos = videos
+        self.upload_videos = upload_videos
+        self.text = text
+        self.rng = random.Random(seed)
+
+
+async def request_info(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.post("/api/v1/youtube/info", json={"url": ctx.youtube.watch_url(ctx.rng.choice(ctx.videos))})
+
+
+async def request_download(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.post("/api/v1/youtube/download",
+                             json={"url": ctx.youtube.watch_url(ctx.rng.choice(ctx.videos)), "subtitles": ["en"]})
+
+
+async def request_translate(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.post("/api/v1/translate/chunks", data={"id": "1", "filename": "loadtest.txt"},
+                             files={"file": ("loadtest.txt", ctx.text.encode("utf-8"), "text/plain")})
+
+
+async def request_upload(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.post("/api/v1/bilibili/upload", json={
+        "video_id": ctx.rng.choice(ctx.upload_videos), "tid": 17, "title": "Load test upload",
+        "tags": ["loadtest"], "desc": "Uploaded to the load-test stand-in.", "pages": [{"title": "P1"}],
+    })
+
+
+REQUESTS: Dict[str, Callable[[httpx.AsyncClient, Context], Any]] = {
+    "info": request_info,
+    "download": request_download,
+    "translate": request_translate,
+    "upload": request_upload,
+}
+
+
+def arrivals(rates: Dict[str, float], duration: float, rng: random.Random) -> List[tuple]:
+    """(offset, endpoint) pairs of a Poisson process per endpoint over ``duration`` seconds, in time order."""
+    schedule = []
+    for name, rate in rates.items():
+        if rate <= 0:
+            continue
+        at = rng.expovariate(rate)
+        while at < duration:
+            schedule.append((at, name))
+            at += rng.expovariate(rate)
+    return sorted(schedule)
+
+
+async def drive(base_url: str, ctx: Context, rates: Dict[str, float], duration: float,
+                timeout: float) -> List[Dict[str, Any]]:
+    """Sends the scheduled requests and returns one sample per request."""
+    samples = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=64)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, trust_env=False) as client:
+        async def send(name: str):
+            started = time.perf_counter()
+            try:
+                response = await REQUESTS[name](client, ctx)
+                status, ok = response.status_code, response.status_code < 400
+            except httpx.HTTPError as e:
+                status, ok = type(e).__name__, False
+            samples.append({"endpoint": name, "latency": time.perf_counter() - started, "ok": ok, "status": status})
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = []
+        for offset, name in arrivals(rates, duration, ctx.rng):
+            delay = start + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(name)))
+        await asyncio.gather(*tasks)
+    return samples
+
+
+def percentile(values: List[float], q: float) -> float:
+    """The ``q``-th percentile (0-100) of sorted ``values``, interpolating between ranks."""
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Dict[str, Any]]:
+    """Per-endpoint counts, error rate, throughput (successful requests/s) and latency percentiles."""
+    endpoints = {}
+    for name in sorted({s["endpoint"] for s in samples}):
+        mine = [s for s in samples if s["endpoint"] == name]
+        latencies = sorted(s["latency"] for s in mine)
+        errors = sum(1 for s in mine if not s["ok"])
+        statuses: Dict[str, int] = {}
+        for s in mine:
+            statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+        endpoints[name] = {
+            "requests": len(mine),
+            "errors": errors,
+            "error_rate": errors / len(mine),
+            "throughput": (len(mine) - errors) / elapsed if elapsed > 0 else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1],
+            "statuses": statuses,
+        }
+    return endpoints
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            error_threshold: float) -> List[Dict[str, Any]]:
+    """p95 ratios (current / baseline) and error rate changes for endpoints in both runs, flagged beyond the thresholds."""
+    rows = []
+    for name, stats in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        ratio = stats["p95"] / before["p95"] if before["p95"] else 1.0
+        error_delta = stats["error_rate"] - before["error_rate"]
+        rows.append({"name": name, "before": before["p95"], "after": stats["p95"], "ratio": ratio,
+                     "error_delta": error_delta,
+                     "regression": ratio > 1 + threshold or error_delta > error_threshold})
+    return rows
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    try:
+        return subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "loadtest.app:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    finally:
+        log.close()
+
+
+def wait_ready(proc: subprocess.Popen, base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"The app exited with status {proc.returncode} during startup.")
+        try:
+            if httpx.get(base_url + "/", timeout=1.0, trust_env=False).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"The app did not answer within {timeout:.0f}s.")
+
+
+def stop_app(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def app_env(workdir: str, bilibili: FakeBilibili, log_level: str) -> Dict[str, str]:
+    credentials = os.path.join(workdir, "bilibili_credentials.json")
+    with open(credentials, "w", encoding="utf-8") as f:
+        json.dump({"sessdata": "loadtest", "bili_jct": "loadtest", "buvid3": "loadtest", "dedeuserid": "1"}, f)
+    env = dict(os.environ)
+    no_proxy = ",".join(filter(None, [env.get("NO_PROXY"), "127.0.0.1", "localhost"]))
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, PLUGINS_DIR, env.get("PYTHONPATH")])),
+        "VIDEO_DOWNLOAD_PATH": os.path.join(workdir, "downloads"),
+        "BILIBILI_CREDENTIALS_FILE": credentials,
+        "LOADTEST_BILIBILI_URL": bilibili.url,
+        "N8N_WEBHOOK_URL": bilibili.url + "/webhook",
+        "CHECK_READY_RETRY_DELAY": "1",
+        "TIKTOKEN_CACHE_DIR": env.get("TIKTOKEN_CACHE_DIR", os.path.join(ROOT, "data")),
+        "LOG_LEVEL": log_level,
+        "NO_PROXY": no_proxy,
+        "no_proxy": no_proxy,
+    })
+    return env
+
+
+def warm_up(base_url: str, ctx: Context, timeout: float):
+    """Downloads the videos the upload traffic uses, so /bilibili/upload finds their directories."""
+    with httpx.Client(base_url=base_url, timeout=timeout, trust_env=False) as client:
+        for video_id in ctx.upload_videos:
+            response = client.post("/api/v1/youtube/download", json={"url": ctx.youtube.watch_url(video_id)})
+            if response.status_code != 200:
+                raise RuntimeError(f"Warm-up download of {video_id} failed with {response.status_code}: "
+                                   f"{response.text[:200]}")
+
+
+def print_report(endpoints: Dict[str, Dict[str, Any]]):
+    print(f"{'endpoint':<12} {'requests':>8} {'errors':>7} {'req/s':>7} {'p50':>10} {'p95':>10} "
+          f"{'p99':>10} {'max':>10}")
+    for name, stats in endpoints.items():
+        print(f"{name:<12} {stats['requests']:>8} {stats['error_rate']:>7.1%} {stats['throughput']:>7.2f} "
+              f"{format_seconds(stats['p50']):>10} {format_seconds(stats['p95']):>10} "
+              f"{format_seconds(stats['p99']):>10} {format_seconds(stats['max']):>10}")
+
+
+def parse_rates(values: List[str]) -> Dict[str, float]:
+    rates = dict(DEFAULT_RATES)
+    for value in values:
+        name, _, rate = value.partition("=")
+        if name not in REQUESTS or not rate:
+            raise argparse.ArgumentTypeError(f"--rate expects one of {', '.join(REQUESTS)}=<requests/s>, got {value!r}")
+        rates[name] = float(rate)
+    return rates
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end load test against local YouTube and Bilibili stand-ins.")
+    parser.add_argument("--duration", type=float, help="Seconds of traffic (default: 30, or 10 with --quick)")
+    parser.add_argument("--quick", action="store_true", help="Shorter run, e.g. for CI")
+    parser.add_argument("--rate", action="append", default=[], metavar="ENDPOINT=RPS",
+                        help="Requests per second for info, download, translate or upload "
+                             f"(default: {', '.join(f'{k}={v:g}' for k, v in DEFAULT_RATES.items())})")
+    parser.add_argument("--videos", type=int, default=100, help="Distinct video ids for /info and /download (default: 100)")
+    parser.add_argument("--upload-videos", type=int, default=3, help="Videos downloaded before the run for /bilibili/upload (default: 3)")
+    parser.add_argument("--video-size", type=float, default=2, help="Size of the fake videos in MiB (default: 2)")
+    parser.add_argument("--youtube-latency", type=float, default=0.05, help="Seconds added to each fake extraction (default: 0.05)")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds (default: 60)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for arrivals and id choice (default: 0)")
+    parser.add_argument("--port", type=int, help="Port for the app (default: a free one)")
+    parser.add_argument("--log-level", default="INFO", help="LOG_LEVEL for the app (default: INFO)")
+    parser.add_argument("--save", help="Results file (default: loadtest/results/<time>-<commit>.json)")
+    parser.add_argument("--no-save", action="store_true", help="Do not write a results file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed p95 slowdown before an endpoint counts as regressed (default: 0.2)")
+    parser.add_argument("--error-threshold", type=float, default=0.01,
+                        help="Allowed error rate increase over the baseline (default: 0.01)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01,
+                        help="Fail when any endpoint's error rate is above this (default: 0.01)")
+    args = parser.parse_args(argv)
+    try:
+        rates = parse_rates(args.rate)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    duration = args.duration if args.duration is not None else (10.0 if args.quick else 30.0)
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    commit = git_commit()
+    save_path = None if args.no_save else (args.save or os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'nogit'}.json"))
+    workdir = tempfile.mkdtemp(prefix="yt-loadtest-")
+    log_path = os.path.splitext(save_path)[0] + ".log" if save_path else os.path.join(workdir, "app.log")
+    os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    youtube = FakeYouTube(video_size=int(args.video_size * 1024 * 1024), latency=args.youtube_latency).start()
+    bilibili = FakeBilibili().start()
+    port = args.port or free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    ctx = Context(youtube, [f"lt{n:09d}" for n in range(args.videos)],
+                  [f"lu{n:09d}" for n in range(args.upload_videos)],
+                  fixtures.make_text(64 * 1024), args.seed)
+    proc = start_app(port, app_env(workdir, bilibili, args.log_level), log_path)
+    try:
+        wait_ready(proc, base_url)
+        if rates.get("upload", 0) > 0:
+            warm_up(base_url, ctx, args.timeout)
+        print(f"Sending {', '.join(f'{k}={v:g}/s' for k, v in rates.items())} for {duration:g}s "
+              f"(app log: {log_path})", flush=True)
+        started = time.perf_counter()
+        samples = asyncio.run(drive(base_url, ctx, rates, duration, args.timeout))
+        elapsed = time.perf_counter() - started
+    except RuntimeError as e:
+        print(f"{e} See {log_path}", file=sys.stderr)
+        return 2
+    finally:
+        stop_app(proc)
+        youtube.stop()
+        bilibili.stop()
+        # Without a results file the app log stays in the work directory.
+        shutil.rmtree(workdir if save_path else os.path.join(workdir, "downloads"), ignore_errors=True)
+
+    endpoints = summarize(samples, elapsed)
+    print_report(endpoints)
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "duration": duration,
+        "elapsed": elapsed,
+        "rates": rates,
+        "video_size": len(youtube.video),
+        "endpoints": endpoints,
+        "standins": {"youtube": youtube.stats(), "bilibili": bilibili.stats()},
+    }
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {save_path}")
+
+    failed = False
+    for name, stats in endpoints.items():
+        if stats["error_rate"] > args.max_error_rate:
+            print(f"{name}: error rate {stats['error_rate']:.1%} is above {args.max_error_rate:.1%} "
+                  f"({stats['statuses']})")
+            failed = True
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("rates") != rates or baseline.get("duration") != duration:
+            print("Warning: the baseline was run with different rates or duration.")
+        rows = compare(results, baseline, args.threshold, args.error_threshold)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<12} p95 {format_seconds(row['before']):>10} -> {format_seconds(row['after']):>10}"
+                  f"  x{row['ratio']:.2f}  errors {row['error_delta']:+.1%} {flag}")
+        failed = failed or any(row["regression"] for row in rows)
+    return 1 if failed else 0
@@ -0,0 +1,323 @@
+"""
+Local stand-ins for the two upstreams the service talks to, so the load test
+never leaves the machine:
+
+* FakeYouTube serves an info dict per video id (read by the stub extractor
+  in loadtest/plugins), a combined mp4 format, SRT subtitles and a PNG
+  thumbnail.
+* FakeBilibili answers the creator API and the upos upload endpoints
+  (preupload, upload id, chunk PUTs, complete, cover, submit) plus the
+  view/pagelist/subtitle calls made after an upload and the n8n webhook.
+  loadtest.app rewrites bilibili_api's requests to it, keeping the original
+  host as the first path segment.
+
+Both run a ThreadingHTTPServer on a daemon thread and count what they served.
+"""
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from bilibili_api import aid2bvid, bvid2aid
+
+from benchmarks import fixtures
+
+SUBTITLE_LANGUAGES = ("en", "zh-Hans")
+
+
+def make_png(width: int = 64, height: int = 36, rgb: Tuple[int, int, int] = (32, 96, 160)) -> bytes:
+    """A valid single-colour PNG; bilibili_api decodes the cover with Pillow."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    row = b"\x00" + bytes(rgb) * width
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height))
+            + chunk(b"IEND", b""))
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """The inclusive (start, end) of a single ``bytes=`` range, or None to send the whole body."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].partition("-")
+    try:
+        if not start:
+            first = max(0, size - int(end))
+            return first, size - 1
+        first = int(start)
+        last = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    if first > last:
+        return None
+    return first, last
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send(self, status: int, body: bytes, content_type: str = "application/json", headers: Dict[str, str] = {}):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_json(self, payload: Any, status: int = 200):
+        self.send(status, json.dumps(payload).encode("utf-8"))
+
+
+class _StandIn:
+    handler = _Handler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        handler = type(self.handler.__name__, (self.handler,), {"standin": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def start(self) -> "_StandIn":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+class _YouTubeHandler(_Handler):
+    standin: "FakeYouTube"
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        site = self.standin
+        path = urlparse(self.path).path
+        parts = path.strip("/").split("/")
+        if len(parts) != 3:
+            return self.send_json({"error": f"unknown path {path}"}, 404)
+        kind, video_id, name = parts
+        if kind == "api" and video_id == "videos":
+            site.count("info")
+            if site.latency:
+                time.sleep(site.latency)
+            return self.send_json(site.info(name))
+        if kind == "media":
+            site.count("media")
+            return self.send_media(site.video)
+        if kind == "subs":
+            site.count("subtitles")
+            lang = name.rsplit(".", 2)[-2]
+            return self.send(200, site.subtitles(video_id, lang).encode("utf-8"), "application/x-subrip")
+        if kind == "thumb":
+            site.count("thumbnails")
+            return self.send(200, site.thumbnail, "image/png")
+        self.send_json({"error": f"unknown path {path}"}, 404)
+
+    def send_media(self, body: bytes):
+        byte_range = parse_range(self.headers.get("Range"), len(body))
+        if byte_range is None:
+            self.standin.count("media_bytes", len(body))
+            return self.send(200, body, "video/mp4", {"Accept-Ranges": "bytes"})
+        first, last = byte_range
+        self.standin.count("media_bytes", last - first + 1)
+        self.send(206, body[first:last + 1], "video/mp4",
+                  {"Accept-Ranges": "bytes", "Content-Range": f"bytes {first}-{last}/{len(body)}"})
+
+
+class FakeYouTube(_StandIn):
+    """
+    The fake video site. Every video id exists and has the same ``video_size``
+    byte mp4; ``latency`` is added to each info lookup to stand in for the
+    page and player requests a real extraction makes.
+    """
+    handler = _YouTubeHandler
+
+    def __init__(self, video_size: int = 2 * 1024 * 1024, subtitle_cues: int = 400, latency: float = 0.05, **kwargs):
+        super().__init__(**kwargs)
+        self.video = random.Random(0).randbytes(video_size)
+        self.subtitle_cues = subtitle_cues
+        self.latency = latency
+        self.thumbnail = make_png()
+
+    def watch_url(self, video_id: str) -> str:
+        return f"{self.url}/watch?v={video_id}"
+
+    def subtitles(self, video_id: str, lang: str) -> str:
+        seed = int(hashlib.sha1(f"{video_id}.{lang}".encode()).hexdigest()[:8], 16)
+        return fixtures.make_srt(self.subtitle_cues, seed=seed)
+
+    def info(self, video_id: str) -> Dict[str, Any]:
+        base = self.url
+        return {
+            "id": video_id,
+            "title": f"Load test video {video_id}",
+            "description": "A video served by the load-test stand-in.",
+            "uploader": "loadtest",
+            "duration": 600,
+            "webpage_url": self.watch_url(video_id),
+            "formats": [{
+                "format_id": "18", "url": f"{base}/media/{video_id}/video.mp4", "ext": "mp4",
+                "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "width": 640, "height": 360,
+                "filesize": len(self.video), "protocol": "http",
+            }],
+            "subtitles": {
+                lang: [{"ext": "srt", "url": f"{base}/subs/{video_id}/{video_id}.{lang}.srt"}]
+                for lang in SUBTITLE_LANGUAGES
+            },
+            "thumbnails": [{"url": f"{base}/thumb/{video_id}/thumbnail.png", "width": 64, "height": 36}],
+        }
+
+
+class _BilibiliHandler(_Handler):
+    standin: "FakeBilibili"
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def do_PUT(self):
+        self.dispatch()
+
+    def dispatch(self):
+        site = self.standin
+        url = urlparse(self.path)
+        body = self.read_body()
+        if url.path == "/webhook":
+            site.count("webhook")
+            return self.send_json({"ok": True})
+        host, _, path = url.path.lstrip("/").partition("/")
+        path = "/" + path
+        query = parse_qs(url.query, keep_blank_values=True)
+        if site.latency:
+            time.sleep(site.latency)
+
+        if host.startswith("upos-"):
+            return self.upos(path, query, body)
+        if path == "/preupload":
+            site.count("preupload")
+            n = site.next_id()
+            return self.send_json({
+                "OK": 1, "auth": "loadtest", "biz_id": n, "chunk_size": site.chunk_size, "threads": 3,
+                "endpoint": "//upos-cs-upcdnbda2.bilivideo.com", "upos_uri": f"upos://ugcfx2lf/n{n}.mp4",
+            })
+        route = site.API.get(path)
+        if route is None:
+            # Listed in the results so new upstream calls are noticed.
+            site.count(f"unknown {host}{path}")
+            return self.send_json({"code": 0, "message": "0", "ttl": 1, "data": {}})
+        site.count(route)
+        self.send_json({"code": 0, "message": "0", "ttl": 1, "data": getattr(site, route)(query)})
+
+    def upos(self, path: str, query: Dict[str, list], body: bytes):
+        site = self.standin
+        if path == "/OK":
+            site.count("probe")
+            return self.send(200, b"OK", "text/plain")
+        if self.command == "PUT":
+            site.count("chunks")
+            site.count("chunk_bytes", len(body))
+            return self.send(200, b"MULTIPART_PUT_SUCCESS", "text/plain")
+        if "uploads" in query:
+            site.count("upload_ids")
+            return self.send_json({"OK": 1, "upload_id": f"loadtest{site.next_id()}", "key": path})
+        site.count("completed")
+        self.send_json({"OK": 1, "key": path, "location": f"upos:/{path}"})
+
+
+class FakeBilibili(_StandIn):
+    """
+    The fake Bilibili. Uploads are accepted without being stored; videos are
+    reported as ready (``state`` 0) on the first poll.
+    """
+    handler = _BilibiliHandler
+
+    API = {
+        "/x/web-interface/nav": "nav",
+        "/x/frontend/finger/spi": "spi",
+        "/x/internal/gaia-gateway/ExClimbWuzhi": "activate",
+        "/x/vu/web/cover/up": "cover",
+        "/x/vu/web/add/v3": "submit",
+        "/x/web-interface/view": "view",
+        "/x/player/pagelist": "pages",
+        "/x/v2/dm/subtitle/draft/save": "subtitle",
+    }
+
+    def __init__(self, chunk_size: int = 1024 * 1024, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.chunk_size = chunk_size
+        self.latency = latency
+        self._next = 0
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._next += 1
+            return 10_000 + self._next
+
+    def nav(self, query):
+        return {
+            "isLogin": True, "mid": 1, "uname": "loadtest",
+            "wbi_img": {"img_url": "https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png",
+                        "sub_url": "https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png"},
+        }
+
+    def spi(self, query):
+        return {"b_3": "loadtest-buvid3", "b_4": "loadtest-buvid4"}
+
+    def activate(self, query):
+        return {}
+
+    def cover(self, query):
+        return {"url": f"https://i0.hdslb.com/bfs/archive/{self.next_id()}.png"}
+
+    def submit(self, query):
+        aid = self.next_id()
+        return {"aid": aid, "bvid": aid2bvid(aid)}
+
+    def view(self, query):
+        bvid = (query.get("bvid") or [""])[0]
+        return {"bvid": bvid, "aid": bvid2aid(bvid) if bvid else 1, "cid": 1, "state": 0,
+                "pages": [{"cid": 1, "page": 1, "part": "P1"}]}
+
+    def pages(self, query):
+        return [{"cid": 1, "page": 1, "part": "P1"}]
+
+    def subtitle(self, query):
+        return {}
@@ -0,0 +1,228 @@
+"""
+Startup-time benchmark: how long each router takes to import and how soon
+the gateway answers its first request for it.
+
+    python -m loadtest.startup                           # every SUBSYSTEM_LOADING mode, 3 launches each
+    python -m loadtest.startup --quick                   # one launch each
+    python -m loadtest.startup --mode background --repeat 5
+    python -m loadtest.startup --compare loadtest/results/startup-baseline.json
+
+Import times are measured in a fresh interpreter that has already imported
+FastAPI and the gateway's common modules, so each figure is what the router
+itself adds. For the first response a new uvicorn process is started per
+mode and router (so routers never warm each other up), polled at ``/``
+until it answers, and then sent one request for the router; both times are
+counted from the moment the process was spawned. No upstream is contacted:
+each router is probed with an endpoint that answers locally.
+
+With ``--compare`` the run exits with status 1 when a router's median time
+to first response is more than ``--threshold`` slower than in the given
+results file.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks import fixtures
+from benchmarks.run import ROOT, format_seconds, git_commit
+
+from .run import RESULTS_DIR, free_port, stop_app
+
+MODES = ("eager", "background", "lazy")
+ROUTERS = {
+    "common": "src.common.router",
+    "youtube": "src.youtube.router",
+    "bilibili": "src.bilibili.router",
+    "translate": "src.translate.router",
+}
+# One request per router that is answered without any upstream.
+PROBES = {
+    "common": ("GET", "/api/v1/common/storage", {}),
+    "youtube": ("GET", "/api/v1/youtube/info/cache", {}),
+    "bilibili": ("GET", "/api/v1/bilibili/zones", {}),
+    "translate": ("POST", "/api/v1/translate/chunks", {
+        "data": {"id": "1", "filename": "startup.txt"},
+        "files": {"file": ("startup.txt", fixtures.make_text(4 * 1024).encode("utf-8"), "text/plain")},
+    }),
+}
+IMPORT_SCRIPT = """
+import json, sys, time
+import fastapi, src.common.log, src.common.metrics, src.common.timing
+started = time.perf_counter()
+__import__(sys.argv[1])
+print(json.dumps({"seconds": time.perf_counter() - started}))
+"""
+
+
+def app_env(workdir: str, mode: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    no_proxy = ",".join(filter(None, [env.get("NO_PROXY"), "127.0.0.1", "localhost"]))
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")])),
+        "SUBSYSTEM_LOADING": mode,
+        "VIDEO_DOWNLOAD_PATH": os.path.join(workdir, "downloads"),
+        "BILIBILI_CREDENTIALS_FILE": os.path.join(workdir, "bilibili_credentials.json"),
+        "TIKTOKEN_CACHE_DIR": env.get("TIKTOKEN_CACHE_DIR", os.path.join(ROOT, "data")),
+        "LOG_LEVEL": "WARNING",
+        "NO_PROXY": no_proxy,
+        "no_proxy": no_proxy,
+    })
+    return env
+
+
+def import_seconds(module: str, env: Dict[str, str]) -> float:
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT, module], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])["seconds"]
+
+
+def first_response(router: str, env: Dict[str, str], log_path: str, timeout: float) -> Dict[str, float]:
+    """Seconds from spawning the server to its first answer at "/" and to its answer for ``router``."""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log = open(log_path, "ab")
+    started = time.monotonic()
+    try:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.api_gateway.main:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    finally:
+        log.close()
+    try:
+        with httpx.Client(base_url=base_url, timeout=timeout, trust_env=False) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"The app exited with status {proc.returncode} during startup.")
+                if time.monotonic() - started > timeout:
+                    raise RuntimeError(f"The app did not answer within {timeout:.0f}s.")
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            ready = time.monotonic() - started
+            method, path, kwargs = PROBES[router]
+            response = client.request(method, path, **kwargs)
+            answered = time.monotonic() - started
+            if response.status_code != 200:
+                raise RuntimeError(f"{method} {path} answered {response.status_code}: {response.text[:200]}")
+    finally:
+        stop_app(proc)
+    return {"ready": ready, "first_response": answered}
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Median time to first response per mode and router, for the pairs present in both runs."""
+    rows = []
+    for mode, routers in current["first_response"].items():
+        for router, stats in routers.items():
+            before = baseline.get("first_response", {}).get(mode, {}).get(router)
+            if before is None:
+                continue
+            ratio = stats["first_response"]["median"] / before["first_response"]["median"]
+            rows.append({"name": f"{mode}/{router}", "before": before["first_response"]["median"],
+                         "after": stats["first_response"]["median"], "ratio": ratio,
+                         "regression": ratio > 1 + threshold})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import time and time to first response per router.")
+    parser.add_argument("--mode", action="append", choices=MODES,
+                        help=f"SUBSYSTEM_LOADING mode to launch with; repeatable (default: {', '.join(MODES)})")
+    parser.add_argument("--router", action="append", choices=list(ROUTERS), help="Router to measure; repeatable (default: all)")
+    parser.add_argument("--repeat", type=int, help="Launches (and imports) per measurement (default: 3, or 1 with --quick)")
+    parser.add_argument("--quick", action="store_true", help="One launch per measurement, e.g. for CI")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the app and each request (default: 60)")
+    parser.add_argument("--save", help="Results file (default: loadtest/results/startup-<time>-<commit>.json)")
+    parser.add_argument("--no-save", action="store_true", help="Do not write a results file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown of the median first response before it counts as regressed (default: 0.2)")
+    args = parser.parse_args(argv)
+    modes = args.mode or list(MODES)
+    routers = args.router or list(ROUTERS)
+    repeat = args.repeat or (1 if args.quick else 3)
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    commit = git_commit()
+    save_path = None if args.no_save else (args.save or os.path.join(RESULTS_DIR, f"startup-{stamp}-{commit or 'nogit'}.json"))
+    workdir = tempfile.mkdtemp(prefix="yt-startup-")
+    log_path = os.path.splitext(save_path)[0] + ".log" if save_path else os.path.join(workdir, "app.log")
+    os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    imports: Dict[str, Dict[str, float]] = {}
+    launches: Dict[str, Dict[str, Any]] = {}
+    try:
+        env = app_env(workdir, "lazy")
+        for router in routers:
+            imports[router] = summarize([import_seconds(ROUTERS[router], env) for _ in range(repeat)])
+        imports["gateway"] = summarize([import_seconds("src.api_gateway.main", env) for _ in range(repeat)])
+        for mode in modes:
+            env = app_env(workdir, mode)
+            launches[mode] = {}
+            for router in routers:
+                runs = [first_response(router, env, log_path, args.timeout) for _ in range(repeat)]
+                launches[mode][router] = {key: summarize([run[key] for run in runs]) for key in ("ready", "first_response")}
+    except RuntimeError as e:
+        print(f"{e} See {log_path}", file=sys.stderr)
+        return 2
+    finally:
+        shutil.rmtree(workdir if save_path else os.path.join(workdir, "downloads"), ignore_errors=True)
+
+    print(f"{'import':<12} {'median':>10} {'min':>10}")
+    for name, stats in imports.items():
+        print(f"{name:<12} {format_seconds(stats['median']):>10} {format_seconds(stats['min']):>10}")
+    print()
+    print(f"{'mode':<12} {'router':<12} {'ready':>10} {'first resp':>10}")
+    for mode, stats in launches.items():
+        for router, times in stats.items():
+            print(f"{mode:<12} {router:<12} {format_seconds(times['ready']['median']):>10} "
+                  f"{format_seconds(times['first_response']['median']):>10}")
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "imports": imports,
+        "first_response": launches,
+    }
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {save_path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<22} {format_seconds(row['before']):>10} -> {format_seconds(row['after']):>10}"
+                  f"  x{row['ratio']:.2f} {flag}")
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
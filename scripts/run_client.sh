@@ -11,6 +11,9 @@ curl -X POST https://n8n.homelabtech.cn/webhook-test/b2d8a919-323e-46ea-9d39-80c
 rm -f ./downloads/*
 python src/youtube/client.py https://www.youtube.com/watch?v=jNQXAC9IVRw ./downloads  --api_host 127.0.0.1 --api_port 9000
 
+# 批量下载：每行一个 URL（- 表示从 stdin 读取），每个视频保存到 ./downloads/<video_id>
+python src/youtube/client.py --batch urls.txt ./downloads --concurrency 4 --api_host 127.0.0.1 --api_port 9000
+
 
 https://www.youtube.com/watch?v=QyD0liioY8E
 
@@ -1,19 +1,58 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+from src.common.log import RequestContextMiddleware, configure_logging, logging_stats
+# Before the routers are imported, so their import-time logs go through the queue too.
+configure_logging()
+
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from src.youtube.router import router as youtube_router
-from src.bilibili.router import router as bilibili_router
+from fastapi.responses import PlainTextResponse
+from src.api_gateway.subsystems import Subsystem, SubsystemMiddleware, Subsystems
+from src.common.metrics import CONTENT_TYPE, LOG_RECORDS_DROPPED, QUEUE_DEPTH, MetricsMiddleware, registry
+from src.common.timing import TimingMiddleware
 from src.common.router import router as common_router
-from src.translate.router import router as translate_router
+from src.common.storage import storage
 
-app = FastAPI(title="Video Service API Gateway")
+@asynccontextmanager
+async def lifespan(app):
+    # Sweeps leftover eviction trash, then evicts least recently used video directories
+    # when STORAGE_QUOTA or STORAGE_MIN_FREE is set.
+    storage.start()
+    subsystems.start()
+    yield
+    await subsystems.stop()
 
-app.include_router(youtube_router, prefix="/api/v1/youtube", tags=["YouTube"])
-app.include_router(bilibili_router, prefix="/api/v1/bilibili", tags=["Bilibili"])
+app = FastAPI(title="Video Service API Gateway", lifespan=lifespan)
+
+# The common router only needs FastAPI and the storage module, so it is mounted right away;
+# the others import yt_dlp, bilibili_api and tiktoken and are mounted as SUBSYSTEM_LOADING says.
 app.include_router(common_router, prefix="/api/v1/common", tags=["Common"])
-app.include_router(translate_router, prefix="/api/v1/translate", tags=["Translate"])
+subsystems = Subsystems(app, [
+    Subsystem("src.youtube.router", "/api/v1/youtube", "YouTube"),
+    Subsystem("src.bilibili.router", "/api/v1/bilibili", "Bilibili"),
+    Subsystem("src.translate.router", "/api/v1/translate", "Translate"),
+])
+
+app.add_middleware(SubsystemMiddleware, subsystems=subsystems)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TimingMiddleware)
+app.add_middleware(RequestContextMiddleware)
 
 @app.get("/")
 def read_root():
     return {"message": "API Gateway is running."}
+
+def collect_log_queue():
+    stats = logging_stats()
+    QUEUE_DEPTH.set(stats["queued"], queue="log", state="queued")
+    LOG_RECORDS_DROPPED.set(stats["dropped"], reason="queue_full")
+    LOG_RECORDS_DROPPED.set(stats["ydl_suppressed"], reason="rate_limited")
+
+registry.add_collector(collect_log_queue)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics for this process: request latency per route, phase timings and queue depths."""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
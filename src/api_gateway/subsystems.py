@@ -0,0 +1,165 @@
+"""
+Imports the service routers after the server is up instead of before it.
+
+The YouTube, Bilibili and translate routers pull in yt_dlp, bilibili_api,
+tiktoken and langchain, which together take most of the gateway's startup
+time. SUBSYSTEM_LOADING picks when they are imported:
+
+* ``background`` (default): one after another, as soon as the app has
+  started, so the port is bound without waiting for them.
+* ``lazy``: by the first request under the router's prefix.
+* ``eager``: before the app starts serving, as a plain import would.
+
+In the first two modes a request for a router that is not loaded yet waits
+for that router only (the wait shows up as the ``load`` span). A router
+module may define ``warm_up()`` to do other one-off work (e.g. loading the
+tiktoken encoding) right after it is mounted.
+
+Modules are imported on a worker thread, but routers are only ever mounted
+on the event loop, so the route table never changes under a request that
+is being routed.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import time
+from typing import List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from src.common.timing import span
+
+logger = logging.getLogger(__name__)
+
+SUBSYSTEM_LOADING = os.getenv("SUBSYSTEM_LOADING", "background")
+# Paths that describe every router, so everything is loaded before they are served.
+SCHEMA_PATHS = ("/openapi.json", "/docs", "/redoc")
+
+
+class Subsystem:
+    """A router module mounted under ``prefix`` the first time it is needed."""
+
+    def __init__(self, module: str, prefix: str, tag: str):
+        self.module = module
+        self.prefix = prefix
+        self.tag = tag
+        self.loaded = False
+        self.seconds: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def matches(self, path: str) -> bool:
+        return path == self.prefix or path.startswith(self.prefix + "/")
+
+    def _mount(self, app, module):
+        app.include_router(module.router, prefix=self.prefix, tags=[self.tag])
+        # Regenerated with the new routes on the next /openapi.json.
+        app.openapi_schema = None
+        self.loaded = True
+
+    def _warm_up(self, module):
+        warm_up = getattr(module, "warm_up", None)
+        if warm_up is not None:
+            try:
+                warm_up()
+            except Exception as e:
+                # The router is mounted; whatever warm_up skipped happens on first use instead.
+                logger.warning(f"Warm-up of {self.module} failed: {e}")
+
+    def load_now(self, app):
+        """Imports and mounts the router synchronously; only for before the app serves requests."""
+        if self.loaded:
+            return
+        started = time.perf_counter()
+        module = importlib.import_module(self.module)
+        self._mount(app, module)
+        self._warm_up(module)
+        self.seconds = time.perf_counter() - started
+        logger.info(f"Loaded {self.module} in {self.seconds:.2f}s")
+
+    async def load(self, app):
+        """
+        Imports the router on a worker thread and mounts it on the event loop;
+        concurrent callers wait for the first one.
+        """
+        if self.loaded:
+            return
+        async with self._lock:
+            if self.loaded:
+                return
+            started = time.perf_counter()
+            module = await run_in_threadpool(importlib.import_module, self.module)
+            self._mount(app, module)
+            await run_in_threadpool(self._warm_up, module)
+            self.seconds = time.perf_counter() - started
+            logger.info(f"Loaded {self.module} in {self.seconds:.2f}s")
+
+
+class Subsystems:
+    """The lazily mounted routers of one app and the SUBSYSTEM_LOADING mode they follow."""
+
+    def __init__(self, app, subsystems: List[Subsystem], mode: str = SUBSYSTEM_LOADING):
+        if mode not in ("background", "lazy", "eager"):
+            raise ValueError(f"SUBSYSTEM_LOADING must be background, lazy or eager, not {mode!r}")
+        self.app = app
+        self.subsystems = subsystems
+        self.mode = mode
+        self.loader: Optional[asyncio.Task] = None
+        if mode == "eager":
+            for subsystem in self.subsystems:
+                try:
+                    subsystem.load_now(app)
+                except Exception as e:
+                    # Retried, and reported to the client, by the first request that needs it.
+                    logger.error(f"Could not load {subsystem.module}: {e}")
+
+    def find(self, path: str) -> Optional[Subsystem]:
+        for subsystem in self.subsystems:
+            if subsystem.matches(path):
+                return subsystem
+        return None
+
+    async def load_all(self):
+        for subsystem in self.subsystems:
+            try:
+                await subsystem.load(self.app)
+            except Exception as e:
+                # Retried, and reported to the client, by the first request that needs it.
+                logger.error(f"Could not load {subsystem.module}: {e}")
+
+    def start(self):
+        """Called from the lifespan once the app has started; begins the background import when configured."""
+        if self.mode == "background":
+            self.loader = asyncio.get_running_loop().create_task(self.load_all(), name="subsystem-loader")
+
+    async def stop(self):
+        """Called from the lifespan on shutdown; waits for an import that is still running."""
+        if self.loader is not None:
+            self.loader.cancel()
+            try:
+                # An import already on its thread cannot be interrupted, so this waits for it.
+                await self.loader
+            except asyncio.CancelledError:
+                pass
+            self.loader = None
+
+    def pending(self, path: str) -> List[Subsystem]:
+        if path in SCHEMA_PATHS:
+            return [subsystem for subsystem in self.subsystems if not subsystem.loaded]
+        subsystem = self.find(path)
+        return [subsystem] if subsystem is not None and not subsystem.loaded else []
+
+
+class SubsystemMiddleware:
+    """Loads the router a request is for before routing it. Install it innermost."""
+
+    def __init__(self, app, subsystems: Subsystems):
+        self.app = app
+        self.subsystems = subsystems
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            for subsystem in self.subsystems.pending(scope["path"]):
+                with span("load"):
+                    await subsystem.load(self.subsystems.app)
+        await self.app(scope, receive, send)
@@ -1,11 +1,16 @@
 import asyncio
 import json
+import logging
 import os
 from pathlib import Path
 from bilibili_api import Credential
 from bilibili_api.login_v2 import QrCodeLogin
 from bilibili_api.exceptions import ApiException
 
+from ..common.state import state
+
+logger = logging.getLogger(__name__)
+
 # Define the path for storing credentials
 cred_file_env = os.getenv("BILIBILI_CREDENTIALS_FILE")
 if cred_file_env:
@@ -13,8 +18,12 @@ if cred_file_env:
 else:
     CRED_FILE_PATH = Path(__file__).parent / "bilibili_credentials.json"
 
+# With a shared state backend the credential is kept there too, and only one worker refreshes it at a time.
+REFRESH_LEASE = "bilibili-credential-refresh"
+REFRESH_TIMEOUT = 60
+
 async def save_credential(credential: Credential, ac_time_value: str = None):
-    """Saves the credential object and ac_time_value to a JSON file."""
+    """Saves the credential object and ac_time_value to a JSON file (and the shared state)."""
     cred_data = {
         "sessdata": credential.sessdata,
         "bili_jct": credential.bili_jct,
@@ -22,20 +31,32 @@ async def save_credential(credential: Credential, ac_time_value: str = None):
         "dedeuserid": credential.dedeuserid,
         "ac_time_value": ac_time_value,
     }
+    if state.shared:
+        await asyncio.to_thread(state.put, "credentials", "bilibili", cred_data)
     try:
-        CRED_FILE_PATH.write_text(json.dumps(cred_data, indent=4), encoding='utf-8')
-        print(f"Credential saved successfully to {CRED_FILE_PATH}")
+        # Written to a temporary file first so other workers never read half a file.
+        tmp_path = CRED_FILE_PATH.with_name(f"{CRED_FILE_PATH.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(cred_data, indent=4), encoding='utf-8')
+        try:
+            os.replace(tmp_path, CRED_FILE_PATH)
+        except OSError:
+            # A file bind-mounted into a container cannot be replaced, only rewritten.
+            tmp_path.unlink(missing_ok=True)
+            CRED_FILE_PATH.write_text(json.dumps(cred_data, indent=4), encoding='utf-8')
+        logger.info(f"Credential saved successfully to {CRED_FILE_PATH}")
     except IOError as e:
-        print(f"Error saving credential file: {e}")
+        logger.error(f"Error saving credential file: {e}")
 
 async def load_credential() -> tuple[Credential | None, str | None]:
-    """Loads the credential object and ac_time_value from a JSON file."""
-    if not CRED_FILE_PATH.exists():
-        print("Credential file not found.")
+    """Loads the credential object and ac_time_value from the shared state or the JSON file."""
+    cred_data = await asyncio.to_thread(state.get, "credentials", "bilibili") if state.shared else None
+    if cred_data is None and not CRED_FILE_PATH.exists():
+        logger.info("Credential file not found.")
         return None, None
     
     try:
-        cred_data = json.loads(CRED_FILE_PATH.read_text(encoding='utf-8'))
+        if cred_data is None:
+            cred_data = json.loads(CRED_FILE_PATH.read_text(encoding='utf-8'))
         credential = Credential(
             sessdata=cred_data.get("sessdata"),
             bili_jct=cred_data.get("bili_jct"),
@@ -45,7 +66,7 @@ async def load_credential() -> tuple[Credential | None, str | None]:
         ac_time_value = cred_data.get("ac_time_value")
         return credential, ac_time_value
     except (json.JSONDecodeError, IOError) as e:
-        print(f"Error loading or parsing credential file: {e}")
+        logger.error(f"Error loading or parsing credential file: {e}")
         return None, None
 
 async def refresh_credential(credential: Credential, ac_time_value: str) -> Credential | None:
@@ -53,23 +74,36 @@ async def refresh_credential(credential: Credential, ac_time_value: str) -> Cred
     Tries to refresh the credential using the stored ac_time_value.
     Returns the updated credential on success, None on failure.
     """
-    print("Attempting to refresh credential...")
+    logger.info("Attempting to refresh credential...")
     
     if not credential or not ac_time_value:
-        print("No credential or ac_time_value found. Cannot refresh.")
+        logger.info("No credential or ac_time_value found. Cannot refresh.")
         return None
         
     try:
         setattr(credential, 'ac_time_value', ac_time_value)
         await credential.refresh()
-        print("Credential refreshed successfully!")
+        logger.info("Credential refreshed successfully!")
         new_ac_time_value = getattr(credential, 'ac_time_value', None)
         await save_credential(credential, new_ac_time_value)
         return credential
     except ApiException as e:
-        print(f"Failed to refresh credential: {e}. A new login is likely required.")
+        logger.error(f"Failed to refresh credential: {e}. A new login is likely required.")
         return None
 
+async def refresh_once(credential: Credential, ac_time_value: str) -> Credential | None:
+    """
+    refresh_credential under the refresh lease. A worker that waited for another
+    one's refresh reuses the credential it saved instead of refreshing again,
+    which would invalidate the refresh token the first worker just received.
+    """
+    async with state.alease(REFRESH_LEASE, timeout=REFRESH_TIMEOUT):
+        latest, latest_ac_time_value = await load_credential()
+        if latest is not None and latest.sessdata != credential.sessdata:
+            logger.info("Credential was refreshed by another worker.")
+            return latest
+        return await refresh_credential(credential, ac_time_value)
+
 async def login_and_save_credential() -> Credential | None:
     """
     Initiates a QR code login process and saves the new credential.
@@ -86,12 +120,12 @@ async def login_and_save_credential() -> Credential | None:
             await asyncio.sleep(1) # Poll every second
 
         credential = qr_login.get_credential()
-        print("Login successful!", flush=True)
+        logger.info("Login successful!")
         refresh_token = getattr(credential, 'ac_time_value', None)
         await save_credential(credential, refresh_token)
         return credential
     except ApiException as e:
-        print(f"Login failed: {e}", flush=True)
+        logger.error(f"Login failed: {e}")
         return None
 
 async def get_credential() -> Credential:
@@ -106,19 +140,19 @@ async def get_credential() -> Credential:
         try:
             # is_valid() is a synchronous check, but let's be safe
             if await credential.check_valid():
-                print("Loaded credential is valid.", flush=True)
+                logger.info("Loaded credential is valid.")
                 return credential
             else:
-                print("Credential expired, attempting to refresh.", flush=True)
-                refreshed_credential = await refresh_credential(credential, refresh_token)
+                logger.info("Credential expired, attempting to refresh.")
+                refreshed_credential = await refresh_once(credential, refresh_token)
                 if refreshed_credential:
                     return refreshed_credential
         except ApiException as e:
-            print(f"Error checking credential validity, attempting refresh: {e}", flush=True)
-            refreshed_credential = await refresh_credential(credential, refresh_token)
+            logger.error(f"Error checking credential validity, attempting refresh: {e}")
+            refreshed_credential = await refresh_once(credential, refresh_token)
             if refreshed_credential:
                 return refreshed_credential
 
     # If no valid credential could be loaded or refreshed
-    print("No valid credential available.", flush=True)
+    logger.info("No valid credential available.")
     raise Exception("No valid Bilibili credential. Please trigger a login via the API.")
@@ -1,12 +1,16 @@
 
 import asyncio
+import logging
 import os
 import time
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 
 from bilibili_api import video_uploader, Credential
 from bilibili_api.exceptions import ApiException
 from bilibili_api.utils.picture import Picture
+
+logger = logging.getLogger(__name__)
+
 class EnhancedVideoMetaValidator:
     """
     对Bilibili视频元数据进行增强验证。
@@ -83,7 +87,7 @@ class EnhancedLineSelector:
         为简单起见，我们只选择列表中的第一个。
         """
         # 这是一个模拟实现。真正的实现需要向每个线路发送测试数据包并测量时间。
-        print("模拟线路选择... 默认选择第一条线路。")
+        logger.info("模拟线路选择... 默认选择第一条线路。")
         self.best_line = self.lines[0]
         return self.best_line
 
@@ -93,12 +97,15 @@ class ResilientChunkUploader:
     支持断点续传和重试的大文件分块上传器。
     此类将包装 bilibili_api 的内部上传逻辑以增加韧性。
     """
-    def __init__(self, pages: List[video_uploader.VideoUploaderPage], meta: Dict[str, Any], credential: Credential, max_retries: int = 3, retry_delay: int = 5):
+    def __init__(self, pages: List[video_uploader.VideoUploaderPage], meta: Dict[str, Any], credential: Credential, max_retries: int = 3, retry_delay: int = 5,
+                 on_event: Optional[Callable[[Dict[str, Any]], None]] = None):
         self.pages = pages
         self.meta = meta
         self.credential = credential
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        # 额外的上传事件回调（如计时），在每个事件上同步调用
+        self.on_event = on_event
         self.uploader = None
 
     async def upload(self, line: str):
@@ -110,7 +117,7 @@ class ResilientChunkUploader:
                 # 注意: bilibili-api的VideoUploader不直接暴露线路切换，
                 # 但其内部有线路选择逻辑。这里的 'line' 参数是概念性的。
                 # 实际的韧性将通过捕获异常和重试来实现。
-                print(f"开始上传文件: {[page.path for page in self.pages]} (尝试 {attempt + 1}/{self.max_retries})")
+                logger.info(f"开始上传文件: {[page.path for page in self.pages]} (尝试 {attempt + 1}/{self.max_retries})")
                 
                 #  bilibili-api VideoUploader 封装了大部分复杂性
                 uploader_meta = video_uploader.VideoMeta(
@@ -126,7 +133,9 @@ class ResilientChunkUploader:
                 @self.uploader.on("__ALL__")
                 async def on_event(event_data):
                     nonlocal upload_result
-                    print(f"上传事件: {event_data}")
+                    logger.info(f"上传事件: {event_data}")
+                    if self.on_event is not None:
+                        self.on_event(event_data)
                     if event_data.get("name") in ["PREUPLOAD_FAILED", "FAILED"]:
                         raise ApiException(f"上传失败: {event_data.get('data')}")
                     elif event_data.get("name") == "COMPLETE":
@@ -134,19 +143,19 @@ class ResilientChunkUploader:
                         upload_result = raw_result[0] if isinstance(raw_result, tuple) and raw_result else raw_result
                 
                 await self.uploader.start()
-                print(f"文件上传成功: {[page.path for page in self.pages]}")
+                logger.info(f"文件上传成功: {[page.path for page in self.pages]}")
                 return upload_result
 
             except ApiException as e:
-                print(f"上传 '{[page.path for page in self.pages]}' 失败 (尝试 {attempt + 1}): {e}")
+                logger.error(f"上传 '{[page.path for page in self.pages]}' 失败 (尝试 {attempt + 1}): {e}")
                 if attempt < self.max_retries - 1:
-                    print(f"将在 {self.retry_delay} 秒后重试...")
+                    logger.warning(f"将在 {self.retry_delay} 秒后重试...")
                     await asyncio.sleep(self.retry_delay)
                 else:
-                    print(f"达到最大重试次数，上传失败: {[page.path for page in self.pages]}")
+                    logger.error(f"达到最大重试次数，上传失败: {[page.path for page in self.pages]}")
                     raise e
             except Exception as e:
-                print(f"上传过程中发生意外错误 (尝试 {attempt + 1}): {e}")
+                logger.error(f"上传过程中发生意外错误 (尝试 {attempt + 1}): {e}")
                 if attempt < self.max_retries - 1:
                     await asyncio.sleep(self.retry_delay)
                 else:
@@ -156,8 +165,9 @@ class RobustVideoUploader:
     """
     一个健壮的Bilibili视频上传器，整合了元数据验证、线路选择和弹性上传。
     """
-    def __init__(self, credential: Credential):
+    def __init__(self, credential: Credential, on_event: Optional[Callable[[Dict[str, Any]], None]] = None):
         self.credential = credential
+        self.on_event = on_event
 
     async def upload(self, video_paths: List[str], meta: Dict[str, Any]):
         """
@@ -166,23 +176,23 @@ class RobustVideoUploader:
         :param meta: 包含tid, title, tags, desc, cover的字典。
         """
         # 1. 验证元数据
-        print("步骤 1: 验证视频元数据...")
+        logger.info("步骤 1: 验证视频元数据...")
         validator = EnhancedVideoMetaValidator(meta)
         if not validator.validate():
-            print("元数据验证失败:")
+            logger.error("元数据验证失败:")
             for error in validator.errors:
-                print(f"- {error}")
+                logger.error(f"- {error}")
             return None
-        print("元数据验证通过。")
+        logger.info("元数据验证通过。")
 
         # 2. 线路选择 (概念性)
-        print("\n步骤 2: 选择上传线路...")
+        logger.info("步骤 2: 选择上传线路...")
         line_selector = EnhancedLineSelector()
         best_line = await line_selector.select_best_line()
-        print(f"选择的最佳线路: {best_line}")
+        logger.info(f"选择的最佳线路: {best_line}")
 
         # 3. 创建视频页面和分块上传器
-        print("\n步骤 3: 准备上传任务...")
+        logger.info("步骤 3: 准备上传任务...")
         pages = []
         for video_path in video_paths:
             pages.append(video_uploader.VideoUploaderPage(
@@ -191,15 +201,15 @@ class RobustVideoUploader:
                 description=meta.get("desc", "")
             ))
         
-        chunk_uploader = ResilientChunkUploader(pages, meta, self.credential)
+        chunk_uploader = ResilientChunkUploader(pages, meta, self.credential, on_event=self.on_event)
 
         # 4. 执行上传
-        print("\n步骤 4: 开始上传...")
+        logger.info("步骤 4: 开始上传...")
         try:
             return await chunk_uploader.upload(line=best_line)
 
         except Exception as e:
-            print(f"视频上传最终失败: {e}")
+            logger.error(f"视频上传最终失败: {e}")
             return None
 
 if __name__ == '__main__':
@@ -1,14 +1,23 @@
 from fastapi import APIRouter, HTTPException, Body, Query, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from bilibili_api import video_zone
 import asyncio
+import logging
 import os
 from fastapi import Request
 
+from ..common.log import bind_log_context
+from ..common.metrics import QUEUE_DEPTH
+from ..common.state import state
+from ..common.storage import storage
+from ..common.timing import span
 from .uploader import upload_video, upload_subtitles, call_webhook
 from . import auth
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # --- API Models ---
@@ -27,19 +36,32 @@ class BilibiliUploadRequest(BaseModel):
     source: Optional[str] = ""
     no_reprint: Optional[int] = 1
 
-async def post_upload_tasks(credential, video_dir: str, bvid: str, upload_data: dict):
+@bind_log_context(lambda video_dir, bvid, **_: {"video_id": os.path.basename(video_dir), "bvid": bvid})
+async def post_upload_tasks(credential, video_dir: str, bvid: str, upload_data: dict, lease: Optional[str] = None):
     """
     Background tasks after video upload: wait for ready, upload subtitles, call webhook.
+    Releases the storage pin and upload lease taken by the upload once the subtitles are done.
     """
-    print(f"Starting post-upload tasks for BVID {bvid}...", flush=True)
+    logger.info(f"Starting post-upload tasks for BVID {bvid}...")
     
-    is_ready = await upload_subtitles(credential, video_dir, bvid)
+    QUEUE_DEPTH.inc(queue="bilibili_post_upload", state="running")
+    try:
+        is_ready = await upload_subtitles(credential, video_dir, bvid)
+    finally:
+        QUEUE_DEPTH.dec(queue="bilibili_post_upload", state="running")
+        await run_in_threadpool(storage.touch, os.path.basename(video_dir))
+        await run_in_threadpool(storage.unpin, os.path.basename(video_dir))
+        if lease is not None:
+            await run_in_threadpool(state.release, upload_lease(os.path.basename(video_dir)), lease)
     
     if is_ready:
-        print(f"Video {bvid} is ready. Calling webhook.", flush=True)
+        logger.info(f"Video {bvid} is ready. Calling webhook.")
         await call_webhook(upload_data)
     else:
-        print(f"Video {bvid} did not become ready. Webhook will not be called.", flush=True)
+        logger.info(f"Video {bvid} did not become ready. Webhook will not be called.")
+
+def upload_lease(video_id: str) -> str:
+    return f"bilibili-upload:{video_id}"
 
 @router.get("/zones")
 def get_zones(format: str = Query("json", description="Output format: 'json' or 'text'")):
@@ -48,7 +70,7 @@ def get_zones(format: str = Query("json", description="Output format: 'json' or
     If format is 'json' (default), returns a JSON array of {name, tid}.
     If format is 'text', returns a comma-separated string of {name}({tid}).
     """
-    print(f"\n========== STARTING GET_ZONES with format: {format} ==========\n", flush=True)
+    logger.info(f"========== STARTING GET_ZONES with format: {format} ==========")
     if format not in ["json", "text"]:
         raise HTTPException(status_code=400, detail="Invalid format parameter. Must be 'json' or 'text'.")
 
@@ -62,14 +84,14 @@ def get_zones(format: str = Query("json", description="Output format: 'json' or
         ]
 
         if format == "json":
-            print(f"\n========== GET_ZONES COMPLETED SUCCESSFULLY for format: {format} ==========\n", flush=True)
+            logger.info(f"========== GET_ZONES COMPLETED SUCCESSFULLY for format: {format} ==========")
             return formatted_zones
         elif format == "text":
-            print(f"\n========== GET_ZONES COMPLETED SUCCESSFULLY for format: {format} ==========\n", flush=True)
+            logger.info(f"========== GET_ZONES COMPLETED SUCCESSFULLY for format: {format} ==========")
             return ", ".join([f"{zone['name']}({zone['tid']})" for zone in formatted_zones])
 
     except Exception as e:
-        print(f"\n========== GET_ZONES FAILED with error: {e} ==========\n", flush=True)
+        logger.error(f"========== GET_ZONES FAILED with error: {e} ==========")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred while fetching zones: {e}")
 
 
@@ -80,11 +102,11 @@ async def login():
     The QR code will be displayed in the console where the service is running.
     This process runs in the background.
     """
-    print("\n========== STARTING BILIBILI LOGIN ==========\n", flush=True)
-    print("Received request to start Bilibili login process...")
+    logger.info("========== STARTING BILIBILI LOGIN ==========")
+    logger.info("Received request to start Bilibili login process...")
     # Run the login process in the background so it doesn't block the API
     asyncio.create_task(auth.login_and_save_credential())
-    print("\n========== BILIBILI LOGIN PROCESS STARTED ==========\n", flush=True)
+    logger.info("========== BILIBILI LOGIN PROCESS STARTED ==========")
     return {"message": "Bilibili login process started. Please check the server console to scan the QR code."}
 
 @router.post("/refresh")
@@ -92,17 +114,18 @@ async def refresh():
     """
     Attempts to refresh the Bilibili credentials using the stored refresh token.
     """
-    print("\n========== STARTING BILIBILI REFRESH ==========\n", flush=True)
-    print("Received request to refresh Bilibili credential...")
+    logger.info("========== STARTING BILIBILI REFRESH ==========")
+    logger.info("Received request to refresh Bilibili credential...")
     credential = await auth.refresh_credential()
     if credential:
-        print("\n========== BILIBILI REFRESH COMPLETED SUCCESSFULLY ==========\n", flush=True)
+        logger.info("========== BILIBILI REFRESH COMPLETED SUCCESSFULLY ==========")
         return {"status": "success", "message": "Credential refreshed successfully."}
     else:
-        print("\n========== BILIBILI REFRESH FAILED ==========\n", flush=True)
+        logger.error("========== BILIBILI REFRESH FAILED ==========")
         raise HTTPException(status_code=400, detail="Failed to refresh credential. A new login may be required.")
 
 @router.post("/upload")
+@bind_log_context(lambda payload, **_: {"video_id": payload.video_id})
 async def upload_from_id(
     request: Request, 
     payload: BilibiliUploadRequest,
@@ -123,26 +146,41 @@ async def upload_from_id(
 
     chat_id = request.headers.get("chat_id", 0 )
     
-    print(f"\n========== STARTING BILIBILI UPLOAD for video_id: {video_id} ==========\n", flush=True)
+    logger.info(f"========== STARTING BILIBILI UPLOAD for video_id: {video_id} ==========")
 
     download_path = os.getenv("VIDEO_DOWNLOAD_PATH", "downloads")
     video_dir = os.path.join(download_path, video_id)
-    print(f"Video directory set to: {video_dir}", flush=True)
+    logger.info(f"Video directory set to: {video_dir}")
 
     if not os.path.isdir(video_dir):
-        print(f"Error: Video directory not found: {video_dir}", flush=True)
+        logger.error(f"Error: Video directory not found: {video_dir}")
         raise HTTPException(status_code=404, detail=f"Video directory not found: {video_dir}")
 
+    # One upload per video across all workers, until its subtitles are uploaded too.
+    # The state and storage calls may write to SQLite, so they run off the event loop.
+    lease = await run_in_threadpool(state.acquire, upload_lease(video_id))
+    if lease is None:
+        logger.info(f"An upload of video_id {video_id} is already in progress.")
+        raise HTTPException(status_code=409, detail=f"An upload of {video_id} is already in progress.")
+
     try:
-        credential = await auth.get_credential()
-        print("Successfully got Bilibili credential.", flush=True)
+        with span("credential"):
+            credential = await auth.get_credential()
+        logger.info("Successfully got Bilibili credential.")
     except Exception as e:
-        print(f"Failed to get Bilibili credential: {e}", flush=True)
+        logger.error(f"Failed to get Bilibili credential: {e}")
+        await run_in_threadpool(state.release, upload_lease(video_id), lease)
         raise HTTPException(status_code=500, detail=f"Failed to get Bilibili credential: {e}")
 
+    # Keep the directory from being evicted until the subtitles are uploaded as well,
+    # and mark it used so it is not the first to go once unpinned.
+    await run_in_threadpool(storage.pin, video_id)
+    await run_in_threadpool(storage.touch, video_id)
+    handed_off = False
     try:
         # Step 1: Upload video (synchronous)
-        upload_result = await upload_video(credential, video_dir, data)
+        with span("upload"):
+            upload_result = await upload_video(credential, video_dir, data)
 
         if upload_result and isinstance(upload_result, dict):
             final_response = {"status": "success", 
@@ -156,19 +194,24 @@ async def upload_from_id(
 
             if bvid:
                 # Step 2 & 3: Run post-processing in the background
-                print(f"BVID {bvid} received. Creating background task for post-processing.", flush=True)
-                background_tasks.add_task(post_upload_tasks, credential, video_dir, bvid, final_response)
+                logger.info(f"BVID {bvid} received. Creating background task for post-processing.")
+                background_tasks.add_task(post_upload_tasks, credential, video_dir, bvid, final_response, lease)
+                handed_off = True
             else:
-                print("Upload complete, but no BVID received. Cannot start post-processing.", flush=True)
+                logger.info("Upload complete, but no BVID received. Cannot start post-processing.")
             
-            print(f"\n========== BILIBILI UPLOAD for video_id: {video_id} COMPLETED ==========\n", flush=True)
+            logger.info(f"========== BILIBILI UPLOAD for video_id: {video_id} COMPLETED ==========")
             return final_response
         else:
-            print("Bilibili upload failed. Check logs for details.", flush=True)
+            logger.error("Bilibili upload failed. Check logs for details.")
             raise HTTPException(status_code=500, detail="Bilibili upload failed. Check logs for details.")
 
     except Exception as e:
-        print(f"\n========== BILIBILI UPLOAD FAILED for video_id: {video_id} with error: {e} ==========\n", flush=True)
+        logger.error(f"========== BILIBILI UPLOAD FAILED for video_id: {video_id} with error: {e} ==========")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during the upload process: {e}")
+    finally:
+        if not handed_off:
+            await run_in_threadpool(storage.unpin, video_id)
+            await run_in_threadpool(state.release, upload_lease(video_id), lease)
 
 
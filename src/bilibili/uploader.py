@@ -1,12 +1,18 @@
 import asyncio
+import logging
 import os
 import re
+import time
 import httpx
 from bilibili_api.exceptions import ApiException
 from bilibili_api import video, video_uploader, Credential
+from ..common.metrics import BILIBILI_READY_WAIT_SECONDS, BILIBILI_UPLOAD_BYTES, BILIBILI_UPLOAD_RATE
+from ..common.timing import start_span
 from .robust_uploader import RobustVideoUploader
 from . import auth
 
+logger = logging.getLogger(__name__)
+
 def srt_time_to_seconds(time_str: str) -> float:
     """Converts SRT time format HH:MM:SS,ms to seconds."""
     parts = time_str.replace(',', ':').split(':')
@@ -41,24 +47,24 @@ async def call_webhook(data: dict):
     """Calls the n8n webhook with the provided data."""
     
     webhook_url = os.getenv("N8N_WEBHOOK_URL", "https://n8n.homelabtech.cn/webhook-test/b2d8a919-323e-46ea-9d39-80c1d75ca680")
-    print(f"Calling webhook url: {webhook_url}", flush=True)
-    print(f"Calling webhook with data: {data}", flush=True)
+    logger.info(f"Calling webhook url: {webhook_url}")
+    logger.info(f"Calling webhook with data: {data}")
     try:
         async with httpx.AsyncClient() as client:
             response = await client.post(webhook_url, json=data, timeout=30.0)
             response.raise_for_status()
-            print(f"Successfully called webhook for video_id: {data.get('video_id')}. Status: {response.status_code}", flush=True)
+            logger.info(f"Successfully called webhook for video_id: {data.get('video_id')}. Status: {response.status_code}")
     except httpx.RequestError as e:
-        print(f"Error calling webhook for video_id: {data.get('video_id')}: {e}", flush=True)
+        logger.error(f"Error calling webhook for video_id: {data.get('video_id')}: {e}")
     except Exception as e:
-        print(f"An unexpected error occurred when calling webhook: {e}", flush=True)
+        logger.error(f"An unexpected error occurred when calling webhook: {e}")
 
 async def upload_subtitles(credential, video_dir: str, bvid: str) -> bool:
     """
     Finds and uploads SRT subtitles for the given BVID. It polls the video status
     to ensure it's ready before proceeding. Returns True if the video is ready, False otherwise.
     """
-    print(f"Video upload complete. BVID: {bvid}. Now processing subtitles.", flush=True)
+    logger.info(f"Video upload complete. BVID: {bvid}. Now processing subtitles.")
     
     # 1. Poll for video readiness
     video_obj = video.Video(bvid=bvid, credential=credential)
@@ -66,52 +72,56 @@ async def upload_subtitles(credential, video_dir: str, bvid: str) -> bool:
     max_retries = int(os.getenv("CHECK_READY_MAX_RETRIES", 5))
     retry_delay = int(os.getenv("CHECK_READY_RETRY_DELAY", 15))
 
-    print("Polling video status to ensure it's ready for subtitle upload...", flush=True)
+    logger.info("Polling video status to ensure it's ready for subtitle upload...")
+    poll_started = time.monotonic()
     for i in range(max_retries):
         try:
             info = await video_obj.get_info()
             video_state = info.get('state', 0)
-            print(f"Polling attempt {i+1}/{max_retries}: Video state is '{video_state}'. Full info: {info}", flush=True)
+            logger.info(f"Polling attempt {i+1}/{max_retries}: Video state is '{video_state}'. Full info: {info}")
             
             if video_state >= 0:
-                print("Video is ready.", flush=True)
+                logger.info("Video is ready.")
                 is_video_ready = True
                 break
             else:
-                print(f"Video not ready yet (state: {video_state}). Retrying in {retry_delay} seconds...", flush=True)
+                logger.warning(f"Video not ready yet (state: {video_state}). Retrying in {retry_delay} seconds...")
                 await asyncio.sleep(retry_delay)
         except ApiException as e:
             if e.code == -404:
-                print(f"Polling attempt {i+1}/{max_retries}: Video not found yet (API returned 404). Retrying in {retry_delay} seconds...", flush=True)
+                logger.warning(f"Polling attempt {i+1}/{max_retries}: Video not found yet (API returned 404). Retrying in {retry_delay} seconds...")
             else:
-                print(f"An unexpected API error occurred while polling: {e}. Retrying in {retry_delay} seconds...", flush=True)
+                logger.warning(f"An unexpected API error occurred while polling: {e}. Retrying in {retry_delay} seconds...")
             await asyncio.sleep(retry_delay)
         except Exception as e:
-            print(f"An unexpected error occurred while polling: {e}. Aborting subtitle upload.", flush=True)
+            logger.error(f"An unexpected error occurred while polling: {e}. Aborting subtitle upload.")
+            BILIBILI_READY_WAIT_SECONDS.observe(time.monotonic() - poll_started, outcome="error")
             return False
 
+    BILIBILI_READY_WAIT_SECONDS.observe(time.monotonic() - poll_started,
+                                        outcome="ready" if is_video_ready else "timeout")
     if not is_video_ready:
-        print(f"Video did not become ready after {max_retries} attempts. Aborting subtitle upload.", flush=True)
+        logger.info(f"Video did not become ready after {max_retries} attempts. Aborting subtitle upload.")
         return False
 
     # 2. Find and upload .srt files
     srt_files = [f for f in os.listdir(video_dir) if f.endswith('.srt')]
     if not srt_files:
-        print("No .srt subtitle files found, skipping subtitle upload.", flush=True)
+        logger.info("No .srt subtitle files found, skipping subtitle upload.")
         return True # Video is ready, but no subtitles to upload.
 
-    print(f"Found subtitle files: {srt_files}", flush=True)
+    logger.info(f"Found subtitle files: {srt_files}")
 
     try:
         pages = await video_obj.get_pages()
         if not pages:
-            print("Could not retrieve video pages (CIDs), aborting subtitle upload.", flush=True)
+            logger.info("Could not retrieve video pages (CIDs), aborting subtitle upload.")
             return True # Still return true because video is ready
         
         first_part_cid = pages[0]['cid']
-        print(f"Targeting first video part with CID: {first_part_cid}", flush=True)
+        logger.info(f"Targeting first video part with CID: {first_part_cid}")
         if len(pages) > 1:
-            print("Warning: Multiple video parts detected. Subtitles will be applied to the first part only.", flush=True)
+            logger.warning("Multiple video parts detected. Subtitles will be applied to the first part only.")
 
         cn_subtitle_regex = re.compile(r'zh(-CN|-TW|-HK|-SG|-MO|-Hans)?\.srt$', re.IGNORECASE)
         for srt_filename in srt_files:
@@ -122,7 +132,7 @@ async def upload_subtitles(credential, video_dir: str, bvid: str) -> bool:
                 lang = base_name.split('.')[-1]
             srt_path = os.path.join(video_dir, srt_filename)
             
-            print(f"Processing subtitle for lang '{lang}' from file '{srt_path}'...", flush=True)
+            logger.info(f"Processing subtitle for lang '{lang}' from file '{srt_path}'...")
             
             try:
                 with open(srt_path, 'r', encoding='utf-8') as f:
@@ -130,7 +140,7 @@ async def upload_subtitles(credential, video_dir: str, bvid: str) -> bool:
                 
                 subtitle_body = parse_srt_to_bilibili_body(srt_content)
                 if not subtitle_body:
-                    print(f"Warning: Subtitle file '{srt_path}' is empty or invalid. Skipping.", flush=True)
+                    logger.warning(f"Subtitle file '{srt_path}' is empty or invalid. Skipping.")
                     continue
                 
                 subtitle_data = {
@@ -139,15 +149,52 @@ async def upload_subtitles(credential, video_dir: str, bvid: str) -> bool:
                 }
                 
                 await video_obj.submit_subtitle(cid=first_part_cid, lan=lang, data=subtitle_data, submit=True, sign=True)
-                print(f"Successfully submitted subtitle '{lang}' for CID {first_part_cid}.", flush=True)
+                logger.info(f"Successfully submitted subtitle '{lang}' for CID {first_part_cid}.")
             except Exception as e:
-                print(f"Error submitting subtitle from file '{srt_path}': {e}", flush=True)
+                logger.error(f"Error submitting subtitle from file '{srt_path}': {e}")
 
     except Exception as e:
-        print(f"An error occurred during subtitle processing for BVID {bvid}: {e}", flush=True)
+        logger.error(f"An error occurred during subtitle processing for BVID {bvid}: {e}")
 
     return True
 
+class UploadSpans:
+    """
+    Times the steps of a VideoUploader run as spans of the current request,
+    from its paired PRE_*/AFTER_* (or *_FAILED) events. Chunks upload
+    concurrently, so they are told apart by page and chunk number.
+    """
+    STEPS = {
+        "preupload": ("PREUPLOAD", ("PRE_PAGE", "PREUPLOAD_FAILED")),
+        "chunk": ("PRE_CHUNK", ("AFTER_CHUNK", "CHUNK_FAILED")),
+        "page_submit": ("PRE_PAGE_SUBMIT", ("AFTER_PAGE_SUBMIT", "PAGE_SUBMIT_FAILED")),
+        "cover": ("PRE_COVER", ("AFTER_COVER", "COVER_FAILED")),
+        "submit": ("PRE_SUBMIT", ("AFTER_SUBMIT", "SUBMIT_FAILED")),
+    }
+    STARTS = {start: name for name, (start, _) in STEPS.items()}
+    ENDS = {end: name for name, (_, ends) in STEPS.items() for end in ends}
+
+    def __init__(self):
+        self.open = {}
+
+    def __call__(self, event_data: dict):
+        event = event_data.get("name")
+        name = self.STARTS.get(event) or self.ENDS.get(event)
+        if name is None:
+            return
+        args = event_data.get("data")
+        detail = args[0] if isinstance(args, tuple) and args else args
+        key = name
+        if isinstance(detail, dict) and "page" in detail:
+            key = (name, id(detail["page"]), detail.get("chunk_number"))
+        if event in self.STARTS:
+            self.open[key] = start_span(name)
+        else:
+            current = self.open.pop(key, None)
+            if current is not None:
+                current.finish()
+
+
 async def upload_video(credential: Credential, video_dir: str, data: dict):
     """
     Uploads a video to Bilibili using RobustVideoUploader.
@@ -166,11 +213,11 @@ async def upload_video(credential: Credential, video_dir: str, data: dict):
         elif not cover_file and ext in allowed_image_exts:
             cover_file = full_path
 
-    print(f"视频文件: {video_files}")
-    print(f"封面文件: {cover_file}")
+    logger.info(f"视频文件: {video_files}")
+    logger.info(f"封面文件: {cover_file}")
 
     if not video_files:
-        print("没有找到视频文件，跳过上传。")
+        logger.info("没有找到视频文件，跳过上传。")
         return None
 
     meta = {
@@ -181,5 +228,12 @@ async def upload_video(credential: Credential, video_dir: str, data: dict):
         "cover": cover_file,
     }
 
-    uploader = RobustVideoUploader(credential)
-    return await uploader.upload(video_files, meta)
\ No newline at end of file
+    uploader = RobustVideoUploader(credential, on_event=UploadSpans())
+    total_bytes = sum(os.path.getsize(f) for f in video_files)
+    started = time.monotonic()
+    result = await uploader.upload(video_files, meta)
+    elapsed = time.monotonic() - started
+    if result and elapsed > 0:
+        BILIBILI_UPLOAD_BYTES.inc(total_bytes)
+        BILIBILI_UPLOAD_RATE.observe(total_bytes / elapsed)
+    return result
\ No newline at end of file
@@ -0,0 +1,263 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Fields bound with log_context are copied onto every record logged inside the block.
+CONTEXT_FIELDS = ("request_id", "video_id", "bvid", "job_id")
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields) -> Iterator[None]:
+    """Adds ``fields`` (request_id, video_id, bvid, ...) to every record logged in this block, also in threadpool calls."""
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def bind_log_context(fields: Callable[..., Dict[str, Any]]):
+    """
+    Decorates a coroutine function to run inside ``log_context(**fields(...))``;
+    ``fields`` is called with the function's arguments by name, e.g.
+    ``@bind_log_context(lambda payload, **_: {"video_id": payload.video_id})``.
+    The signature is kept, so it works on FastAPI endpoints.
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            with log_context(**fields(**bound.arguments)):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_context() -> Dict[str, Any]:
+    return dict(_context.get())
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound context onto the record; runs in the caller's thread, before the record is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most ``burst`` records per key through at once, refilled at
+    ``rate`` per second; the rest are dropped and counted. The next record
+    that passes for a key carries the number suppressed before it. Warnings
+    and errors always pass.
+    """
+
+    def __init__(self, rate: float, burst: int, key: Optional[Callable[[logging.LogRecord], str]] = None,
+                 max_keys: int = 256, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._key = key or (lambda record: record.name)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = self._key(record)
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    key = "other"
+                    bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = [float(self.burst), now, 0]
+            tokens, last, dropped = bucket
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            if tokens < 1:
+                bucket[:] = [tokens, now, dropped + 1]
+                self.suppressed += 1
+                return False
+            bucket[:] = [tokens - 1, now, 0]
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, bound context fields and any traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS + ("suppressed",):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain lines for local runs, with the bound context appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = [f"{k}={getattr(record, k)}" for k in CONTEXT_FIELDS + ("suppressed",)
+                  if getattr(record, k, None) is not None]
+        return f"{line} [{' '.join(extras)}]" if extras else line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without blocking: when the queue is
+    full the record is dropped and counted instead of stalling the event loop.
+    Messages and tracebacks are rendered here, in the caller's thread, so
+    the writer never sees arguments that changed after the call.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, queue_size: Optional[int] = None,
+                      stream=None):
+    """
+    Routes the root logger through a bounded queue to a single writer thread
+    that formats and writes to stdout (``LOG_FORMAT``: json or text). Calling
+    it again replaces the previous setup.
+    """
+    global _listener, _queue_handler
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+    queue_size = queue_size if queue_size is not None else int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+    shutdown_logging()
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter())
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    handler = _queue_handler
+    return {
+        "queued": handler.queue.qsize() if handler else 0,
+        "dropped": handler.dropped if handler else 0,
+        "ydl_suppressed": ydl_rate_limit.suppressed,
+    }
+
+
+def _ydl_message_key(record: logging.LogRecord) -> str:
+    # yt-dlp prefixes lines with the component, e.g. "[youtube] abc: Downloading webpage".
+    message = str(record.msg)
+    return message.split("]", 1)[0] if message.startswith("[") else record.levelname
+
+
+ydl_rate_limit = RateLimitFilter(rate=float(os.getenv("YTDLP_LOG_RATE", 5)),
+                                 burst=int(os.getenv("YTDLP_LOG_BURST", 20)),
+                                 key=_ydl_message_key)
+ydl_logger = logging.getLogger("yt_dlp")
+ydl_logger.addFilter(ydl_rate_limit)
+
+atexit.register(shutdown_logging)
+
+
+class RequestContextMiddleware:
+    """Binds a request id (the ``X-Request-ID`` header or a new one) to all logs of the request and echoes it back."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        with log_context(request_id=request_id):
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,318 @@
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Label combinations beyond this many per metric are folded into one "other" series.
+MAX_SERIES = 200
+OVERFLOW_LABEL = "other"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PHASE_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RATE_BUCKETS = (64 * 1024, 256 * 1024, 1024 ** 2, 2 * 1024 ** 2, 5 * 1024 ** 2,
+                10 * 1024 ** 2, 25 * 1024 ** 2, 50 * 1024 ** 2, 100 * 1024 ** 2)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 max_series: int = MAX_SERIES):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _get(self, labels: Dict[str, Any]):
+        """Returns the series for ``labels``; caller holds the lock."""
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            if len(self._series) >= self.max_series:
+                key = (OVERFLOW_LABEL,) * len(self.labelnames)
+                series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self._new()
+        return series
+
+    @abstractmethod
+    def _new(self):
+        """A new series; called with the lock held."""
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """The exposition lines of every series."""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new(self):
+        return [0.0]
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        with self._lock:
+            self._get(labels)[0] += amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[0] if series else 0.0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._series.items())
+            return [f"{self.name}_total{_format_labels(self.labelnames, k)} {_format_value(v[0])}"
+                    for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._get(labels)[0] += amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._get(labels)[0] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._series.items())
+            return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v[0])}" for k, v in items]
+
+
+class _HistogramSeries:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, max_series: int = MAX_SERIES):
+        super().__init__(name, documentation, labelnames, max_series)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new(self):
+        return _HistogramSeries(len(self.buckets))
+
+    def observe(self, value: float, **labels):
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            series = self._get(labels)
+            series.buckets[index] += 1
+            series.sum += value
+            series.count += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observes the wall time spent in the block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series.count if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, series.buckets):
+                    cumulative += n
+                    labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series.sum)}")
+                lines.append(f"{self.name}_count{labels} {series.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The process's metrics in the Prometheus text format. Collectors run at
+    scrape time to refresh gauges that mirror state kept elsewhere (queue depths).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector!r} failed: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed_iter(chunks: Iterable[Any], histogram: Histogram, **labels) -> Iterator[Any]:
+    """Yields ``chunks`` and observes the time from the first chunk until exhausted or closed."""
+    started = time.perf_counter()
+    try:
+        yield from chunks
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def status_class(status: Optional[int]) -> str:
+    return f"{status // 100}xx" if status else "error"
+
+
+def route_label(scope) -> str:
+    """
+    The matched route template with its router prefix, e.g.
+    ``/api/v1/youtube/files/{video_id}``. Depending on the FastAPI version the
+    route in the scope may or may not carry the prefix of ``include_router``;
+    the prefix is recovered from the literal start of the request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(path):
+        for i in range(1, len(path)):
+            if path[i] == "/" and regex.match(path[i:]):
+                return path[:i] + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Records the latency of every HTTP request until the last body chunk is
+    sent, labelled by the matched route template (``/files/{video_id}``, never
+    the raw path), method and status class, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app, histogram: Optional[Histogram] = None):
+        self.app = app
+        self.histogram = histogram or REQUEST_SECONDS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.histogram.observe(time.perf_counter() - started,
+                                   route=route_label(scope),
+                                   method=scope.get("method", ""),
+                                   status=status_class(status))
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response body is sent.",
+    ("route", "method", "status"))
+PHASE_SECONDS = registry.histogram(
+    "video_service_phase_seconds",
+    "Time spent in one processing phase: extract, download, merge, zip, tokenize, split.",
+    ("phase",), buckets=PHASE_BUCKETS)
+QUEUE_DEPTH = registry.gauge(
+    "video_service_queue_depth", "Items waiting or running in an internal queue.", ("queue", "state"))
+LOG_RECORDS_DROPPED = registry.gauge(
+    "log_records_dropped", "Log records dropped since start, because the queue was full or by rate limiting.",
+    ("reason",))
+BILIBILI_UPLOAD_BYTES = registry.counter(
+    "bilibili_upload_bytes", "Video bytes uploaded to Bilibili.")
+BILIBILI_UPLOAD_RATE = registry.histogram(
+    "bilibili_upload_bytes_per_second", "Average throughput of each Bilibili video upload.",
+    buckets=RATE_BUCKETS)
+BILIBILI_READY_WAIT_SECONDS = registry.histogram(
+    "bilibili_subtitle_ready_wait_seconds",
+    "Time spent polling an uploaded video until it accepts subtitles.",
+    ("outcome",), buckets=PHASE_BUCKETS)
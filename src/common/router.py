@@ -1,7 +1,16 @@
+import logging
 import os
-import shutil
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel
+
+from .storage import storage
+from .timing import list_profiles, profile_authorized, profile_path, span
+from .uploads import UploadError, target_path, uploads, write_atomically
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -13,34 +22,156 @@ async def upload_file(
 ):
     """
     Uploads a file to a specific subdirectory within the video download path.
+    For large files use the resumable /uploads endpoints instead.
     """
-    print(f"\n========== STARTING COMMON UPLOAD for video_id: {video_id}, fileName: {fileName} ==========\n", flush=True)
+    logger.info(f"========== STARTING COMMON UPLOAD for video_id: {video_id}, fileName: {fileName} ==========")
     try:
         download_root = os.environ.get('VIDEO_DOWNLOAD_PATH', 'downloads')
         
-        # Sanitize video_id and fileName to prevent path traversal
-        if ".." in video_id or "/" in video_id:
-            raise HTTPException(status_code=400, detail="Invalid video_id.")
-        if ".." in fileName or "/" in fileName:
-            raise HTTPException(status_code=400, detail="Invalid fileName.")
-
-        upload_path = os.path.join(download_root, video_id)
-        os.makedirs(upload_path, exist_ok=True)
+        # Sanitize video_id and fileName to prevent path traversal and overwriting internal files
+        try:
+            file_path = target_path(download_root, video_id, fileName)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        upload_path = os.path.dirname(file_path)
 
-        file_path = os.path.join(upload_path, fileName)
+        async with storage.ain_use(video_id):
+            os.makedirs(upload_path, exist_ok=True)
+            # Copied off the event loop, and renamed into place so readers never see half a file.
+            await run_in_threadpool(write_atomically, file.file, file_path)
+        await run_in_threadpool(storage.record, video_id)
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        print(f"\n========== COMMON UPLOAD COMPLETED SUCCESSFULLY for video_id: {video_id}, fileName: {fileName} ==========\n", flush=True)
+        logger.info(f"========== COMMON UPLOAD COMPLETED SUCCESSFULLY for video_id: {video_id}, fileName: {fileName} ==========")
         return JSONResponse(status_code=200, content={"message": f"File '{fileName}' uploaded successfully to '{upload_path}'."})
 
     except HTTPException as e:
-        print(f"\n========== COMMON UPLOAD FAILED for video_id: {video_id}, fileName: {fileName} with error: {e.detail} ==========\n", flush=True)
+        logger.error(f"========== COMMON UPLOAD FAILED for video_id: {video_id}, fileName: {fileName} with error: {e.detail} ==========")
         raise e
     except Exception as e:
-        print(f"\n========== COMMON UPLOAD FAILED for video_id: {video_id}, fileName: {fileName} with error: {e} ==========\n", flush=True)
+        logger.error(f"========== COMMON UPLOAD FAILED for video_id: {video_id}, fileName: {fileName} with error: {e} ==========")
         return JSONResponse(status_code=500, content={"error": f"An unexpected error occurred: {str(e)}"})
     finally:
         if file:
             await file.close()
+
+class CreateUploadRequest(BaseModel):
+    video_id: str
+    fileName: str
+    length: Optional[int] = None
+
+class FinalizeUploadRequest(BaseModel):
+    sha256: Optional[str] = None
+
+def upload_error_response(e: UploadError) -> JSONResponse:
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return JSONResponse(status_code=e.status_code, content={"error": str(e)}, headers=headers)
+
+def upload_headers(record: dict) -> dict:
+    headers = {"Upload-Offset": str(record["offset"]), "Cache-Control": "no-store"}
+    if record["length"] is not None:
+        headers["Upload-Length"] = str(record["length"])
+    return headers
+
+@router.post("/uploads", status_code=201)
+async def create_upload(request: Request, payload: CreateUploadRequest):
+    """
+    Starts a resumable upload of ``fileName`` into the video's directory.
+    ``length`` is the file size in bytes; leave it out if it is not known yet.
+    """
+    try:
+        record = await run_in_threadpool(uploads.create, payload.video_id, payload.fileName, payload.length)
+    except UploadError as e:
+        return upload_error_response(e)
+    headers = upload_headers(record)
+    headers["Location"] = str(request.url_for("get_upload", upload_id=record["upload_id"]))
+    return JSONResponse(status_code=201, content=record, headers=headers)
+
+@router.get("/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    """Returns an upload's file, length and stored offset."""
+    try:
+        record = uploads.get(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return JSONResponse(content=record, headers=upload_headers(record))
+
+@router.head("/uploads/{upload_id}")
+def head_upload(upload_id: str):
+    """Returns the offset to resume from in Upload-Offset."""
+    try:
+        record = uploads.get(upload_id)
+    except UploadError as e:
+        return Response(status_code=e.status_code)
+    return Response(status_code=200, headers=upload_headers(record))
+
+@router.patch("/uploads/{upload_id}")
+async def append_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    upload_checksum: Optional[str] = Header(None),
+):
+    """
+    Appends the request body at Upload-Offset, which must equal the stored
+    offset, and answers 204 with the new offset. Upload-Checksum (e.g.
+    ``sha256 <base64>``) verifies the body; a mismatch answers 460.
+    """
+    try:
+        with span("write"):
+            record = await uploads.append(upload_id, upload_offset, request.stream(), upload_checksum)
+    except UploadError as e:
+        return upload_error_response(e)
+    return Response(status_code=204, headers=upload_headers(record))
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, payload: Optional[FinalizeUploadRequest] = None):
+    """
+    Moves a complete upload to its file and returns its size and sha256. With
+    ``sha256`` in the body the upload is only moved when the digests match.
+    """
+    try:
+        with span("finalize"):
+            return await run_in_threadpool(uploads.finalize, upload_id, payload.sha256 if payload else None)
+    except UploadError as e:
+        return upload_error_response(e)
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str):
+    """Abandons an upload and removes what was written of it."""
+    try:
+        await run_in_threadpool(uploads.delete, upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return Response(status_code=204)
+
+@router.get("/storage")
+def get_storage_stats():
+    """Returns download directory usage, limits and eviction counters."""
+    return storage.stats()
+
+@router.post("/storage/evict")
+async def run_storage_eviction():
+    """Runs an eviction pass now and returns the evicted video ids."""
+    evicted = await run_in_threadpool(storage.run_pass)
+    return {"evicted": evicted, "stats": storage.stats()}
+
+@router.get("/profiles")
+def get_profiles(x_profile_token: Optional[str] = Header(None)):
+    """
+    Lists the saved request profiles, newest first. Requires the PROFILE_TOKEN
+    in the X-Profile-Token header, the same one that turns profiling on.
+    """
+    if not profile_authorized(x_profile_token):
+        return JSONResponse(status_code=403, content={"error": "A valid X-Profile-Token is required."})
+    return {"profiles": list_profiles()}
+
+@router.get("/profiles/{name}")
+def get_profile(name: str, x_profile_token: Optional[str] = Header(None)):
+    """Downloads a saved profile: ``<name>.html`` for pyinstrument's report, ``<name>.speedscope.json`` for speedscope."""
+    if not profile_authorized(x_profile_token):
+        return JSONResponse(status_code=403, content={"error": "A valid X-Profile-Token is required."})
+    path = profile_path(name)
+    if path is None:
+        return JSONResponse(status_code=404, content={"error": f"Profile '{name}' not found."})
+    media_type = "text/html" if name.endswith(".html") else "application/json"
+    return FileResponse(path, media_type=media_type)
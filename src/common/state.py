@@ -0,0 +1,383 @@
+"""
+State shared between the workers of one deployment.
+
+Download jobs, the per-video download and upload leases, storage pins, the
+info cache and the Bilibili credential go through a StateBackend so that
+several uvicorn workers, or replicas on one host sharing the download
+volume, can split the work:
+
+* ``memory`` (default): plain dicts, for a single worker. Everything still
+  works as before, nothing is shared.
+* ``sqlite``: one SQLite database in WAL mode at STATE_PATH (by default
+  ``.state.sqlite3`` in VIDEO_DOWNLOAD_PATH). WAL relies on shared memory,
+  so every process must run on the same host; do not put it on NFS.
+
+A backend offers three things. Values: JSON documents by namespace and key,
+with an optional time to live. Leases: a name held by one holder at a time,
+e.g. "only one worker downloads video X". Pins: a name held by any number
+of holders, e.g. "some worker is still reading video X". Leases and pins of
+a process are renewed together by a heartbeat thread while it holds any,
+and expire LEASE_TTL seconds after the process dies.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_PATH = os.getenv("STATE_PATH") or os.path.join(os.environ.get("VIDEO_DOWNLOAD_PATH", "downloads"), ".state.sqlite3")
+LEASE_TTL = float(os.getenv("STATE_LEASE_TTL", 30))
+
+
+class LeaseTimeout(Exception):
+    """Raised when a lease could not be acquired within the given timeout."""
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class StateBackend(ABC):
+    """
+    The interface. ``owner`` identifies this process; lease and pin holders
+    are ``<owner>/<token>`` so two threads of one process never share a lease.
+    """
+
+    # Whether other processes see what this one writes.
+    shared = False
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        ...
+
+    @abstractmethod
+    def acquire(self, name: str) -> Optional[str]:
+        """Takes the lease ``name`` if nobody holds it; returns the token to release it with, or None."""
+
+    @abstractmethod
+    def release(self, name: str, token: str):
+        ...
+
+    @abstractmethod
+    def holder(self, name: str) -> Optional[str]:
+        """The holder of the lease ``name``, or None when it is free or expired."""
+
+    @abstractmethod
+    def pin(self, name: str):
+        ...
+
+    @abstractmethod
+    def unpin(self, name: str):
+        ...
+
+    @abstractmethod
+    def pinned(self, name: str) -> bool:
+        """Whether any process, this one included, holds a pin on ``name``."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    @contextmanager
+    def lease(self, name: str, timeout: Optional[float] = None, poll: float = 0.2) -> Iterator[str]:
+        """
+        Holds the lease ``name`` for the block, waiting for the current holder
+        to release it (or to expire); raises LeaseTimeout after ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            token = self.acquire(name)
+            if token is not None:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LeaseTimeout(f"Lease {name} is held by {self.holder(name)}.")
+            time.sleep(poll)
+        try:
+            yield token
+        finally:
+            self.release(name, token)
+
+    @asynccontextmanager
+    async def alease(self, name: str, timeout: Optional[float] = None, poll: float = 0.2):
+        """
+        ``lease`` for coroutines: the backend is called from a worker thread, since
+        SQLite may wait for its lock, and the waits use asyncio.sleep.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            token = await asyncio.to_thread(self.acquire, name)
+            if token is not None:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                holder = await asyncio.to_thread(self.holder, name)
+                raise LeaseTimeout(f"Lease {name} is held by {holder}.")
+            await asyncio.sleep(poll)
+        try:
+            yield token
+        finally:
+            await asyncio.to_thread(self.release, name, token)
+
+
+class MemoryState(StateBackend):
+    """Process-local state; leases and pins never expire because they die with the process."""
+
+    def __init__(self, clock=time.time):
+        super().__init__()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, tuple] = {}
+        self._leases: Dict[str, str] = {}
+        self._pins: Dict[str, int] = {}
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._values.get((namespace, key))
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._values[(namespace, key)]
+                return None
+        # Stored encoded, so callers get a copy they may modify, as with SQLite.
+        return json.loads(value)
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        encoded = _encode(value)
+        with self._lock:
+            self._values[(namespace, key)] = (encoded, None if ttl is None else self._clock() + ttl)
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._values.pop((namespace, key), None)
+
+    def acquire(self, name: str) -> Optional[str]:
+        with self._lock:
+            if name in self._leases:
+                return None
+            token = uuid.uuid4().hex
+            self._leases[name] = f"{self.owner}/{token}"
+            return token
+
+    def release(self, name: str, token: str):
+        with self._lock:
+            if self._leases.get(name) == f"{self.owner}/{token}":
+                del self._leases[name]
+
+    def holder(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._leases.get(name)
+
+    def pin(self, name: str):
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+
+    def unpin(self, name: str):
+        with self._lock:
+            count = self._pins.get(name, 0) - 1
+            if count > 0:
+                self._pins[name] = count
+            else:
+                self._pins.pop(name, None)
+
+    def pinned(self, name: str) -> bool:
+        with self._lock:
+            return name in self._pins
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "owner": self.owner, "values": len(self._values),
+                    "leases": len(self._leases), "pins": len(self._pins)}
+
+
+class SQLiteState(StateBackend):
+    """
+    State in a SQLite database in WAL mode, shared by every process on the
+    host that opens the same file. Each thread uses its own connection.
+    """
+
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kv (
+            namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL,
+            PRIMARY KEY (namespace, key));
+        CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, owner TEXT NOT NULL,
+            expires_at REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS pins (name TEXT NOT NULL, owner TEXT NOT NULL, count INTEGER NOT NULL,
+            expires_at REAL NOT NULL, PRIMARY KEY (name, owner));
+        CREATE INDEX IF NOT EXISTS leases_owner ON leases (owner);
+        CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at) WHERE expires_at IS NOT NULL;
+    """
+    # Expired values are deleted at most this often, by whichever write comes next.
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, path: str, lease_ttl: float = LEASE_TTL, clock=time.time):
+        super().__init__()
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._held = 0
+        self._heartbeat: Optional[threading.Thread] = None
+        self._pruned_at = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # executescript commits on its own, so it runs outside _transaction.
+        self._connect().executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit; transactions are opened explicitly with BEGIN IMMEDIATE.
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, self._clock())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        now = self._clock()
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                       (namespace, key, _encode(value), None if ttl is None else now + ttl))
+            if now - self._pruned_at >= self.PRUNE_INTERVAL:
+                self._pruned_at = now
+                db.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def delete(self, namespace: str, key: str):
+        with self._transaction() as db:
+            db.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def acquire(self, name: str) -> Optional[str]:
+        now = self._clock()
+        token = uuid.uuid4().hex
+        with self._transaction() as db:
+            row = db.execute("SELECT expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] > now:
+                return None
+            db.execute("INSERT OR REPLACE INTO leases (name, holder, owner, expires_at) VALUES (?, ?, ?, ?)",
+                       (name, f"{self.owner}/{token}", self.owner, now + self.lease_ttl))
+        self._hold(1)
+        return token
+
+    def release(self, name: str, token: str):
+        with self._transaction() as db:
+            deleted = db.execute("DELETE FROM leases WHERE name = ? AND holder = ?",
+                                 (name, f"{self.owner}/{token}")).rowcount
+        if deleted:
+            self._hold(-1)
+
+    def holder(self, name: str) -> Optional[str]:
+        row = self._connect().execute("SELECT holder FROM leases WHERE name = ? AND expires_at > ?",
+                                      (name, self._clock())).fetchone()
+        return None if row is None else row[0]
+
+    def pin(self, name: str):
+        with self._transaction() as db:
+            db.execute("INSERT INTO pins (name, owner, count, expires_at) VALUES (?, ?, 1, ?) "
+                       "ON CONFLICT (name, owner) DO UPDATE SET count = count + 1, expires_at = excluded.expires_at",
+                       (name, self.owner, self._clock() + self.lease_ttl))
+        self._hold(1)
+
+    def unpin(self, name: str):
+        with self._transaction() as db:
+            updated = db.execute("UPDATE pins SET count = count - 1 WHERE name = ? AND owner = ?",
+                                 (name, self.owner)).rowcount
+            db.execute("DELETE FROM pins WHERE name = ? AND owner = ? AND count <= 0", (name, self.owner))
+        if updated:
+            self._hold(-1)
+
+    def pinned(self, name: str) -> bool:
+        row = self._connect().execute("SELECT 1 FROM pins WHERE name = ? AND expires_at > ? LIMIT 1",
+                                      (name, self._clock())).fetchone()
+        return row is not None
+
+    def renew(self):
+        """Extends every lease and pin of this process by ``lease_ttl``."""
+        expires_at = self._clock() + self.lease_ttl
+        with self._transaction() as db:
+            db.execute("UPDATE leases SET expires_at = ? WHERE owner = ?", (expires_at, self.owner))
+            db.execute("UPDATE pins SET expires_at = ? WHERE owner = ?", (expires_at, self.owner))
+
+    def stats(self) -> Dict[str, Any]:
+        db = self._connect()
+        now = self._clock()
+        counts = {
+            "values": db.execute("SELECT COUNT(*) FROM kv WHERE expires_at IS NULL OR expires_at > ?", (now,)).fetchone()[0],
+            "leases": db.execute("SELECT COUNT(*) FROM leases WHERE expires_at > ?", (now,)).fetchone()[0],
+            "pins": db.execute("SELECT COUNT(*) FROM pins WHERE expires_at > ?", (now,)).fetchone()[0],
+            "owners": db.execute("SELECT COUNT(DISTINCT owner) FROM (SELECT owner FROM leases WHERE expires_at > ? "
+                                 "UNION SELECT owner FROM pins WHERE expires_at > ?)", (now, now)).fetchone()[0],
+        }
+        with self._lock:
+            held = self._held
+        return {"backend": "sqlite", "path": self.path, "owner": self.owner, "held": held, **counts}
+
+    def _hold(self, delta: int):
+        """Counts this process's leases and pins; the heartbeat runs while there are any."""
+        with self._lock:
+            self._held += delta
+            if self._held > 0 and self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="state-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        while True:
+            time.sleep(self.lease_ttl / 3)
+            with self._lock:
+                if self._held <= 0:
+                    self._heartbeat = None
+                    return
+            try:
+                self.renew()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not renew leases in {self.path}: {e}")
+
+
+def make_state(backend: str = STATE_BACKEND) -> StateBackend:
+    if backend == "memory":
+        return MemoryState()
+    if backend == "sqlite":
+        return SQLiteState(STATE_PATH)
+    raise ValueError(f"Unknown STATE_BACKEND '{backend}'; expected memory or sqlite.")
+
+
+state = make_state()
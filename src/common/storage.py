@@ -0,0 +1,425 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from .state import LeaseTimeout, StateBackend, state as shared_state
+
+logger = logging.getLogger(__name__)
+
+# Evicted directories are renamed to <TRASH_PREFIX><video_id>-<ns> before they are deleted.
+TRASH_PREFIX = ".evicting-"
+
+
+def directory_size(path: str) -> int:
+    """Total size of the regular files under ``path``."""
+    total = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        total += directory_size(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except FileNotFoundError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError):
+        return 0
+    return total
+
+
+def _newest_mtime(path: str) -> float:
+    newest = 0.0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    newest = max(newest, entry.stat(follow_symlinks=False).st_mtime)
+                except FileNotFoundError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return newest
+
+
+class _Entry:
+    __slots__ = ("size", "last_access", "pins", "shared_at")
+
+    def __init__(self, size: int, last_access: float):
+        self.size = size
+        self.last_access = last_access
+        self.pins = 0
+        self.shared_at = 0.0
+
+
+class StorageManager:
+    """
+    Tracks the ``<video_id>`` directories under the download root and evicts
+    the least recently used ones to stay within ``quota_bytes`` and keep at
+    least ``min_free_bytes`` free on the filesystem.
+
+    Sizes and access times live in an in-memory index: the tree is sized once
+    at startup, after that only directories reported through ``record`` are
+    re-measured and each pass just lists the root for directories created
+    behind our back. Directories pinned with ``in_use`` (running downloads and
+    uploads) are never evicted.
+
+    With a shared ``state`` the workers publish their pins and each
+    directory's size and last access there, and one of them at a time runs
+    the periodic pass, so a worker never evicts what another is using.
+    """
+
+    # Seconds between publishing a directory's access time when it is only read.
+    TOUCH_SHARE_INTERVAL = 60
+    # Seconds a new pin waits for another worker's eviction of the same directory to finish.
+    EVICTION_WAIT = 10
+
+    def __init__(self, root: str, quota_bytes: Optional[int] = None, min_free_bytes: Optional[int] = None,
+                 interval: float = 60, clock=time.time, state: Optional[StateBackend] = None):
+        self.root = root
+        self.state = state
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.interval = interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Orders the shared pin and unpin calls, which are made outside _lock.
+        self._pin_lock = threading.Lock()
+        self._published_pins: Set[str] = set()
+        self._entries: Dict[str, _Entry] = {}
+        self._scanned = False
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.passes = 0
+        self.last_pass_at: Optional[float] = None
+        self.last_pass_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def enforcing(self) -> bool:
+        return bool(self.quota_bytes or self.min_free_bytes)
+
+    def start(self):
+        """
+        Starts the background thread once. It first removes the trash of evictions
+        cut short by a crash, then, if any limit is configured, runs the eviction passes.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="storage-eviction", daemon=True)
+        self._thread.start()
+
+    @property
+    def shared(self) -> bool:
+        return self.state is not None and self.state.shared
+
+    def touch(self, video_id: str):
+        """Marks a video as just used (served, zipped or uploaded)."""
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                return
+            entry.last_access = self._clock()
+            if not self.shared or entry.last_access - entry.shared_at < self.TOUCH_SHARE_INTERVAL:
+                return
+        self._share(video_id, entry)
+
+    def record(self, video_id: str):
+        """Re-measures one directory after its contents changed, and marks it used."""
+        size = directory_size(os.path.join(self.root, video_id))
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                entry = self._entries[video_id] = _Entry(size, self._clock())
+            entry.size = size
+            entry.last_access = self._clock()
+        if self.shared:
+            self._share(video_id, entry)
+        if self.enforcing:
+            self._wakeup.set()
+
+    def _share(self, video_id: str, entry: _Entry):
+        entry.shared_at = entry.last_access
+        self.state.put("storage", video_id, {"size": entry.size, "last_access": entry.last_access})
+
+    def pin(self, video_id: str):
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                entry = self._entries[video_id] = _Entry(0, self._clock())
+            entry.pins += 1
+            entry.last_access = self._clock()
+        if self.shared:
+            self._publish_pin(video_id)
+
+    def unpin(self, video_id: str):
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None or entry.pins == 0:
+                return
+            entry.pins -= 1
+        if self.shared:
+            self._publish_pin(video_id)
+
+    def _publish_pin(self, video_id: str):
+        """
+        Brings the shared ``video:<id>`` pin in line with this process's pin count.
+        The state is written outside _lock, so a slow database does not hold up
+        touch, record or eviction; _pin_lock keeps a first pin and a last unpin in order.
+        """
+        with self._pin_lock:
+            with self._lock:
+                entry = self._entries.get(video_id)
+                pinned = entry is not None and entry.pins > 0
+            published = video_id in self._published_pins
+            if pinned and not published:
+                self.state.pin(f"video:{video_id}")
+                self._published_pins.add(video_id)
+            elif not pinned and published:
+                self.state.unpin(f"video:{video_id}")
+                self._published_pins.discard(video_id)
+            else:
+                return
+        if pinned:
+            # A worker that checked the pins just before ours was published may be renaming the
+            # directory away; wait until it has, so we start from an empty directory as after a local eviction.
+            # The eviction lease only covers the rename, so holding it past EVICTION_WAIT means its
+            # holder is stuck; our pin is already published, so no further eviction can start.
+            try:
+                with self.state.lease(f"evicting:{video_id}", timeout=self.EVICTION_WAIT, poll=0.05):
+                    pass
+            except LeaseTimeout as e:
+                logger.warning(f"Pinned {video_id} without waiting for its eviction: {e}")
+
+    @contextmanager
+    def in_use(self, video_id: str) -> Iterator[None]:
+        """Protects a directory from eviction for the duration of the block."""
+        self.pin(video_id)
+        try:
+            yield
+        finally:
+            self.unpin(video_id)
+
+    @asynccontextmanager
+    async def ain_use(self, video_id: str):
+        """``in_use`` for coroutines: pins from a worker thread, as a shared pin writes to the state."""
+        await asyncio.to_thread(self.pin, video_id)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self.unpin, video_id)
+
+    def hold(self, video_id: str, chunks: Iterable[Any]) -> Iterator[Any]:
+        """
+        Iterates ``chunks`` with the directory pinned, e.g. for a streamed response.
+        The pin is taken by the first ``next()`` and released when the iterator is
+        exhausted or closed, so an iterator that is never started pins nothing;
+        callers cover the time until then with ``in_use``.
+        """
+        self.pin(video_id)
+        try:
+            yield from chunks
+        finally:
+            self.unpin(video_id)
+
+    def run_pass(self) -> List[str]:
+        """Brings usage back within the limits; returns the evicted video ids."""
+        started = time.monotonic()
+        try:
+            self._sync_root()
+            evicted = self._evict()
+            self.last_error = None
+            return evicted
+        except OSError as e:
+            self.last_error = str(e)
+            logger.warning(f"Storage eviction pass failed: {e}")
+            return []
+        finally:
+            self.passes += 1
+            self.last_pass_at = self._clock()
+            self.last_pass_seconds = round(time.monotonic() - started, 3)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            used = sum(e.size for e in self._entries.values())
+            videos = len(self._entries)
+            pinned = sum(1 for e in self._entries.values() if e.pins)
+        return {
+            "root": self.root,
+            "used_bytes": used,
+            "videos": videos,
+            "pinned": pinned,
+            "quota_bytes": self.quota_bytes,
+            "min_free_bytes": self.min_free_bytes,
+            "free_bytes": self._free_bytes(),
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "passes": self.passes,
+            "last_pass_at": self.last_pass_at,
+            "last_pass_seconds": self.last_pass_seconds,
+            "last_error": self.last_error,
+        }
+
+    def sweep_trash(self) -> int:
+        """
+        Removes ``.evicting-*`` directories left behind when a process died between
+        renaming a directory away and deleting it; returns how many there were.
+        The sizing ignores dot directories, so nothing else would ever reclaim them.
+        """
+        try:
+            with os.scandir(self.root) as it:
+                leftovers = [entry.path for entry in it
+                             if entry.name.startswith(TRASH_PREFIX) and entry.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return 0
+        for path in leftovers:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Removed leftover eviction trash {path}")
+        return len(leftovers)
+
+    def _run(self):
+        self.sweep_trash()
+        if not self.enforcing:
+            return
+        while True:
+            if not self.shared:
+                self.run_pass()
+            else:
+                # One worker at a time; the others skip this round.
+                token = self.state.acquire("storage-eviction")
+                if token is not None:
+                    try:
+                        self.run_pass()
+                    finally:
+                        self.state.release("storage-eviction", token)
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def _free_bytes(self) -> Optional[int]:
+        try:
+            return shutil.disk_usage(self.root).free
+        except FileNotFoundError:
+            return None
+
+    def _sync_root(self):
+        """Lists the root (one readdir) to pick up new directories and drop deleted ones."""
+        try:
+            with os.scandir(self.root) as it:
+                present = {entry.name for entry in it
+                           if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.')}
+        except FileNotFoundError:
+            present = set()
+        with self._lock:
+            known = set(self._entries)
+            for video_id in known - present:
+                if not self._entries[video_id].pins:
+                    del self._entries[video_id]
+            new = present - known
+            first_scan = not self._scanned
+            self._scanned = True
+        for video_id in new:
+            path = os.path.join(self.root, video_id)
+            size = directory_size(path)
+            # Unknown directories are as old as their newest file; new ones found later count as just used.
+            last_access = _newest_mtime(path) if first_scan else self._clock()
+            with self._lock:
+                self._entries.setdefault(video_id, _Entry(size, last_access))
+        if self.shared:
+            self._merge_shared()
+
+    def _merge_shared(self):
+        """Takes the sizes and access times other workers published for the directories we know."""
+        with self._lock:
+            video_ids = list(self._entries)
+        for video_id in video_ids:
+            published = self.state.get("storage", video_id)
+            if published is None:
+                continue
+            with self._lock:
+                entry = self._entries.get(video_id)
+                if entry is not None:
+                    entry.size = published["size"]
+                    entry.last_access = max(entry.last_access, published["last_access"])
+
+    def _bytes_to_free(self) -> int:
+        with self._lock:
+            used = sum(e.size for e in self._entries.values())
+        needed = used - self.quota_bytes if self.quota_bytes else 0
+        if self.min_free_bytes:
+            free = self._free_bytes()
+            if free is not None:
+                needed = max(needed, self.min_free_bytes - free)
+        return needed
+
+    def _evict(self) -> List[str]:
+        needed = self._bytes_to_free()
+        if needed <= 0:
+            return []
+        with self._lock:
+            candidates = sorted(((e.last_access, video_id) for video_id, e in self._entries.items() if not e.pins))
+        evicted = []
+        for _, video_id in candidates:
+            if needed <= 0:
+                break
+            trash = os.path.join(self.root, f"{TRASH_PREFIX}{video_id}-{time.monotonic_ns()}")
+            lease = None
+            if self.shared:
+                # Other workers publish their pin and then wait while this lease is held, so a pin
+                # that misses the check below only resumes once the directory has been renamed away.
+                lease = self.state.acquire(f"evicting:{video_id}")
+                if lease is None or self.state.pinned(f"video:{video_id}"):
+                    if lease is not None:
+                        self.state.release(f"evicting:{video_id}", lease)
+                    continue
+            try:
+                with self._lock:
+                    entry = self._entries.get(video_id)
+                    if entry is None or entry.pins:
+                        continue
+                    # Renamed away under the lock: a download pinned right after starts from an empty directory.
+                    try:
+                        os.rename(os.path.join(self.root, video_id), trash)
+                    except FileNotFoundError:
+                        pass
+                    del self._entries[video_id]
+            finally:
+                if lease is not None:
+                    self.state.release(f"evicting:{video_id}", lease)
+            shutil.rmtree(trash, ignore_errors=True)
+            if self.shared:
+                self.state.delete("storage", video_id)
+            needed -= entry.size
+            self.evictions += 1
+            self.evicted_bytes += entry.size
+            evicted.append(video_id)
+            logger.info(f"Evicted {video_id} ({entry.size} bytes) from {self.root}")
+        return evicted
+
+
+def _parse_size(name: str) -> Optional[int]:
+    value = os.getenv(name, "").strip()
+    if not value or value == "0":
+        return None
+    # Imported here so the gateway can start without yt_dlp (see api_gateway.subsystems).
+    from yt_dlp.utils import parse_bytes
+    size = parse_bytes(value)
+    if size is None:
+        raise ValueError(f"Invalid {name} '{value}'; expected a size such as 50G or 500M.")
+    return size
+
+
+storage = StorageManager(
+    os.environ.get('VIDEO_DOWNLOAD_PATH', 'downloads'),
+    quota_bytes=_parse_size("STORAGE_QUOTA"),
+    min_free_bytes=_parse_size("STORAGE_MIN_FREE"),
+    interval=float(os.getenv("STORAGE_EVICTION_INTERVAL", 60)),
+    state=shared_state,
+)
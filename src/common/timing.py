@@ -0,0 +1,343 @@
+"""
+Per-request timing breakdown and on-demand profiling.
+
+Code marks the parts of a request worth seeing with ``span(name)``, or
+``phase(name)`` which also feeds the phase histogram. Spans nest through a
+contextvar, so work done in the threadpool or on a download job thread lands
+under the request that started it; outside a request they cost one
+contextvar lookup. TimingMiddleware returns the spans finished before the
+response headers in a ``Server-Timing`` header and logs the whole tree of
+requests slower than SLOW_REQUEST_SECONDS.
+
+A request with ``X-Profile-Token: <PROFILE_TOKEN>`` is additionally run
+under pyinstrument: the request's task on the event loop, plus every worker
+thread while it is inside one of the request's spans. The profile is saved
+in PROFILE_DIR as an HTML report and a speedscope flamegraph, and its name
+is returned in the ``X-Profile`` header. One request is profiled at a time.
+"""
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+from .log import current_context
+from .metrics import PHASE_SECONDS, timed_iter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.001))
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 10))
+# Server-Timing entries per response beyond "total"; the slowest are kept.
+MAX_SERVER_TIMING = 20
+PROFILE_NAME = re.compile(r"^[\w.-]+$")
+
+
+class Span:
+    """A named, timed part of a request and the spans opened inside it."""
+
+    __slots__ = ("name", "started", "ended", "children")
+
+    def __init__(self, name: str, started: Optional[float] = None):
+        self.name = name
+        self.started = time.perf_counter() if started is None else started
+        self.ended: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def finish(self):
+        if self.ended is None:
+            self.ended = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return (self.ended if self.ended is not None else time.perf_counter()) - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        tree: Dict[str, Any] = {"name": self.name, "ms": round(self.seconds * 1000, 3)}
+        if self.ended is None:
+            tree["running"] = True
+        if self.children:
+            tree["children"] = [child.to_dict() for child in list(self.children)]
+        return tree
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("timing_span", default=None)
+_profile: ContextVar[Optional["Profile"]] = ContextVar("timing_profile", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[Optional[Span]]:
+    """Times the block as a child of the current span; does nothing outside a request."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name)
+    parent.children.append(child)
+    token = _current.set(child)
+    profile = _profile.get()
+    try:
+        with profile.thread() if profile is not None else nullcontext():
+            yield child
+    finally:
+        child.finish()
+        _current.reset(token)
+
+
+def start_span(name: str) -> Optional[Span]:
+    """
+    Opens a child of the current span without making it current, for work
+    whose start and end arrive as separate events; call ``finish()`` on it.
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    child = Span(name)
+    parent.children.append(child)
+    return child
+
+
+def add_span(name: str, seconds: float):
+    """Records an already measured ``seconds`` long span, ending now, under the current span."""
+    parent = _current.get()
+    if parent is None:
+        return
+    ended = time.perf_counter()
+    child = Span(name, started=ended - seconds)
+    child.ended = ended
+    parent.children.append(child)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """A span that is also observed in the ``video_service_phase_seconds`` histogram."""
+    with span(name), PHASE_SECONDS.time(phase=name):
+        yield
+
+
+def observe_phase(name: str, seconds: float):
+    PHASE_SECONDS.observe(seconds, phase=name)
+    add_span(name, seconds)
+
+
+def phase_iter(chunks: Iterable[Any], name: str) -> Iterator[Any]:
+    """
+    Yields ``chunks`` as the ``name`` phase. Streaming responses pull each
+    chunk in a fresh copy of the context, so the span is never made current.
+    """
+    current = start_span(name)
+    try:
+        yield from timed_iter(chunks, PHASE_SECONDS, phase=name)
+    finally:
+        if current is not None:
+            current.finish()
+
+
+def server_timing(root: Span) -> str:
+    """
+    The finished spans under ``root`` as a Server-Timing value. Nested names
+    are joined with dots and repeated spans (e.g. upload chunks) are summed,
+    with their count in ``desc``.
+    """
+    totals: Dict[str, List[float]] = {}
+
+    def walk(node: Span, prefix: str):
+        for child in list(node.children):
+            if child.ended is None:
+                continue
+            key = prefix + child.name
+            entry = totals.setdefault(key, [0.0, 0])
+            entry[0] += child.seconds
+            entry[1] += 1
+            walk(child, key + ".")
+
+    walk(root, "")
+    kept = set(sorted(totals, key=lambda key: totals[key][0], reverse=True)[:MAX_SERVER_TIMING])
+    parts = [f"total;dur={root.seconds * 1000:.1f}"]
+    for key, (seconds, count) in totals.items():
+        if key in kept:
+            parts.append(f'{key};dur={seconds * 1000:.1f}' + (f';desc="{count}x"' if count > 1 else ""))
+    return ", ".join(parts)
+
+
+def profile_authorized(token: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of a saved profile file, or None for names outside PROFILE_DIR or missing files."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.is_file():
+            stat = entry.stat()
+            profiles.append({"name": entry.name, "size": stat.st_size, "modified": stat.st_mtime})
+    return sorted(profiles, key=lambda p: p["modified"], reverse=True)
+
+
+class Profile:
+    """pyinstrument sessions for one request: its task on the event loop plus the threads it worked on."""
+
+    def __init__(self, name: str):
+        from pyinstrument import Profiler
+        self.name = name
+        self._profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        self._thread_id = threading.get_ident()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._active_threads = set()
+        self._stopped = False
+
+    def start(self):
+        self._profiler.start()
+
+    def thread(self):
+        """Profiles the calling worker thread until the block exits (a no-op on the request's own thread)."""
+        ident = threading.get_ident()
+        with self._lock:
+            # Jobs that outlive the request (e.g. /download/jobs) are not profiled past its end.
+            if self._stopped or ident == self._thread_id or ident in self._active_threads:
+                return nullcontext()
+            self._active_threads.add(ident)
+        return self._profile_thread(ident)
+
+    @contextmanager
+    def _profile_thread(self, ident: int):
+        from pyinstrument import Profiler
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="disabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            session = profiler.stop()
+            with self._lock:
+                self._active_threads.discard(ident)
+                self._sessions.append(session)
+
+    def stop(self):
+        from pyinstrument.session import Session
+        session = self._profiler.stop()
+        with self._lock:
+            self._stopped = True
+            for other in self._sessions:
+                session = Session.combine(session, other)
+        return session
+
+    def save(self, session) -> List[str]:
+        from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        paths = []
+        for suffix, renderer in ((".html", HTMLRenderer()), (".speedscope.json", SpeedscopeRenderer())):
+            path = os.path.join(PROFILE_DIR, self.name + suffix)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(renderer.render(session))
+            os.replace(tmp, path)
+            paths.append(path)
+        return paths
+
+
+_profiling = threading.Lock()
+
+
+def _start_profile(scope) -> Optional[Profile]:
+    token = None
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile-token":
+            token = value.decode("latin-1")
+            break
+    if not profile_authorized(token):
+        return None
+    if not _profiling.acquire(blocking=False):
+        logger.info("Another request is being profiled; serving this one unprofiled.")
+        return None
+    request_id = re.sub(r"[^\w-]", "_", current_context().get("request_id") or "request")
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{request_id}"
+    try:
+        profile = Profile(name)
+        profile.start()
+    except Exception as e:
+        _profiling.release()
+        logger.warning(f"Could not start the profiler: {e}")
+        return None
+    return profile
+
+
+class TimingMiddleware:
+    """
+    Opens the root span of each HTTP request, adds the ``Server-Timing``
+    header and runs the profiler for requests that ask for it with the
+    admin token. Install it inside RequestContextMiddleware so profiles are
+    named after the request id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        root = Span("request")
+        span_token = _current.set(root)
+        profile = _start_profile(scope)
+        profile_token = _profile.set(profile)
+
+        def finish():
+            if root.ended is not None:
+                return
+            root.finish()
+            if root.seconds >= SLOW_REQUEST_SECONDS:
+                logger.warning(f"Slow request {scope.get('method')} {scope.get('path')} took {root.seconds:.1f}s: "
+                               f"{json.dumps(root.to_dict())}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(root))
+                if profile is not None:
+                    headers.append("X-Profile", profile.name)
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+            _profile.reset(profile_token)
+            _current.reset(span_token)
+            if profile is not None:
+                # Stopped on the task that started it; it also covers the request's background tasks.
+                try:
+                    session = profile.stop()
+                finally:
+                    _profiling.release()
+                try:
+                    paths = await run_in_threadpool(profile.save, session)
+                    logger.info(f"Saved profile of {scope.get('method')} {scope.get('path')} to {paths}")
+                except Exception as e:
+                    logger.error(f"Could not save profile {profile.name}: {e}")
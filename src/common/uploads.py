@@ -0,0 +1,328 @@
+"""
+Resumable uploads into the video download directories, modelled on tus.
+
+A client creates an upload for a file of a video, appends the bytes in as
+many requests as it likes, each starting at the offset the server has
+stored, asks for that offset after a broken connection and finalizes the
+upload once every byte is in:
+
+    POST   /uploads                  {"video_id", "fileName", "length"}  -> upload_id
+    PATCH  /uploads/{id}             Upload-Offset: <n>, body = bytes from n
+    HEAD   /uploads/{id}             -> Upload-Offset, Upload-Length
+    POST   /uploads/{id}/finalize    {"sha256"} (optional)
+    DELETE /uploads/{id}
+
+Bytes go straight into ``.<upload_id>.part`` next to the target file, from
+a worker thread so the event loop never waits on the disk, and are hashed
+with sha256 as they arrive. Finalizing compares the digest and renames the
+part file over the target in one step, so readers see either the old file
+or the whole new one. An ``Upload-Checksum: <algorithm> <base64>`` header
+on an append verifies that request's bytes; on a mismatch they are dropped.
+
+The upload records live in the shared state, so with STATE_BACKEND=sqlite
+any worker can take the next append. Uploads left alone for UPLOAD_EXPIRY
+seconds are forgotten and their part files removed.
+"""
+import base64
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, BinaryIO, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from .state import STATE_PATH, StateBackend, state as shared_state
+from .storage import StorageManager, storage as shared_storage
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_EXPIRY = float(os.getenv("UPLOAD_EXPIRY", 24 * 3600))
+# Received bytes are collected into blocks of this size before a thread writes them.
+WRITE_BLOCK = 1024 * 1024
+READ_BLOCK = 1024 * 1024
+# Suffixes of files the gateway is still writing; clients may not write them.
+RESERVED_SUFFIXES = (".part",)
+
+
+class UploadError(Exception):
+    """An upload request the client should see as ``status_code``."""
+
+    def __init__(self, status_code: int, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+def check_video_id(video_id: str):
+    """
+    Rejects video ids that are not a single directory below the download root.
+    Dot directories are the gateway's own (e.g. eviction trash) and outside the quota.
+    """
+    if not video_id or video_id.startswith(".") or ".." in video_id or "/" in video_id or "\\" in video_id:
+        raise UploadError(400, "Invalid video_id.")
+
+
+def check_file_name(file_name: str):
+    """
+    Rejects names that would leave the video directory or replace the gateway's
+    own files, which are all dot files (the manifest, part and temp files).
+    """
+    if (not file_name or ".." in file_name or "/" in file_name or "\\" in file_name or file_name.startswith(".")
+            or file_name.endswith(RESERVED_SUFFIXES)):
+        raise UploadError(400, "Invalid fileName.")
+
+
+def target_path(root: str, video_id: str, file_name: str) -> str:
+    """The path of ``file_name`` in the video's directory, checked to sit directly inside it."""
+    check_video_id(video_id)
+    check_file_name(file_name)
+    directory = os.path.realpath(os.path.join(root, video_id))
+    path = os.path.realpath(os.path.join(directory, file_name))
+    if os.path.dirname(directory) != os.path.realpath(root) or os.path.dirname(path) != directory:
+        raise UploadError(400, "Invalid fileName.")
+    # STATE_PATH may be configured inside a video directory; it and its WAL files are off limits.
+    if path in (os.path.realpath(STATE_PATH + suffix) for suffix in ("", "-wal", "-shm")):
+        raise UploadError(400, "Invalid fileName.")
+    return path
+
+
+def parse_checksum(header: str) -> Tuple[str, bytes]:
+    """Splits an ``Upload-Checksum`` header, ``<algorithm> <base64 digest>``."""
+    try:
+        algorithm, encoded = header.split(" ", 1)
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except ValueError:
+        raise UploadError(400, "Upload-Checksum must be '<algorithm> <base64 digest>'.")
+    if algorithm.lower() not in hashlib.algorithms_guaranteed:
+        raise UploadError(400, f"Unsupported checksum algorithm '{algorithm}'.")
+    return algorithm.lower(), digest
+
+
+def write_atomically(source: BinaryIO, path: str):
+    """Copies ``source`` to a temporary file beside ``path`` and renames it into place."""
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                block = source.read(READ_BLOCK)
+                if not block:
+                    break
+                f.write(block)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ResumableUploads:
+    """
+    Upload records in ``state`` (namespace ``uploads``) and their part files
+    under ``storage.root``. One append or finalize runs per upload at a time,
+    under the ``upload:<id>`` lease.
+    """
+
+    def __init__(self, storage: StorageManager, state: StateBackend, expiry: float = UPLOAD_EXPIRY):
+        self.storage = storage
+        self.state = state
+        self.expiry = expiry
+        self._lock = threading.Lock()
+        # upload_id -> (offset, sha256 of the first offset bytes), for the uploads this process appended to.
+        self._hashers: Dict[str, Tuple[int, Any]] = {}
+
+    def part_path(self, record: Dict[str, Any]) -> str:
+        return os.path.join(self.storage.root, record["video_id"], f".{record['upload_id']}.part")
+
+    def target_path(self, record: Dict[str, Any]) -> str:
+        return target_path(self.storage.root, record["video_id"], record["fileName"])
+
+    def create(self, video_id: str, file_name: str, length: Optional[int] = None) -> Dict[str, Any]:
+        """Starts an upload of ``file_name`` into the video's directory; ``length`` may be left open."""
+        target_path(self.storage.root, video_id, file_name)
+        if length is not None and length < 0:
+            raise UploadError(400, "length must not be negative.")
+        now = time.time()
+        record = {"upload_id": uuid.uuid4().hex, "video_id": video_id, "fileName": file_name,
+                  "length": length, "offset": 0, "created_at": now, "updated_at": now}
+        directory = os.path.join(self.storage.root, video_id)
+        with self.storage.in_use(video_id):
+            os.makedirs(directory, exist_ok=True)
+            self._remove_stale_parts(directory, now)
+            open(self.part_path(record), "wb").close()
+        self._save(record)
+        logger.info(f"Created upload {record['upload_id']} for {video_id}/{file_name} ({length} bytes)")
+        return record
+
+    def get(self, upload_id: str) -> Dict[str, Any]:
+        record = self.state.get("uploads", upload_id)
+        if record is None:
+            raise UploadError(404, f"Upload not found: {upload_id}")
+        if not os.path.exists(self.part_path(record)):
+            # Evicted with its video directory, or already finalized by a request that lost its response.
+            self.state.delete("uploads", upload_id)
+            raise UploadError(404, f"Upload not found: {upload_id}")
+        return record
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes],
+                     checksum: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Writes the bytes of ``chunks`` at ``offset``, which must be the stored
+        offset. When the client disconnects, the bytes received so far are
+        kept (unless a checksum was given) and the offset moves past them.
+        """
+        expected = parse_checksum(checksum) if checksum else None
+        # Every state, storage and file call runs on a worker thread: SQLite may wait for its lock.
+        lease = await run_in_threadpool(self.state.acquire, f"upload:{upload_id}")
+        if lease is None:
+            raise UploadError(409, "Another request is writing to this upload.")
+        try:
+            record = await run_in_threadpool(self.get, upload_id)
+            if offset != record["offset"]:
+                raise UploadError(409, f"Upload-Offset {offset} does not match the upload's offset.",
+                                  offset=record["offset"])
+            hasher = await run_in_threadpool(self._hasher, record)
+            chunk_hasher = hashlib.new(expected[0]) if expected else None
+            async with self.storage.ain_use(record["video_id"]):
+                f = await run_in_threadpool(self._open_at, self.part_path(record), offset)
+                try:
+                    written, complete = await self._copy(record, f, chunks, hasher, chunk_hasher)
+                    if expected and (not complete or chunk_hasher.digest() != expected[1]):
+                        # The request's bytes are not verified: drop them and the running hash with them.
+                        await run_in_threadpool(f.truncate, offset)
+                        with self._lock:
+                            self._hashers.pop(upload_id, None)
+                        if complete:
+                            raise UploadError(460, "Upload-Checksum does not match the received bytes.", offset=offset)
+                        return record
+                    await run_in_threadpool(self._sync, f)
+                finally:
+                    await run_in_threadpool(f.close)
+            record["offset"] = offset + written
+            record["updated_at"] = time.time()
+            await run_in_threadpool(self._save, record)
+            with self._lock:
+                self._hashers[upload_id] = (record["offset"], hasher)
+            return record
+        finally:
+            await run_in_threadpool(self.state.release, f"upload:{upload_id}", lease)
+
+    def finalize(self, upload_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Checks the upload is complete, and its digest when given, and renames it over the target."""
+        lease = self.state.acquire(f"upload:{upload_id}")
+        if lease is None:
+            raise UploadError(409, "Another request is writing to this upload.")
+        try:
+            record = self.get(upload_id)
+            if record["length"] is not None and record["offset"] != record["length"]:
+                raise UploadError(409, f"Upload has {record['offset']} of {record['length']} bytes.",
+                                  offset=record["offset"])
+            digest = self._hasher(record).hexdigest()
+            if sha256 is not None and sha256.lower() != digest:
+                raise UploadError(460, f"sha256 of the upload is {digest}, not {sha256}.", offset=record["offset"])
+            target = self.target_path(record)
+            with self.storage.in_use(record["video_id"]):
+                os.replace(self.part_path(record), target)
+            self.storage.record(record["video_id"])
+            self._forget(upload_id)
+            logger.info(f"Finalized upload {upload_id} to {target} ({record['offset']} bytes, sha256 {digest})")
+            return {"upload_id": upload_id, "video_id": record["video_id"], "fileName": record["fileName"],
+                    "size": record["offset"], "sha256": digest, "path": target}
+        finally:
+            self.state.release(f"upload:{upload_id}", lease)
+
+    def delete(self, upload_id: str):
+        """Abandons an upload and removes its part file."""
+        lease = self.state.acquire(f"upload:{upload_id}")
+        if lease is None:
+            raise UploadError(409, "Another request is writing to this upload.")
+        try:
+            record = self.get(upload_id)
+            os.remove(self.part_path(record))
+            self._forget(upload_id)
+        finally:
+            self.state.release(f"upload:{upload_id}", lease)
+
+    async def _copy(self, record: Dict[str, Any], f: BinaryIO, chunks: AsyncIterator[bytes],
+                    hasher, chunk_hasher) -> Tuple[int, bool]:
+        """Writes ``chunks`` to ``f`` in blocks; returns the bytes written and whether the body was complete."""
+        length = record["length"]
+        written = 0
+        block = bytearray()
+        complete = True
+        try:
+            async for data in chunks:
+                if length is not None and record["offset"] + written + len(block) + len(data) > length:
+                    raise UploadError(413, f"The upload is limited to {length} bytes.", offset=record["offset"])
+                block += data
+                if len(block) >= WRITE_BLOCK:
+                    written += await run_in_threadpool(self._write, f, bytes(block), hasher, chunk_hasher)
+                    block.clear()
+        except ClientDisconnect:
+            complete = False
+        if block:
+            written += await run_in_threadpool(self._write, f, bytes(block), hasher, chunk_hasher)
+        return written, complete
+
+    @staticmethod
+    def _open_at(path: str, offset: int) -> BinaryIO:
+        f = open(path, "r+b")
+        # Bytes past the stored offset were written by a request that never recorded them.
+        f.truncate(offset)
+        f.seek(offset)
+        return f
+
+    @staticmethod
+    def _write(f: BinaryIO, data: bytes, hasher, chunk_hasher) -> int:
+        f.write(data)
+        hasher.update(data)
+        if chunk_hasher is not None:
+            chunk_hasher.update(data)
+        return len(data)
+
+    @staticmethod
+    def _sync(f: BinaryIO):
+        # The offset is only recorded once the bytes before it are on disk.
+        f.flush()
+        os.fsync(f.fileno())
+
+    def _hasher(self, record: Dict[str, Any]):
+        """The sha256 of the upload so far: kept from this process's last append, or read back from the part file."""
+        with self._lock:
+            cached = self._hashers.pop(record["upload_id"], None)
+        if cached is not None and cached[0] == record["offset"]:
+            return cached[1]
+        hasher = hashlib.sha256()
+        remaining = record["offset"]
+        with open(self.part_path(record), "rb") as f:
+            while remaining > 0:
+                block = f.read(min(READ_BLOCK, remaining))
+                if not block:
+                    raise UploadError(409, "The upload's part file is shorter than its offset.", offset=0)
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    def _save(self, record: Dict[str, Any]):
+        self.state.put("uploads", record["upload_id"], record, ttl=self.expiry)
+
+    def _forget(self, upload_id: str):
+        self.state.delete("uploads", upload_id)
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+
+    def _remove_stale_parts(self, directory: str, now: float):
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith(".") and entry.name.endswith(".part"):
+                    try:
+                        if now - entry.stat().st_mtime > self.expiry:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+
+
+uploads = ResumableUploads(shared_storage, shared_state)
@@ -8,11 +8,18 @@ from starlette.responses import JSONResponse
 from dotenv import load_dotenv
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from ..common.timing import phase
 from .utils import num_tokens_in_string, calculate_chunk_size, MAX_TOKENS_PER_CHUNK
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+def warm_up():
+    """Loads the tiktoken encoding, which otherwise happens during the first /chunks request."""
+    num_tokens_in_string("")
+
 class TranslationRequest(BaseModel):
     id: int = Field(..., description="Translation task ID") 
 
@@ -26,27 +33,28 @@ class ChunksResponse(BaseModel):
 @router.post("/chunks", response_model=ChunksResponse)
 async def chunks(id: int = Form(...), filename: str = Form(...), file: UploadFile = File(...)):
     """文本分块API入口"""
-    logging.info(f"收到文本分块请求: ID={id}, 源文件名={file.filename}, 输出文件名={filename}")
+    logger.info(f"收到文本分块请求: ID={id}, 源文件名={file.filename}, 输出文件名={filename}")
     try:  
         source_text = (await file.read()).decode("utf-8")
 
 
-        num_tokens_in_text = num_tokens_in_string(source_text)
-        logging.info(f"Number of tokens in source text: {num_tokens_in_text}")
+        with phase("tokenize"):
+            num_tokens_in_text = num_tokens_in_string(source_text)
+        logger.info(f"Number of tokens in source text: {num_tokens_in_text}")
  
 
         if num_tokens_in_text < MAX_TOKENS_PER_CHUNK: 
-            logging.info("Translating text as a single chunk.")
+            logger.info("Translating text as a single chunk.")
             source_text_chunks = [source_text]
-            logging.info("Finished single-chunk translation.") 
+            logger.info("Finished single-chunk translation.") 
 
         else: 
-            logging.info("Translating text as multiple chunks.")
+            logger.info("Translating text as multiple chunks.")
 
             token_size = calculate_chunk_size(
                 token_count=num_tokens_in_text, token_limit=MAX_TOKENS_PER_CHUNK
             )
-            logging.info(f"Calculated chunk size: {token_size}")
+            logger.info(f"Calculated chunk size: {token_size}")
  
 
             text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
@@ -55,10 +63,11 @@ async def chunks(id: int = Form(...), filename: str = Form(...), file: UploadFil
                 chunk_overlap=0,
             )
 
-            source_text_chunks = text_splitter.split_text(source_text)
-            logging.info(f"Split source text into {len(source_text_chunks)} chunks.")
+            with phase("split"):
+                source_text_chunks = text_splitter.split_text(source_text)
+            logger.info(f"Split source text into {len(source_text_chunks)} chunks.")
  
-            logging.info("Finished multi-chunk translation.") 
+            logger.info("Finished multi-chunk translation.") 
 
 
         return ChunksResponse(
@@ -71,7 +80,7 @@ async def chunks(id: int = Form(...), filename: str = Form(...), file: UploadFil
 
 
     except Exception as e:
-        logging.error(f"文本分块请求失败: ID={id}, 错误: {e}", exc_info=True)
+        logger.error(f"文本分块请求失败: ID={id}, 错误: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=str(e)
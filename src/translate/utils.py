@@ -10,7 +10,7 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 import logging
 
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 load_dotenv()  # read local .env file
 
@@ -22,7 +22,6 @@ MAX_TOKENS_PER_CHUNK = (
 def num_tokens_in_string(
     input_str: str, encoding_name: str = "cl100k_base"
 ) -> int:
-    logging.debug(f"Entering num_tokens_in_string with input_str: {input_str[:50]}..., encoding_name: {encoding_name}")
     """
     Calculate the number of tokens in a given string using a specified encoding.
 
@@ -45,12 +44,12 @@ def num_tokens_in_string(
     # os.environ["TIKTOKEN_CACHE_DIR"] = tiktoken_cache_dir
     encoding = tiktoken.get_encoding(encoding_name)
     num_tokens = len(encoding.encode(input_str))
+    logger.debug("Counted %d tokens in %d characters with %s", num_tokens, len(input_str), encoding_name)
     return num_tokens
 
 
 
 def calculate_chunk_size(token_count: int, token_limit: int) -> int:
-    logging.debug(f"Entering calculate_chunk_size with token_count: {token_count}, token_limit: {token_limit}")
     """
     Calculate the chunk size based on the token count and token limit.
 
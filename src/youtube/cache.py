@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .singleflight import SingleFlight
+
+from ..common.state import state as shared_state
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value: Any, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+def estimate_size(value: Any) -> int:
+    """Approximates the in-memory footprint of a JSON-like value by its serialized length."""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class InfoCache:
+    """
+    Bounded in-process cache for yt-dlp info dicts.
+
+    Entries expire after ``ttl`` seconds and are evicted least-recently-used
+    first once either ``max_entries`` or ``max_bytes`` is exceeded. Misses for
+    the same key are coalesced so only one extraction runs at a time.
+
+    Cached values are shared between callers and must be treated as read-only.
+
+    With a shared ``state`` (see common.state) loaded values are also stored
+    there, under the ``info`` namespace, and a local miss is looked up there
+    before calling the loader, so workers reuse each other's extractions.
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 clock: Callable[[], float] = time.monotonic, state=None):
+        self.ttl = ttl
+        self.state = state
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value for ``key`` or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def put(self, key: str, value: Any):
+        """Stores ``value`` under ``key``, evicting older entries as needed."""
+        if not self.enabled:
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            # A single oversized entry would flush the whole cache; skip it instead.
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, self._clock() + self.ttl)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for ``key``, calling ``loader`` on a miss.
+        Concurrent misses for the same key share a single ``loader`` call.
+        """
+        if not self.enabled:
+            return loader()
+
+        value = self.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        def load():
+            # Another caller may have filled the entry between our miss and becoming leader.
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            remote = self._get_shared(key)
+            if remote is not None:
+                self.put(key, remote)
+                with self._lock:
+                    self.shared_hits += 1
+                return remote
+            result = loader()
+            self.put(key, result)
+            self._put_shared(key, result)
+            return result
+
+        value, shared = self._flights.do_shared(key, load)
+        with self._lock:
+            if shared:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "in_flight": self._flights.in_flight(),
+            }
+
+    def _get_shared(self, key: str) -> Optional[Any]:
+        if self.state is None or not self.state.shared:
+            return None
+        try:
+            return self.state.get("info", key)
+        except Exception:
+            return None
+
+    def _put_shared(self, key: str, value: Any):
+        if self.state is None or not self.state.shared or estimate_size(value) > self.max_bytes:
+            return
+        try:
+            self.state.put("info", key, value, ttl=self.ttl)
+        except Exception:
+            # Only the other workers lose out; they extract it themselves.
+            pass
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+
+info_cache = InfoCache(
+    ttl=float(os.getenv("INFO_CACHE_TTL", 600)),
+    max_entries=int(os.getenv("INFO_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.getenv("INFO_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    state=shared_state,
+)
@@ -1,30 +1,333 @@
 import argparse
+import base64
+import contextlib
+import hashlib
+import random
 import requests
+import shutil
+import tempfile
+import threading
+import time
 import zipfile
-import io
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urljoin
 
-def download_video_client(video_url: str, output_dir: str, subtitles: list = None, api_base_url: str = "http://127.0.0.1:9000/api/v1/youtube"):
+CHUNK_SIZE = 1024 * 1024
+# Network reads are smaller: a read cut short by a dropped connection loses what it had buffered.
+READ_SIZE = 64 * 1024
+PART_SUFFIX = ".part"
+# (connect, read) timeouts for every API call.
+TIMEOUT = (10, 60)
+
+
+class IntegrityError(Exception):
+    """Raised when a downloaded file does not match the size or sha256 the server reported."""
+
+
+class JobFailed(Exception):
+    """Raised when the server reports that the download job itself failed."""
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter, so concurrent retries do not arrive together."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_transient(error: Exception) -> bool:
+    """Connection problems, timeouts, a full job queue (429) and 5xx responses are worth retrying."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                          requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+def make_session(pool_size: int = 10) -> requests.Session:
+    """A Session whose keep-alive connection pool is large enough for ``pool_size`` threads."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _sha256_hex(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _digest_from_header(value: Optional[str]) -> Optional[str]:
+    """Extracts the sha256 hex digest from a ``Repr-Digest: sha-256=:<base64>:`` header."""
+    for item in (value or "").split(','):
+        algorithm, _, encoded = item.strip().partition('=')
+        if algorithm == 'sha-256' and encoded.startswith(':') and encoded.endswith(':'):
+            return base64.b64decode(encoded[1:-1]).hex()
+    return None
+
+
+def fetch_file(url: str, dest_path: str, expected_size: Optional[int] = None,
+               expected_sha256: Optional[str] = None, retries: int = 3, session=None) -> str:
     """
-    Calls the video download API and extracts the contents to the specified directory.
+    Streams ``url`` to ``dest_path`` with bounded memory. Data goes to
+    ``<dest_path>.part`` first; an interrupted transfer, in this run or an
+    earlier one, is resumed with a Range request. The finished file is
+    checked against the expected size and sha256 (from the listing or the
+    ``Repr-Digest`` header) before it is moved into place. An existing file
+    that already matches both is kept without a request.
+    """
+    if (expected_size is not None and os.path.isfile(dest_path) and os.path.getsize(dest_path) == expected_size
+            and (not expected_sha256 or _sha256_hex(dest_path) == expected_sha256)):
+        return dest_path
+    http = session or requests
+    part_path = dest_path + PART_SUFFIX
+    if_range = f'"{expected_sha256}"' if expected_sha256 else None
+    restarted = False
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if if_range:
+                headers["If-Range"] = if_range
+        try:
+            with http.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                expected_sha256 = expected_sha256 or _digest_from_header(response.headers.get('Repr-Digest'))
+                # 416: the part file already holds the whole file (or more); the checks below decide.
+                if response.status_code != 416:
+                    response.raise_for_status()
+                    if response.status_code == 206:
+                        print(f"Resuming {os.path.basename(dest_path)} at byte {offset}")
+                    with open(part_path, 'ab' if response.status_code == 206 else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=READ_SIZE):
+                            f.write(chunk)
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as e:
+            attempt += 1
+            if attempt > retries:
+                raise
+            print(f"Transfer of {os.path.basename(dest_path)} interrupted ({e}); retrying ({attempt}/{retries})...")
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        size = os.path.getsize(part_path)
+        problem = None
+        if expected_size is not None and size != expected_size:
+            problem = f"size {size} != expected {expected_size}"
+        elif expected_sha256 and _sha256_hex(part_path) != expected_sha256:
+            problem = "sha256 mismatch"
+        if problem is None:
+            os.replace(part_path, dest_path)
+            return dest_path
+        os.remove(part_path)
+        if restarted:
+            raise IntegrityError(f"{os.path.basename(dest_path)}: {problem}")
+        # A stale part file from another version of the file; fetch it once more from scratch.
+        print(f"{os.path.basename(dest_path)}: {problem}; downloading again from the start.")
+        restarted = True
+
+
+def wait_for_job(api_base_url: str, job_id: str, poll_interval: float = 1.0, session=None) -> dict:
+    http = session or requests
+    while True:
+        response = http.get(f"{api_base_url}/download/jobs/{job_id}", timeout=TIMEOUT)
+        response.raise_for_status()
+        job = response.json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(poll_interval)
+
+
+def fetch_video_files(video_url: str, output_dir: str, subtitles: list = None,
+                      api_base_url: str = "http://127.0.0.1:9000/api/v1/youtube",
+                      include_video: bool = False, retries: int = 3, session=None,
+                      per_video_dir: bool = False, video_locks=None) -> List[Dict[str, Any]]:
+    """
+    Runs a download job and fetches its files; returns the file listing
+    entries that were saved. With ``per_video_dir`` files go to
+    ``<output_dir>/<video_id>``. ``video_locks`` (a _KeyedLocks) keeps
+    concurrent callers from writing the same video's files at once.
+    Raises JobFailed or requests errors.
+    """
+    http = session or requests
+    payload = {"url": video_url}
+    if subtitles:
+        payload["subtitles"] = subtitles
+    response = http.post(f"{api_base_url}/download/jobs", json=payload, timeout=TIMEOUT)
+    response.raise_for_status()
+    submitted = response.json()
+    video_id = submitted['video_id']
+    print(f"Queued download job {submitted['job_id']} for video_id {video_id}")
+
+    job = wait_for_job(api_base_url, submitted["job_id"], session=session)
+    if job["status"] != "succeeded":
+        raise JobFailed(job.get('error') or "unknown error")
+
+    response = http.get(f"{api_base_url}/files/{video_id}", timeout=TIMEOUT)
+    response.raise_for_status()
+    files = [f for f in response.json()["files"] if include_video or not f["name"].endswith('.mp4')]
+    target_dir = os.path.join(output_dir, video_id) if per_video_dir else output_dir
+    os.makedirs(target_dir, exist_ok=True)
+    with video_locks.get(video_id) if video_locks else _NO_LOCK:
+        for f in files:
+            fetch_file(urljoin(api_base_url + "/", f["url"]), os.path.join(target_dir, f["name"]),
+                       expected_size=f.get("size"), expected_sha256=f.get("sha256"), retries=retries, session=session)
+            print(f"  - {video_id}: {f['name']}")
+    return files
+
+
+def download_files_client(video_url: str, output_dir: str, subtitles: list = None,
+                          api_base_url: str = "http://127.0.0.1:9000/api/v1/youtube",
+                          include_video: bool = False, retries: int = 3, session=None) -> bool:
+    """
+    Downloads through the job API and fetches each file individually, so
+    nothing is held in memory and every transfer can resume and is verified.
+    Like the zip, the mp4 is skipped unless ``include_video`` is set.
+    Raises requests.HTTPError (404) when the server has no job or file API.
+    """
+    try:
+        files = fetch_video_files(video_url, output_dir, subtitles, api_base_url, include_video, retries, session)
+    except JobFailed as e:
+        print(f"Download job failed: {e}")
+        return False
+    print(f"Successfully downloaded {len(files)} files to '{output_dir}/'")
+    return True
+
+
+class _KeyedLocks:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def get(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+_NO_LOCK = contextlib.nullcontext()
+
+
+def read_urls(source: str) -> List[str]:
+    """
+    Reads one URL per line from a file, or stdin for ``-``; blank lines,
+    # comments and repeated URLs are skipped.
+    """
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        urls = [line.strip() for line in stream if line.strip() and not line.lstrip().startswith("#")]
+        return list(dict.fromkeys(urls))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _download_with_retries(video_url: str, output_dir: str, subtitles, api_base_url: str, include_video: bool,
+                           retries: int, session, video_locks: _KeyedLocks) -> Dict[str, Any]:
+    started = time.monotonic()
+    result = {"url": video_url, "ok": False, "bytes": 0, "files": 0, "attempts": 0, "error": None}
+    for attempt in range(retries + 1):
+        result["attempts"] = attempt + 1
+        try:
+            files = fetch_video_files(video_url, output_dir, subtitles, api_base_url, include_video,
+                                      retries, session, per_video_dir=True, video_locks=video_locks)
+            result.update(ok=True, files=len(files), bytes=sum(f.get("size") or 0 for f in files), error=None)
+            break
+        except Exception as e:
+            result["error"] = str(e)
+            if attempt == retries or not is_transient(e):
+                break
+            delay = backoff_delay(attempt + 1)
+            print(f"{video_url}: {e}; retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+            time.sleep(delay)
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+def download_batch_client(urls: Iterable[str], output_dir: str, subtitles: list = None,
+                          api_base_url: str = "http://127.0.0.1:9000/api/v1/youtube",
+                          concurrency: int = 4, include_video: bool = False, retries: int = 3) -> List[Dict[str, Any]]:
+    """
+    Downloads many videos with ``concurrency`` workers sharing one keep-alive
+    Session. Each video lands in ``<output_dir>/<video_id>``; transient
+    failures are retried with jittered backoff. Prints a summary and returns
+    one result dict per URL.
+    """
+    urls = list(urls)
+    session = make_session(pool_size=max(concurrency, 1) * 2)
+    started = time.monotonic()
+    results: List[Dict[str, Any]] = []
+    video_locks = _KeyedLocks()
+    print(f"Downloading {len(urls)} videos with {concurrency} workers to '{output_dir}/'")
+    try:
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="client") as executor:
+            futures = [executor.submit(_download_with_retries, url, output_dir, subtitles, api_base_url,
+                                       include_video, retries, session, video_locks) for url in urls]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                done = len(results)
+                status = "ok" if result["ok"] else f"FAILED: {result['error']}"
+                print(f"[{done}/{len(urls)}] {result['url']} ({result['seconds']:.1f}s) {status}")
+    finally:
+        session.close()
+    print_batch_summary(results, time.monotonic() - started)
+    return results
+
+
+def print_batch_summary(results: List[Dict[str, Any]], elapsed: float):
+    succeeded = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+    total_bytes = sum(r["bytes"] for r in succeeded)
+    print("\n========== BATCH SUMMARY ==========")
+    print(f"Videos:     {len(succeeded)} succeeded, {len(failed)} failed, {len(results)} total")
+    print(f"Files:      {sum(r['files'] for r in succeeded)} ({total_bytes / 1024 / 1024:.1f} MiB)")
+    print(f"Elapsed:    {elapsed:.1f}s")
+    if elapsed > 0:
+        print(f"Throughput: {total_bytes / 1024 / 1024 / elapsed:.2f} MiB/s, {len(succeeded) * 60 / elapsed:.1f} videos/min")
+    print(f"Retries:    {sum(r['attempts'] - 1 for r in results)}")
+    for r in failed:
+        print(f"  FAILED {r['url']}: {r['error']}")
+
+
+def download_video_client(video_url: str, output_dir: str, subtitles: list = None, api_base_url: str = "http://127.0.0.1:9000/api/v1/youtube",
+                          include_video: bool = False, retries: int = 3):
+    """
+    Calls the video download API and saves the files to the specified directory.
+    Uses the per-file API when the server has it and falls back to /download,
+    streaming the zip to a temporary file before extracting it.
     """
-    download_endpoint = f"{api_base_url}/download"
     print(f"Attempting to download video from: {video_url}")
-    print(f"API Endpoint: {download_endpoint}")
+    print(f"API Endpoint: {api_base_url}")
     print(f"Output directory: {output_dir}")
     if subtitles:
         print(f"Requesting subtitles: {', '.join(subtitles)}")
 
+    response = None
     try:
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
 
+        try:
+            return download_files_client(video_url, output_dir, subtitles, api_base_url,
+                                         include_video=include_video, retries=retries)
+        except requests.exceptions.HTTPError as http_err:
+            if http_err.response is None or http_err.response.status_code != 404:
+                raise
+            print("Server has no file API; falling back to the /download zip.")
+
+        download_endpoint = f"{api_base_url}/download"
         payload = {"url": video_url}
         if subtitles:
             payload["subtitles"] = subtitles
 
-        response = requests.post(download_endpoint, json=payload, stream=True)
+        response = requests.post(download_endpoint, json=payload, stream=True, timeout=TIMEOUT)
         response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
 
         # Check content type to ensure it's a zip file
@@ -40,35 +343,39 @@ def download_video_client(video_url: str, output_dir: str, subtitles: list = Non
             parts = content_disposition.split('filename=')
             if len(parts) > 1:
                 filename = parts[1].strip('"')
-        
+
         print(f"Received zip file: {filename}")
 
-        # Read the content into a bytes buffer
-        buffer = io.BytesIO()
-        for chunk in response.iter_content(chunk_size=8192):
-            buffer.write(chunk)
-        buffer.seek(0) # Reset buffer's position to the beginning
+        # Spool to disk next to the output so memory stays flat regardless of archive size.
+        with tempfile.TemporaryFile(dir=output_dir) as buffer:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                buffer.write(chunk)
+            buffer.seek(0)
+
+            if not zipfile.is_zipfile(buffer):
+                print("Error: Received file is not a valid zip archive.")
+                return False
+
+            # Extract the zip file; members are copied in chunks and CRC-checked on read.
+            with zipfile.ZipFile(buffer, 'r') as zf:
+                for member in zf.infolist():
+                    target = os.path.join(output_dir, os.path.basename(member.filename))
+                    with zf.open(member) as src, open(target, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                print(f"Successfully extracted content to '{output_dir}/'")
+                for file in zf.namelist():
+                    print(f"  - {file}")
 
-        if not zipfile.is_zipfile(buffer):
-            print("Error: Received file is not a valid zip archive.")
-            return False
-            
-        # Extract the zip file
-        with zipfile.ZipFile(buffer, 'r') as zf:
-            zf.extractall(output_dir)
-            print(f"Successfully extracted content to '{output_dir}/'")
-            for file in zf.namelist():
-                print(f"  - {file}")
-        
         return True
 
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")
+        error_response = http_err.response if http_err.response is not None else response
         try:
-            error_data = response.json()
+            error_data = error_response.json()
             print(f"API Error Message: {error_data.get('error', 'No specific error message provided.')}")
-        except ValueError:
-            print(f"API Response Content: {response.text}")
+        except (ValueError, AttributeError):
+            print(f"API Response Content: {getattr(error_response, 'text', '')}")
         return False
     except requests.exceptions.ConnectionError as conn_err:
         print(f"Connection error occurred: {conn_err}")
@@ -80,24 +387,44 @@ def download_video_client(video_url: str, output_dir: str, subtitles: list = Non
     except requests.exceptions.RequestException as req_err:
         print(f"An unexpected request error occurred: {req_err}")
         return False
+    except IntegrityError as integrity_err:
+        print(f"Integrity check failed: {integrity_err}")
+        return False
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return False
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Client to download video and related files via yt-dlp API.")
-    parser.add_argument("video_url", help="The URL of the video to download.")
-    parser.add_argument("output_dir", help="The directory to save the downloaded and extracted files.")
+    parser.add_argument("video_url", nargs="?", help="The URL of the video to download (omit with --batch).")
+    parser.add_argument("output_dir", nargs="?", help="The directory to save the downloaded and extracted files.")
+    parser.add_argument("--batch", metavar="FILE", help="Read URLs from FILE, one per line ('-' for stdin); each video goes to OUTPUT_DIR/<video_id>.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent downloads in batch mode (default: 4).")
     parser.add_argument("--subtitles", help="Comma-separated list of subtitle languages to download (e.g., 'en,es').")
     parser.add_argument("--api_host", default="127.0.0.1", help="The host of the API service (default: 127.0.0.1).")
     parser.add_argument("--api_port", type=int, default=8000, help="The port of the API service (default: 8000).")
-    
+    parser.add_argument("--include_video", action="store_true", help="Also download the mp4 (only with the per-file API).")
+    parser.add_argument("--retries", type=int, default=3, help="Retries after transient errors, per file transfer and per video (default: 3).")
+
     args = parser.parse_args()
 
     subtitle_list = args.subtitles.split(',') if args.subtitles else None
     api_base = f"http://{args.api_host}:{args.api_port}/api/v1/youtube"
 
-    success = download_video_client(args.video_url, args.output_dir, subtitles=subtitle_list, api_base_url=api_base)
+    if args.batch:
+        # In batch mode the only positional argument is the output directory.
+        output_dir = args.output_dir or args.video_url
+        if not output_dir or (args.video_url and args.output_dir):
+            parser.error("--batch takes a single positional argument: output_dir")
+        results = download_batch_client(read_urls(args.batch), output_dir, subtitles=subtitle_list,
+                                        api_base_url=api_base, concurrency=args.concurrency,
+                                        include_video=args.include_video, retries=args.retries)
+        sys.exit(0 if all(r["ok"] for r in results) else 1)
+    if not args.video_url or not args.output_dir:
+        parser.error("video_url and output_dir are required unless --batch is given")
+
+    success = download_video_client(args.video_url, args.output_dir, subtitles=subtitle_list, api_base_url=api_base,
+                                    include_video=args.include_video, retries=args.retries)
     if success:
         print("\nDownload process completed successfully!")
     else:
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+import yt_dlp
+
+from .ydl_pool import ydl_pool
+
+THREAD = "thread"
+PROCESS = "process"
+
+
+def extract_sanitized_info(url: str, base_opts: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs yt-dlp extraction and returns the sanitized info dict. In process
+    mode this is the function executed in the worker, which keeps its own
+    pool of warm YoutubeDL instances.
+    """
+    with ydl_pool.lease(base_opts) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+
+def _extract_in_worker(url: str, base_opts: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return extract_sanitized_info(url, base_opts)
+    except yt_dlp.utils.DownloadError as e:
+        # The original carries a traceback in exc_info, which cannot be pickled back.
+        raise yt_dlp.utils.DownloadError(str(e)) from None
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+class ExtractionBackend:
+    """
+    Chooses where yt-dlp extraction runs.
+
+    In ``thread`` mode extraction runs in the calling thread, as before. In
+    ``process`` mode it runs in a pool of worker processes so CPU-heavy
+    extraction and JS challenge solving do not compete with request handling
+    for the GIL; only the sanitized info dict crosses the process boundary.
+    The process pool is replaced after ``max_tasks`` extractions so workers
+    do not accumulate memory indefinitely.
+    """
+
+    def __init__(self, mode: str = THREAD, workers: int = 2, max_tasks: int = 100):
+        if mode not in (THREAD, PROCESS):
+            raise ValueError(f"Unknown extraction backend '{mode}'; expected '{THREAD}' or '{PROCESS}'.")
+        self.mode = mode
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks = 0
+        self.generations = 0
+
+    @property
+    def isolated(self) -> bool:
+        return self.mode == PROCESS
+
+    def extract(self, url: str, base_opts: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.isolated:
+            return extract_sanitized_info(url, base_opts)
+        return self._submit(url, base_opts).result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self.isolated else None,
+            "max_tasks": self.max_tasks if self.isolated else None,
+            "generations": self.generations,
+        }
+
+    def _submit(self, url: str, base_opts: Dict[str, Any]):
+        with self._lock:
+            if self._executor is None or self._tasks >= self.max_tasks:
+                retired = self._executor
+                # forkserver avoids forking a process that already runs threads.
+                context = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._tasks = 0
+                self.generations += 1
+                if retired is not None:
+                    # Running extractions finish; the old workers exit afterwards.
+                    retired.shutdown(wait=False)
+            self._tasks += 1
+            return self._executor.submit(_extract_in_worker, url, base_opts)
+
+
+extraction_backend = ExtractionBackend(
+    mode=os.getenv("YTDLP_EXECUTOR", THREAD).lower(),
+    workers=int(os.getenv("YTDLP_PROCESS_WORKERS", os.cpu_count() or 2)),
+    max_tasks=int(os.getenv("YTDLP_PROCESS_MAX_TASKS", 100)),
+)
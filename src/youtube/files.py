@@ -0,0 +1,102 @@
+import base64
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, List, Mapping, Optional
+
+from starlette.responses import FileResponse
+
+from .manifest import is_artifact, load_manifest
+
+
+class ArtifactNotFound(Exception):
+    """Raised when a requested video directory or file does not exist or may not be served."""
+
+
+class ArtifactFileResponse(FileResponse):
+    """
+    FileResponse with larger reads. Starlette handles Range/If-Range,
+    multipart ranges and HEAD, and hands the file to the server with the
+    ``http.response.pathsend`` extension (sendfile) when the server offers it.
+    """
+    chunk_size = 1024 * 1024
+
+
+def _plain_name(name: str) -> bool:
+    return bool(name) and name not in ('.', '..') and os.path.basename(name) == name and '\\' not in name
+
+
+def video_dir(download_root: str, video_id: str) -> str:
+    if not _plain_name(video_id):
+        raise ArtifactNotFound(f"Invalid video_id: {video_id}")
+    path = os.path.join(download_root, video_id)
+    if not os.path.isdir(path):
+        raise ArtifactNotFound(f"No downloads for video_id: {video_id}")
+    return path
+
+
+def artifact_path(download_root: str, video_id: str, filename: str) -> str:
+    """Resolves a servable file inside ``<download_root>/<video_id>``; names cannot escape it."""
+    directory = video_dir(download_root, video_id)
+    if not _plain_name(filename) or not is_artifact(filename):
+        raise ArtifactNotFound(f"File not found: {filename}")
+    path = os.path.join(directory, filename)
+    if not os.path.isfile(path):
+        raise ArtifactNotFound(f"File not found: {filename}")
+    return path
+
+
+def artifact_etag(manifest: Optional[Dict[str, Any]], filename: str, st: os.stat_result) -> Optional[str]:
+    """
+    Strong ETag from the manifest's sha256 while the file still matches the
+    recorded size and mtime, so it survives restarts and copies; None otherwise.
+    """
+    entry = ((manifest or {}).get("files") or {}).get(filename)
+    if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        return f'"{entry["sha256"]}"'
+    return None
+
+
+def repr_digest(sha256_hex: str) -> str:
+    """Formats a sha256 hex digest as an RFC 9530 ``Repr-Digest`` header value."""
+    return f"sha-256=:{base64.b64encode(bytes.fromhex(sha256_hex)).decode('ascii')}:"
+
+
+def stat_etag(st: os.stat_result) -> str:
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def list_artifacts(download_root: str, video_id: str) -> List[Dict[str, Any]]:
+    """Describes every servable file of a video, with the manifest hash when it is current."""
+    directory = video_dir(download_root, video_id)
+    manifest = load_manifest(directory)
+    files = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.is_file() or not is_artifact(entry.name):
+                continue
+            st = entry.stat()
+            etag = artifact_etag(manifest, entry.name, st)
+            files.append({
+                "name": entry.name,
+                "size": st.st_size,
+                "last_modified": formatdate(st.st_mtime, usegmt=True),
+                "sha256": etag.strip('"') if etag else None,
+                "media_type": mimetypes.guess_type(entry.name)[0] or "application/octet-stream",
+            })
+    return sorted(files, key=lambda f: f["name"])
+
+
+def not_modified(headers: Mapping[str, str], etag: str, mtime: float) -> bool:
+    """Evaluates If-None-Match / If-Modified-Since for a GET or HEAD (RFC 9110 13.2.2)."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -0,0 +1,195 @@
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from yt_dlp.utils import parse_bytes
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket measured in bytes. Consumers take what they
+    already transferred and sleep off any debt, so concurrent downloads share
+    ``rate`` bytes per second between them. ``rate`` of None disables it.
+    """
+
+    def __init__(self, rate: Optional[float], burst: Optional[float] = None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.burst or 0
+        self._updated = clock()
+
+    def consume(self, amount: int) -> float:
+        """Takes ``amount`` bytes and blocks until the bucket is out of debt; returns the wait."""
+        if not self.rate or amount <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def available(self) -> Optional[float]:
+        if not self.rate:
+            return None
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class DownloadSession:
+    """One active download's share of the governor, applied through its yt-dlp params."""
+
+    def __init__(self, session_id: int, label: str, params: Dict[str, Any]):
+        self.id = session_id
+        self.label = label
+        self.params = params
+        self.requested_rate = params.get('ratelimit')
+        self.requested_fragments = params.get('concurrent_fragment_downloads')
+        self.rate: Optional[float] = None
+        self.fragments = 1
+        self.transferred = 0
+        self.throttled = 0.0
+        self.started_at = time.time()
+        self._last_bytes: Dict[str, int] = {}
+        self._governor: Optional["DownloadGovernor"] = None
+
+    def bind(self, params: Dict[str, Any]):
+        """Points later reallocations at the live params of the YoutubeDL running the download."""
+        self.params = params
+        self._apply()
+
+    def hook(self, d: Dict[str, Any]):
+        """
+        Progress hook: charges newly downloaded bytes to the shared bucket.
+        The first event of a file only sets its starting point, since a resumed
+        ``.part`` file reports the bytes it already had; a file reported
+        ``finished`` without any ``downloading`` event was already on disk.
+        """
+        filename = d.get('filename')
+        downloaded = d.get('downloaded_bytes')
+        if not filename or downloaded is None:
+            return
+        last = self._last_bytes.get(filename)
+        if d.get('status') == 'downloading':
+            self._last_bytes[filename] = downloaded
+        else:
+            self._last_bytes.pop(filename, None)
+        if last is None:
+            return
+        delta = downloaded - last
+        if delta > 0:
+            self.transferred += delta
+            self.throttled += self._governor.bucket.consume(delta)
+
+    def _apply(self):
+        # yt-dlp's downloaders read these from params for every chunk/file, so updates apply mid-run.
+        self.params['ratelimit'] = self.rate
+        self.params['concurrent_fragment_downloads'] = self.fragments
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "rate": self.rate,
+            "fragments": self.fragments,
+            "transferred_bytes": self.transferred,
+            "throttled_seconds": round(self.throttled, 3),
+            "started_at": self.started_at,
+        }
+
+
+class DownloadGovernor:
+    """
+    Process-wide limits for yt-dlp downloads.
+
+    All downloads draw from one token bucket of ``max_rate`` bytes per second.
+    Each active download is also given an equal share of ``max_rate`` as its
+    ``ratelimit`` and of ``max_fragments`` as its ``concurrent_fragment_downloads``
+    (never more than ``fragments_per_job``), and shares are recomputed whenever
+    a download starts or ends. Lower limits set by a profile are kept.
+    """
+
+    def __init__(self, max_rate: Optional[float] = None, fragments_per_job: int = 4, max_fragments: int = 8):
+        self.max_rate = max_rate
+        self.fragments_per_job = fragments_per_job
+        self.max_fragments = max_fragments
+        self.bucket = TokenBucket(max_rate)
+        self._lock = threading.Lock()
+        self._sessions: Dict[int, DownloadSession] = {}
+        self._ids = itertools.count(1)
+
+    @contextmanager
+    def session(self, label: str, ydl_opts: Dict[str, Any]) -> Iterator[DownloadSession]:
+        """
+        Registers a download for the duration of the block. Its allocation is
+        written into ``ydl_opts`` and its hook appended to ``progress_hooks``;
+        call ``bind`` with the live YoutubeDL params once the instance exists.
+        """
+        session = DownloadSession(next(self._ids), label, ydl_opts)
+        session._governor = self
+        ydl_opts['progress_hooks'] = list(ydl_opts.get('progress_hooks', [])) + [session.hook]
+        with self._lock:
+            self._sessions[session.id] = session
+            self._rebalance()
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self._sessions.pop(session.id, None)
+                self._rebalance()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = [s.to_dict() for s in self._sessions.values()]
+        return {
+            "max_rate": self.max_rate,
+            "available_bytes": self.bucket.available(),
+            "fragments_per_job": self.fragments_per_job,
+            "max_fragments": self.max_fragments,
+            "active": len(sessions),
+            "allocated_fragments": sum(s["fragments"] for s in sessions),
+            "sessions": sessions,
+        }
+
+    def _rebalance(self):
+        active = len(self._sessions)
+        if not active:
+            return
+        rate_share = self.max_rate / active if self.max_rate else None
+        fragment_share = max(1, self.max_fragments // active)
+        for session in self._sessions.values():
+            rates = [r for r in (rate_share, session.requested_rate) if r]
+            session.rate = int(min(rates)) if rates else None
+            session.fragments = min(fragment_share, self.fragments_per_job,
+                                    session.requested_fragments or self.fragments_per_job)
+            session._apply()
+
+
+def _parse_rate(value: Optional[str]) -> Optional[float]:
+    if not value or value.strip() in ("0", ""):
+        return None
+    rate = parse_bytes(value.strip())
+    if rate is None:
+        raise ValueError(f"Invalid DOWNLOAD_MAX_RATE '{value}'; expected bytes per second such as 5M or 500K.")
+    return rate
+
+
+download_governor = DownloadGovernor(
+    max_rate=_parse_rate(os.getenv("DOWNLOAD_MAX_RATE")),
+    fragments_per_job=int(os.getenv("DOWNLOAD_FRAGMENTS_PER_JOB", 4)),
+    max_fragments=int(os.getenv("DOWNLOAD_MAX_FRAGMENTS", 8)),
+)
@@ -0,0 +1,252 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Union
+
+from .progress import ProgressChannel
+
+from ..common.state import state as shared_state
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit."""
+
+
+class Job:
+    """A unit of work run by the JobManager, with progress visible while it runs."""
+
+    def __init__(self, kind: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.channel = ProgressChannel()
+        self.result: Any = None
+        self.error: Optional[str] = None
+        # HTTP status for a failed job, from the exception's ``status_code`` when it has one.
+        self.status_code: Optional[int] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+        # Set by a JobManager with shared state.
+        self.lease: Optional[str] = None
+        self.saved_at = 0.0
+
+    @property
+    def progress(self) -> Dict[str, Dict[str, Any]]:
+        """Latest progress event per file, as published to the job's channel."""
+        return self.channel.snapshot()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class _RemoteProgress:
+    """Follows another worker's job by polling its record, yielding what ProgressChannel.subscribe would."""
+
+    def __init__(self, job: "RemoteJob"):
+        self.job = job
+
+    async def subscribe(self, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        manager, job_id = self.job.manager, self.job.id
+        record = self.job.record
+        seen = 0
+        idle = 0.0
+        while True:
+            events = sorted(record.get("progress", {}).values(), key=lambda e: e["seq"])
+            fresh = [event for event in events if event["seq"] > seen]
+            for event in fresh:
+                yield event
+            seen = max([seen] + [event["seq"] for event in fresh])
+            job = await asyncio.to_thread(RemoteJob, record, manager)
+            if job.done:
+                yield job.final or {"type": "end", "seq": seen + 1, "status": job.status, "error": job.error}
+                return
+            idle = 0.0 if fresh else idle + manager.sync_interval
+            if heartbeat is not None and idle >= heartbeat:
+                idle = 0.0
+                yield None
+            await asyncio.sleep(manager.sync_interval)
+            record = await asyncio.to_thread(manager.state.get, "jobs", job_id) or record
+
+
+class RemoteJob:
+    """
+    A job submitted to another worker, as last saved to the shared state.
+    Offers the parts of Job the status, events and result endpoints use.
+    """
+
+    def __init__(self, record: Dict[str, Any], manager: "JobManager"):
+        self.record = record
+        self.manager = manager
+        self.id = record["job_id"]
+        self.kind = record["kind"]
+        self.params = record["params"]
+        self.status = record["status"]
+        self.error = record.get("error")
+        self.result = record.get("result")
+        self.status_code = record.get("status_code")
+        self.final = record.get("final")
+        self.channel = _RemoteProgress(self)
+        if not self.done and manager.state.holder(f"job:{self.id}") is None:
+            # Its worker stopped renewing the job's lease: it exited mid-job.
+            self.status = FAILED
+            self.error = "The worker running this job exited."
+            self.final = None
+
+    @property
+    def progress(self) -> Dict[str, Dict[str, Any]]:
+        return self.record.get("progress", {})
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        keys = ("job_id", "kind", "params", "progress", "created_at", "started_at", "finished_at")
+        return {**{key: self.record.get(key) for key in keys}, "status": self.status, "error": self.error}
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded worker pool.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queued`` wait
+    behind them; further submissions raise JobQueueFull. Finished jobs are
+    kept for ``retention`` seconds so clients can fetch their status and result.
+
+    With a shared ``state`` (see common.state) each job's record, including
+    its progress at most every ``sync_interval`` seconds, is also saved there
+    so any worker can answer for it, and the job holds the ``job:<id>`` lease
+    until it finishes so a job whose worker died is reported as failed.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queued: int = 20, retention: float = 3600,
+                 state=None, sync_interval: float = 1.0):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.state = state
+        self.sync_interval = sync_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+
+    def submit(self, kind: str, params: Dict[str, Any], fn: Callable[[Job], Any]) -> Job:
+        """Queues ``fn(job)`` and returns the job immediately."""
+        job = Job(kind, params)
+        with self._lock:
+            self._prune()
+            if self._count(QUEUED) >= self.max_queued:
+                raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting).")
+            self._jobs[job.id] = job
+        if self.shared:
+            # Outside the lock: the state may wait on SQLite, and other submits need not wait with it.
+            job.lease = self.state.acquire(f"job:{job.id}")
+            self._save(job)
+            job.channel.on_publish = lambda: self._save(job, throttle=True)
+        # The job runs in the submitter's context, so its logs keep the request id.
+        job.future = self._executor.submit(contextvars.copy_context().run, self._run, job, fn)
+        return job
+
+    @property
+    def shared(self) -> bool:
+        return self.state is not None and self.state.shared
+
+    def get(self, job_id: str) -> Optional[Union[Job, RemoteJob]]:
+        """The job, also when another worker runs it; None once it is unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.shared:
+            record = self.state.get("jobs", job_id)
+            if record is not None:
+                return RemoteJob(record, self)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "queued": self._count(QUEUED),
+                "running": self._count(RUNNING),
+                "finished": self._count(SUCCEEDED) + self._count(FAILED),
+            }
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> Any:
+        job.status = RUNNING
+        job.started_at = time.time()
+        if self.shared:
+            self._save(job)
+        try:
+            job.result = fn(job)
+            job.status = SUCCEEDED
+            return job.result
+        except Exception as e:
+            job.error = str(e)
+            job.status_code = getattr(e, "status_code", None)
+            job.status = FAILED
+            raise
+        finally:
+            job.finished_at = time.time()
+            job.channel.close(job.status, job.error)
+            if self.shared:
+                self._save(job)
+                self.state.release(f"job:{job.id}", job.lease)
+
+    def _save(self, job: Job, throttle: bool = False):
+        now = time.monotonic()
+        if throttle and now - job.saved_at < self.sync_interval:
+            return
+        job.saved_at = now
+        record = job.to_dict()
+        record.update(result=job.result, status_code=job.status_code, final=job.channel.final, owner=self.state.owner)
+        try:
+            # Kept as long as the job itself; the record of a running job outlives a crashed worker by that much too.
+            self.state.put("jobs", job.id, record, ttl=self.retention)
+        except Exception as e:
+            logger.warning(f"Could not save job {job.id} to the shared state: {e}")
+
+    def _count(self, status: str) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+download_jobs = JobManager(
+    max_workers=int(os.getenv("DOWNLOAD_JOB_WORKERS", 2)),
+    max_queued=int(os.getenv("DOWNLOAD_JOB_MAX_QUEUED", 20)),
+    retention=float(os.getenv("DOWNLOAD_JOB_RETENTION", 3600)),
+    state=shared_state,
+)
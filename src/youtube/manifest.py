@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+MANIFEST_FILENAME = ".manifest.json"
+MANIFEST_VERSION = 1
+# Suffixes yt-dlp uses for in-progress files; never recorded in a manifest.
+TEMP_SUFFIXES = ('.part', '.ytdl', '.temp', '.tmp')
+HASH_CHUNK_SIZE = 1024 * 1024
+# yt-dlp treats subtitle languages as regexes; only plain codes can be planned.
+PLAIN_LANG_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class DownloadPlan(NamedTuple):
+    """What has to be fetched to satisfy a request, given the current manifest."""
+    needs_media: bool
+    missing_subtitles: List[str]
+    needs_thumbnail: bool
+    # True when the existing manifest cannot be trusted and the run starts over.
+    fresh: bool = False
+
+    @property
+    def up_to_date(self) -> bool:
+        return not (self.needs_media or self.missing_subtitles or self.needs_thumbnail)
+
+
+def manifest_path(download_path: str) -> str:
+    return os.path.join(download_path, MANIFEST_FILENAME)
+
+
+def load_manifest(download_path: str) -> Optional[Dict[str, Any]]:
+    """Loads the manifest for a video directory, or None if missing or unreadable."""
+    try:
+        with open(manifest_path(download_path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, OSError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(download_path: str, manifest: Dict[str, Any]):
+    """Writes the manifest atomically so readers never see a partial file."""
+    path = manifest_path(download_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_artifact(filename: str) -> bool:
+    """Returns whether ``filename`` is a finished download rather than bookkeeping or a temp file."""
+    return filename != MANIFEST_FILENAME and not filename.endswith(TEMP_SUFFIXES)
+
+
+def describe_files(download_path: str, filenames: Iterable[str],
+                   previous: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Records size, mtime and sha256 for each existing file. Hashes from
+    ``previous`` are reused when size and mtime are unchanged, so large
+    videos are only hashed once.
+    """
+    previous = previous or {}
+    files = {}
+    for name in sorted(set(filenames)):
+        path = os.path.join(download_path, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        old = previous.get(name)
+        if old and old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns:
+            sha256 = old["sha256"]
+        else:
+            sha256 = file_sha256(path)
+        files[name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}
+    return files
+
+
+def info_fingerprint(info: Dict[str, Any]) -> str:
+    """Hashes the info-dict fields that identify the published content of a video."""
+    fields = {k: info.get(k) for k in ("id", "extractor_key", "title", "duration", "upload_date", "modified_date")}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def requested_subtitle_langs(ydl_opts: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    Returns the subtitle languages the options ask for, [] for none, or None
+    when the selection cannot be planned (``all`` or regex patterns).
+    """
+    if not ydl_opts.get('writesubtitles') and not ydl_opts.get('writeautomaticsub'):
+        return []
+    if ydl_opts.get('allsubtitles'):
+        return None
+    langs = ydl_opts.get('subtitleslangs') or []
+    if any(not PLAIN_LANG_RE.match(lang) or lang == 'all' for lang in langs):
+        return None
+    return list(langs)
+
+
+def files_intact(manifest: Dict[str, Any], download_path: str) -> bool:
+    """Checks that every recorded file still exists with its recorded size."""
+    for name, meta in manifest.get("files", {}).items():
+        try:
+            if os.path.getsize(os.path.join(download_path, name)) != meta.get("size"):
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def plan_download(manifest: Optional[Dict[str, Any]], download_path: str, ydl_opts: Dict[str, Any],
+                  fingerprint: Optional[str] = None) -> DownloadPlan:
+    """
+    Compares the requested options with the manifest and returns what still
+    has to be fetched. ``fingerprint`` is the current info fingerprint when
+    known; a mismatch means the video changed upstream.
+    """
+    langs = requested_subtitle_langs(ydl_opts)
+    if langs is None:
+        langs = []
+        full = True
+    else:
+        full = False
+    wants_thumbnail = bool(ydl_opts.get('writethumbnail'))
+    wants_media = not ydl_opts.get('skip_download')
+
+    if (full or manifest is None or not files_intact(manifest, download_path)
+            or (fingerprint and manifest.get("info_fingerprint") != fingerprint)):
+        return DownloadPlan(needs_media=wants_media, missing_subtitles=langs, needs_thumbnail=wants_thumbnail, fresh=True)
+
+    needs_media = wants_media and not (manifest.get("media") and manifest.get("format") == ydl_opts.get('format'))
+    subtitles = manifest.get("subtitles", {})
+    known = set(subtitles.get("available", [])) | set(subtitles.get("unavailable", []))
+    missing = [lang for lang in langs if lang not in known]
+    needs_thumbnail = wants_thumbnail and not manifest.get("thumbnail")
+    return DownloadPlan(needs_media=needs_media, missing_subtitles=missing, needs_thumbnail=needs_thumbnail)
+
+
+def produced_files(info: Dict[str, Any]) -> List[str]:
+    """Collects the basenames of files yt-dlp reports having written for ``info``."""
+    paths = []
+    for download in info.get('requested_downloads') or []:
+        paths.append(download.get('filepath'))
+    for sub in (info.get('requested_subtitles') or {}).values():
+        paths.append(sub.get('filepath'))
+    for thumb in info.get('thumbnails') or []:
+        paths.append(thumb.get('filepath'))
+    return [os.path.basename(p) for p in paths if p]
+
+
+def update_manifest(manifest: Optional[Dict[str, Any]], download_path: str, info: Dict[str, Any],
+                    ydl_opts: Dict[str, Any], plan: DownloadPlan, new_files: Iterable[str]) -> Dict[str, Any]:
+    """Merges the outcome of a yt-dlp run described by ``plan`` into ``manifest``."""
+    previous_files = (manifest or {}).get("files", {})
+    if plan.fresh:
+        manifest = {}
+        kept_files = []
+    else:
+        manifest = dict(manifest or {})
+        kept_files = list(previous_files)
+    subtitles = manifest.get("subtitles", {"available": [], "unavailable": []})
+
+    if plan.missing_subtitles:
+        written = {lang for lang, sub in (info.get('requested_subtitles') or {}).items() if sub.get('filepath')}
+        # A language the video lists but that was not written failed to download; it stays
+        # unrecorded so the next request asks for it again. Only unlisted ones are unavailable.
+        listed = set(info.get('subtitles') or {})
+        if ydl_opts.get('writeautomaticsub'):
+            listed |= set(info.get('automatic_captions') or {})
+        available = set(subtitles.get("available", [])) | (written & set(plan.missing_subtitles))
+        unavailable = (set(subtitles.get("unavailable", [])) | (set(plan.missing_subtitles) - written - listed)) - available
+        subtitles = {"available": sorted(available), "unavailable": sorted(unavailable)}
+
+    names = [n for n in set(kept_files) | set(new_files) | set(produced_files(info)) if is_artifact(n)]
+    manifest.update({
+        "version": MANIFEST_VERSION,
+        "video_id": info.get('id', manifest.get("video_id")),
+        "title": info.get('title', manifest.get("title")),
+        "info_fingerprint": info_fingerprint(info),
+        "subtitles": subtitles,
+        "files": describe_files(download_path, names, previous_files),
+        "updated_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    })
+    if plan.needs_media:
+        manifest["media"] = True
+        manifest["format"] = ydl_opts.get('format')
+        manifest["format_id"] = info.get('format_id')
+    if plan.needs_thumbnail:
+        manifest["thumbnail"] = True
+    return manifest
@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Iterator, Optional, Set
+
+from .ydl_pool import ydl_pool
+
+logger = logging.getLogger(__name__)
+
+# Flat extraction lists entries from the playlist pages without resolving
+# each video's formats.
+FLAT_OPTS = {
+    'extract_flat': 'in_playlist',
+    'noplaylist': False,
+    'lazy_playlist': True,
+}
+
+
+def existing_video_ids(download_root: str) -> Set[str]:
+    """Lists the video_id directories already present, with a single directory read."""
+    try:
+        with os.scandir(download_root) as it:
+            return {entry.name for entry in it if entry.is_dir()}
+    except FileNotFoundError:
+        return set()
+
+
+def _entry_line(index: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "entry",
+        "index": index,
+        "id": entry.get('id'),
+        "title": entry.get('title'),
+        "url": entry.get('url') or entry.get('webpage_url'),
+        "duration": entry.get('duration'),
+        "uploader": entry.get('uploader') or entry.get('channel'),
+    }
+
+
+def iter_flat_playlist(url: str, base_opts: Dict[str, Any], cursor: int, page_size: int,
+                       skip_ids: Optional[Set[str]] = None) -> Iterator[str]:
+    """
+    Yields NDJSON lines for one page of a playlist or channel: a ``playlist``
+    header, one ``entry`` line per item as the extractor produces it, and a
+    closing ``page`` line whose ``next_cursor`` resumes the listing (None at
+    the end). ``cursor`` counts positions in the playlist, so entries skipped
+    via ``skip_ids`` still advance it.
+
+    The page is handed to yt-dlp as ``playlist_items``, so extractors with
+    paged playlists fetch only the pages that cover it; extractors that can
+    only walk their listing from the start (e.g. YouTube's continuations)
+    still do so, but inside yt-dlp without building the skipped entries.
+    """
+    request_opts = dict(base_opts, **FLAT_OPTS, playlist_items=f"{cursor + 1}:{cursor + page_size}")
+    scanned = returned = 0
+    try:
+        with ydl_pool.lease(base_opts, request_opts) as ydl:
+            result = ydl.extract_info(url, download=False, process=False)
+            if result.get('_type') in ('playlist', 'multi_video', 'url', 'url_transparent'):
+                # Resolves redirects to the playlist and slices its entries to the page.
+                result = ydl.process_ie_result(result, download=False)
+            if result.get('_type') in ('playlist', 'multi_video'):
+                entries = result.get('entries') or []
+                indexes = [i - 1 for i in result.get('requested_entries') or []]
+            else:
+                entries = [result][cursor:cursor + page_size]
+                indexes = []
+            yield json.dumps({
+                "type": "playlist",
+                "id": result.get('id'),
+                "title": result.get('title'),
+                "uploader": result.get('uploader') or result.get('channel'),
+            }, ensure_ascii=False) + "\n"
+
+            for offset, entry in enumerate(entries):
+                scanned += 1
+                if not entry:
+                    continue
+                if skip_ids and entry.get('id') in skip_ids:
+                    continue
+                returned += 1
+                index = indexes[offset] if offset < len(indexes) else cursor + offset
+                yield json.dumps(_entry_line(index, entry), ensure_ascii=False) + "\n"
+    except Exception as e:
+        logger.error(f"Flat playlist listing failed for URL: {url} with error: {e}")
+        yield json.dumps({"type": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+        return
+
+    next_cursor = cursor + scanned if scanned == page_size else None
+    yield json.dumps({
+        "type": "page",
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+        "scanned": scanned,
+        "returned": returned,
+    }) + "\n"
@@ -0,0 +1,157 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = "default"
+PROFILES_KEY = "profiles"
+
+# Expected types for the options we rely on; anything else is passed through to yt-dlp.
+OPTION_TYPES = {
+    "format": str,
+    "outtmpl": str,
+    "subtitlesformat": str,
+    "subtitleslangs": list,
+    "quiet": bool,
+    "noplaylist": bool,
+    "skip_download": bool,
+    "writesubtitles": bool,
+    "writeautomaticsub": bool,
+    "writethumbnail": bool,
+    "writeinfojson": bool,
+    "concurrent_fragment_downloads": int,
+    "ratelimit": int,
+}
+
+
+class ProfileError(ValueError):
+    """Raised for unknown profile names or invalid profile definitions."""
+
+
+def _validate_options(name: str, opts: Dict[str, Any], ydl) -> None:
+    if not isinstance(opts, dict):
+        raise ProfileError(f"Profile '{name}' must be a JSON object.")
+    for key, expected in OPTION_TYPES.items():
+        if key in opts and not isinstance(opts[key], expected):
+            raise ProfileError(f"Profile '{name}': option '{key}' must be of type {expected.__name__}.")
+    if any(not isinstance(lang, str) for lang in opts.get("subtitleslangs", [])):
+        raise ProfileError(f"Profile '{name}': 'subtitleslangs' must be a list of strings.")
+    if opts.get("format"):
+        try:
+            ydl.build_format_selector(opts["format"])
+        except Exception as e:
+            raise ProfileError(f"Profile '{name}': invalid format '{opts['format']}': {e}") from e
+
+
+def parse_profiles(raw: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Builds the profile table from the ydl_opts.json structure: top-level
+    options form the ``default`` profile and each entry under ``profiles``
+    overrides it. A file without ``profiles`` yields only ``default``.
+    """
+    if not isinstance(raw, dict):
+        raise ProfileError("ydl_opts.json must contain a JSON object.")
+    raw = dict(raw)
+    named = raw.pop(PROFILES_KEY, {}) or {}
+    if not isinstance(named, dict):
+        raise ProfileError(f"'{PROFILES_KEY}' must be a JSON object of profile definitions.")
+
+    ydl = yt_dlp.YoutubeDL({"quiet": True}, auto_init=False)
+    _validate_options(DEFAULT_PROFILE, raw, ydl)
+    profiles = {DEFAULT_PROFILE: raw}
+    for name, overrides in named.items():
+        _validate_options(name, overrides, ydl)
+        profiles[name] = {**raw, **overrides}
+    return profiles
+
+
+class ProfileStore:
+    """
+    Named yt-dlp option profiles, parsed and validated once and kept in memory.
+
+    The backing file is stat-ed at most every ``check_interval`` seconds and
+    re-parsed only when its mtime changes. A broken edit is reported and the
+    previously loaded profiles stay in use.
+    """
+
+    def __init__(self, path: str, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, Dict[str, Any]] = {DEFAULT_PROFILE: {}}
+        self._mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def load(self):
+        """Loads the file now, raising ProfileError if it is invalid."""
+        with self._lock:
+            self._load_locked()
+
+    def get(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Returns a private copy of the options for profile ``name``."""
+        name = name or DEFAULT_PROFILE
+        self._maybe_reload()
+        with self._lock:
+            opts = self._profiles.get(name)
+            if opts is None:
+                raise ProfileError(f"Unknown profile '{name}'. Available profiles: {', '.join(sorted(self._profiles))}.")
+            return copy.deepcopy(opts)
+
+    def names(self) -> List[str]:
+        self._maybe_reload()
+        with self._lock:
+            return sorted(self._profiles)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+            try:
+                self._load_locked()
+                logger.info(f"Reloaded yt-dlp profiles from {self.path}: {', '.join(sorted(self._profiles))}")
+            except (ProfileError, OSError) as e:
+                # Keep serving the last good profiles; retry once the file changes again.
+                self._mtime = mtime
+                logger.warning(f"Ignoring invalid yt-dlp profiles in {self.path}: {e}")
+
+    def _load_locked(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'r') as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            mtime, raw = None, {}
+        except json.JSONDecodeError as e:
+            raise ProfileError(f"{self.path} is not valid JSON: {e}") from e
+        self._profiles = parse_profiles(raw)
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+        self.reloads += 1
+
+
+profile_store = ProfileStore(
+    os.getenv("YTDLP_PROFILES_FILE", os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ydl_opts.json')),
+    check_interval=float(os.getenv("YTDLP_PROFILES_CHECK_INTERVAL", 2)),
+)
+try:
+    profile_store.load()
+except (ProfileError, OSError) as e:
+    # A broken file must not take the router down: serve the empty default profile, as without
+    # a file, and pick the profiles up once the file is fixed.
+    logger.error(f"Invalid yt-dlp profiles in {profile_store.path}; starting without them: {e}")
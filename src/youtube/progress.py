@@ -0,0 +1,225 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+# Per-subscriber buffer; a slow client drops its oldest events, the latest state always arrives.
+SUBSCRIBER_QUEUE_SIZE = 256
+_CLOSED = object()
+
+
+def _offer(queue: asyncio.Queue, item: Any):
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(item)
+
+
+class ProgressChannel:
+    """
+    Progress events for one download, published from the yt-dlp hook thread
+    and fanned out to any number of asyncio subscribers (SSE or WebSocket).
+
+    The latest event per file is kept as the snapshot served by the job status
+    API and replayed to late subscribers. ``close`` sends a final ``end`` event,
+    wakes every subscriber and drops the per-file state of unfinished files.
+    """
+
+    def __init__(self, on_publish: Optional[Callable[[], None]] = None):
+        self._lock = threading.Lock()
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+        self._seq = 0
+        self.final: Optional[Dict[str, Any]] = None
+        # Called on the publishing thread after each event, e.g. to mirror progress to the shared state.
+        self.on_publish = on_publish
+
+    @property
+    def closed(self) -> bool:
+        return self.final is not None
+
+    def publish(self, event: Dict[str, Any]):
+        with self._lock:
+            if self.closed:
+                return
+            self._seq += 1
+            event["seq"] = self._seq
+            self._files[event["file"]] = event
+            subscribers = list(self._subscribers)
+        self._broadcast(subscribers, event)
+        if self.on_publish is not None:
+            self.on_publish()
+
+    def close(self, status: str, error: Optional[str] = None):
+        with self._lock:
+            if self.closed:
+                return
+            self._seq += 1
+            self.final = {"type": "end", "seq": self._seq, "status": status, "error": error}
+            # Finished files stay in the snapshot; in-progress ones are left over from a failed run.
+            self._files = {k: v for k, v in self._files.items() if v["status"] == "finished"}
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        self._broadcast(subscribers, self.final)
+        self._broadcast(subscribers, _CLOSED)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(event) for name, event in self._files.items()}
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    async def subscribe(self, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yields the current per-file state, then new events until the download
+        ends. Yields ``None`` after ``heartbeat`` idle seconds so callers can
+        keep the connection alive.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            backlog: List[Dict[str, Any]] = [dict(e) for e in self._files.values()]
+            final = self.final
+            if final is None:
+                self._subscribers.add(entry)
+        try:
+            for event in sorted(backlog, key=lambda e: e["seq"]):
+                yield event
+            if final is not None:
+                yield final
+                return
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if item is _CLOSED:
+                    return
+                yield item
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+
+    @staticmethod
+    def _broadcast(subscribers, item):
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, item)
+            except RuntimeError:
+                # The subscriber's event loop is gone; its entry is dropped on close.
+                pass
+
+
+class ProgressHook:
+    """
+    yt-dlp progress hook that publishes bytes, speed, ETA and fragment
+    position to a ProgressChannel. ``downloading`` updates for a file are
+    throttled to one per ``min_interval`` seconds, checked before any event
+    is built; ``finished`` and ``error`` are always published.
+    """
+
+    def __init__(self, channel: ProgressChannel, min_interval: float = 0.5, clock=time.monotonic):
+        self.channel = channel
+        self.min_interval = min_interval
+        self._clock = clock
+        self._last_sent: Dict[str, float] = {}
+
+    def __call__(self, d: Dict[str, Any]):
+        status = d.get('status')
+        filename = d.get('filename')
+        if not filename:
+            return
+        if status == 'downloading':
+            now = self._clock()
+            if now - self._last_sent.get(filename, float('-inf')) < self.min_interval:
+                return
+            self._last_sent[filename] = now
+        elif status in ('finished', 'error'):
+            self._last_sent.pop(filename, None)
+        else:
+            return
+        self.channel.publish(progress_event(d))
+
+
+def progress_percent(d: Dict[str, Any]) -> Optional[float]:
+    """Percentage from fragments for HLS/DASH downloads, otherwise from bytes."""
+    if d.get('status') == 'finished':
+        return 100.0
+    if 'fragment_index' in d and 'fragment_count' in d:
+        if d['fragment_count']:
+            return d['fragment_index'] / d['fragment_count'] * 100
+        return None
+    total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+    if total_bytes and d.get('downloaded_bytes') is not None:
+        return d['downloaded_bytes'] / total_bytes * 100
+    return None
+
+
+def progress_event(d: Dict[str, Any]) -> Dict[str, Any]:
+    percent = progress_percent(d)
+    return {
+        "type": "progress",
+        "file": os.path.basename(d['filename']),
+        "status": d['status'],
+        "percent": round(percent, 1) if percent is not None else None,
+        "downloaded_bytes": d.get('downloaded_bytes'),
+        "total_bytes": d.get('total_bytes') or d.get('total_bytes_estimate'),
+        "speed": d.get('speed'),
+        "eta": d.get('eta'),
+        "elapsed": d.get('elapsed'),
+        "fragment_index": d.get('fragment_index'),
+        "fragment_count": d.get('fragment_count'),
+    }
+
+
+class PhaseTimer:
+    """
+    Splits one yt-dlp run into extract, download and merge time using its
+    progress and postprocessor hooks, and reports each with
+    ``observe(phase, seconds)`` when the run ends. Extraction is the time up
+    to the first progress update and is only reported when ``extracting``.
+    """
+
+    def __init__(self, observe: Callable[[str, float], None], extracting: bool = True, clock=time.monotonic):
+        self._observe = observe
+        self.extracting = extracting
+        self._clock = clock
+        self._started: Optional[float] = None
+        self._download_started: Optional[float] = None
+        self._download_finished: Optional[float] = None
+        self._merge_started: Optional[float] = None
+
+    def start(self):
+        self._started = self._clock()
+
+    def progress_hook(self, d: Dict[str, Any]):
+        now = self._clock()
+        if self._download_started is None:
+            self._download_started = now
+        if d.get('status') == 'finished':
+            self._download_finished = now
+
+    def postprocessor_hook(self, d: Dict[str, Any]):
+        if d.get('postprocessor') != 'Merger':
+            return
+        if d.get('status') == 'started':
+            self._merge_started = self._clock()
+        elif d.get('status') == 'finished' and self._merge_started is not None:
+            self._observe('merge', self._clock() - self._merge_started)
+            self._merge_started = None
+
+    def stop(self):
+        if self._started is None:
+            return
+        now = self._clock()
+        if self.extracting:
+            self._observe('extract', (self._download_started or now) - self._started)
+        if self._download_started is not None and self._download_finished is not None:
+            self._observe('download', self._download_finished - self._download_started)
+        self._started = None
@@ -1,19 +1,46 @@
-import os, json, zipfile, uuid
-from urllib.parse import urlparse, parse_qs
-from fastapi import APIRouter, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+import os, json, asyncio, copy, logging
+from urllib.parse import urlparse, parse_qs, quote
+from fastapi import APIRouter, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import yt_dlp
 
+from ..common.log import log_context, ydl_logger
+from ..common.metrics import QUEUE_DEPTH, registry
+from ..common.timing import add_span, observe_phase, phase, phase_iter, span
+from ..common.state import state
+from ..common.storage import storage
+from .cache import info_cache
+from .executor import extraction_backend
+from .files import (ArtifactFileResponse, ArtifactNotFound, artifact_etag, artifact_path, list_artifacts,
+                    not_modified, repr_digest, stat_etag)
+from .governor import download_governor
+from .jobs import Job, JobQueueFull, FAILED, download_jobs
+from .manifest import is_artifact, load_manifest, save_manifest, plan_download, update_manifest, info_fingerprint
+from .playlist import existing_video_ids, iter_flat_playlist
+from .profiles import DEFAULT_PROFILE, ProfileError, profile_store
+from .progress import PhaseTimer, ProgressChannel, ProgressHook, progress_percent
+from .singleflight import SingleFlight
+from .utils import canonical_video_key, extract_youtube_id
+from .ydl_pool import ydl_pool
+from .zipstream import iter_zip, content_disposition
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 class URLRequest(BaseModel):
     url: str
+    profile: Optional[str] = None
 
 class DownloadRequest(BaseModel):
     url: str
     subtitles: Optional[List[str]] = None
+    profile: Optional[str] = None
+    subtitles_only: bool = False
 
 class VideoFormat(BaseModel):
     format_id: Optional[str] = None
@@ -43,78 +70,184 @@ class VideoInfo(BaseModel):
     formats: Optional[List[VideoFormat]] = Field([], description="List of available video formats.")
     subtitles: Optional[Dict[str, SubtitleInfo]] = Field({}, description="Available subtitles by language code.")
     original_url: str = Field(..., description="The original URL provided.")
-    
-def cleanup_zip_file(zip_path: str):
-    """Removes the temporary zip file."""
-    if zip_path and os.path.exists(zip_path):
-        os.remove(zip_path)
 
+class BatchInfoRequest(BaseModel):
+    urls: List[str] = Field(..., description="Video URLs to retrieve metadata for.")
+    concurrency: Optional[int] = Field(None, description="Maximum concurrent extractions, capped by INFO_BATCH_CONCURRENCY.")
+    profile: Optional[str] = Field(None, description="Named yt-dlp options profile from ydl_opts.json.")
+
+class PlaylistRequest(BaseModel):
+    url: str = Field(..., description="Playlist or channel URL.")
+    cursor: int = Field(0, ge=0, description="Position to resume from; use next_cursor from the previous page.")
+    page_size: int = Field(100, ge=1, le=1000, description="Number of playlist positions to scan.")
+    only_new: bool = Field(False, description="Return only ids without a directory under VIDEO_DOWNLOAD_PATH.")
+
+class BatchInfoItem(BaseModel):
+    index: int = Field(..., description="Position of the URL in the request.")
+    url: str = Field(..., description="The URL as provided in the request.")
+    info: Optional[VideoInfo] = Field(None, description="Video metadata, if extraction succeeded.")
+    error: Optional[str] = Field(None, description="Error message, if extraction failed.")
+    
 def safe_get(data, key, default=None):
     """Safely get a value from a nested dictionary."""
     return data.get(key, default)
 
-def load_base_ydl_opts():
-    """Loads the base yt-dlp options from the JSON config file."""
-    try:
-        # Construct the path to the JSON file relative to the current script
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        opts_path = os.path.join(dir_path, 'ydl_opts.json')
-        with open(opts_path, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-def get_video_info(url: str) -> dict:
-    """Extracts video information using yt-dlp."""
-    ydl_opts = load_base_ydl_opts()
-    
+def load_base_ydl_opts(profile: Optional[str] = None) -> dict:
+    """
+    Returns a copy of the yt-dlp options for ``profile`` (``default`` when
+    omitted). Profiles are parsed from ydl_opts.json once and kept in memory;
+    the file is re-read only after it changes.
+    """
+    return profile_store.get(profile)
+
+def download_root() -> str:
+    return os.environ.get('VIDEO_DOWNLOAD_PATH', 'downloads')
+
+def base_ydl_opts(profile: Optional[str] = None) -> dict:
+    """Returns the profile options shared by every request: the JSON config plus cookies."""
+    ydl_opts = load_base_ydl_opts(profile)
     cookie_path = os.environ.get('COOKIE_FILE_PATH')
-    if cookie_path and os.path.exists(cookie_path):
+    if cookie_path and os.path.exists(cookie_path) and os.path.getsize(cookie_path) > 0:
         ydl_opts['cookiefile'] = cookie_path
-        
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        return ydl.sanitize_info(info)
+    return ydl_opts
+
+def extract_video_info(url: str, profile: Optional[str] = None) -> dict:
+    """Extracts video information with the configured backend (threadpool or worker processes)."""
+    with phase("extract"):
+        return extraction_backend.extract(url, base_ydl_opts(profile))
+
+def info_cache_key(url: str, profile: Optional[str] = None) -> str:
+    key = canonical_video_key(url)
+    return key if not profile or profile == DEFAULT_PROFILE else f"{profile}|{key}"
+
+def get_video_info(url: str, profile: Optional[str] = None) -> dict:
+    """
+    Returns video information, served from the in-process cache when possible.
+    Concurrent requests for the same video share one extraction.
+    """
+    return info_cache.get_or_load(info_cache_key(url, profile), lambda: extract_video_info(url, profile))
+
+def build_video_info(info: dict, url: str) -> VideoInfo:
+    """Maps a yt-dlp info dict onto the VideoInfo response model."""
+    subtitles_info = {}
+    if info.get('subtitles'):
+        for lang, subs in info['subtitles'].items():
+            if subs:
+                sub_data = subs[-1]
+                subtitles_info[lang] = SubtitleInfo(lang_code=lang, name=sub_data.get('name', lang), ext=sub_data.get('ext'))
+
+    return VideoInfo(
+        video_id=safe_get(info, 'id'),
+        title=safe_get(info, 'title'),
+        description=safe_get(info, 'description'),
+        uploader=safe_get(info, 'uploader'),
+        upload_date=safe_get(info, 'upload_date'),
+        duration=safe_get(info, 'duration'),
+        thumbnail=safe_get(info, 'thumbnail'),
+        tags=safe_get(info, 'tags', []),
+        view_count=safe_get(info, 'view_count'),
+        like_count=safe_get(info, 'like_count'),
+        formats=[VideoFormat(**f) for f in safe_get(info, 'formats', [])],
+        subtitles=subtitles_info,
+        original_url=safe_get(info, 'webpage_url', url)
+    )
 
 @router.post("/info", response_model=VideoInfo)
 def get_info(request: URLRequest):
     """Retrieves metadata for a given video URL."""
-    print(f"\n========== STARTING GET_INFO for URL: {request.url} ==========\n", flush=True)
+    logger.info(f"========== STARTING GET_INFO for URL: {request.url} ==========")
     try:
-        info = get_video_info(request.url)
-        subtitles_info = {}
-        if info.get('subtitles'):
-            for lang, subs in info['subtitles'].items():
-                if subs:
-                    sub_data = subs[-1]
-                    subtitles_info[lang] = SubtitleInfo(lang_code=lang, name=sub_data.get('name', lang), ext=sub_data.get('ext'))
-
-        standardized_info = VideoInfo(
-            video_id=safe_get(info, 'id'),
-            title=safe_get(info, 'title'),
-            description=safe_get(info, 'description'),
-            uploader=safe_get(info, 'uploader'),
-            upload_date=safe_get(info, 'upload_date'),
-            duration=safe_get(info, 'duration'),
-thumbnail=safe_get(info, 'thumbnail'),
-            tags=safe_get(info, 'tags', []),
-            view_count=safe_get(info, 'view_count'),
-            like_count=safe_get(info, 'like_count'),
-            formats=[VideoFormat(**f) for f in safe_get(info, 'formats', [])],
-            subtitles=subtitles_info,
-            original_url=safe_get(info, 'webpage_url', request.url)
-        )
-        print(f"\n========== GET_INFO COMPLETED SUCCESSFULLY for URL: {request.url} ==========\n", flush=True)
+        info = get_video_info(request.url, request.profile)
+        standardized_info = build_video_info(info, request.url)
+        logger.info(f"========== GET_INFO COMPLETED SUCCESSFULLY for URL: {request.url} ==========")
         return standardized_info
+    except ProfileError as e:
+        logger.error(f"========== GET_INFO FAILED for URL: {request.url} with error: {e} ==========")
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        print(f"\n========== GET_INFO FAILED for URL: {request.url} with error: {e} ==========\n", flush=True)
+        logger.error(f"========== GET_INFO FAILED for URL: {request.url} with error: {e} ==========")
         return JSONResponse(status_code=500, content={"error": f"An error occurred: {str(e)}"})
 
+INFO_BATCH_CONCURRENCY = int(os.getenv("INFO_BATCH_CONCURRENCY", 8))
+INFO_BATCH_MAX_URLS = int(os.getenv("INFO_BATCH_MAX_URLS", 1000))
+# Minimum seconds between published progress updates per file, and idle seconds between keep-alives.
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", 0.5))
+PROGRESS_HEARTBEAT = float(os.getenv("PROGRESS_HEARTBEAT", 15))
+
+async def iter_batch_info(urls: List[str], concurrency: int, profile: Optional[str] = None):
+    """
+    Extracts info for ``urls`` with at most ``concurrency`` extractions at a
+    time and yields one NDJSON line per URL in completion order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def extract_one(index: int, url: str) -> BatchInfoItem:
+        async with semaphore:
+            try:
+                info = await run_in_threadpool(get_video_info, url, profile)
+                return BatchInfoItem(index=index, url=url, info=build_video_info(info, url))
+            except Exception as e:
+                logger.error(f"Batch info failed for URL: {url} with error: {e}")
+                return BatchInfoItem(index=index, url=url, error=str(e))
+
+    tasks = [asyncio.ensure_future(extract_one(i, url)) for i, url in enumerate(urls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            yield json.dumps(jsonable_encoder(item), ensure_ascii=False) + "\n"
+    finally:
+        # The client may disconnect mid-stream; do not leave extractions queued.
+        for task in tasks:
+            task.cancel()
+
+@router.post("/info/batch")
+async def get_info_batch(request: BatchInfoRequest):
+    """
+    Retrieves metadata for many URLs at once. Results are streamed as
+    newline-delimited JSON, one BatchInfoItem per URL as soon as it is ready;
+    a failing URL is reported in its own line without failing the batch.
+    """
+    if len(request.urls) > INFO_BATCH_MAX_URLS:
+        return JSONResponse(status_code=400, content={"error": f"At most {INFO_BATCH_MAX_URLS} URLs per batch."})
+    concurrency = max(1, min(request.concurrency or INFO_BATCH_CONCURRENCY, INFO_BATCH_CONCURRENCY))
+    try:
+        load_base_ydl_opts(request.profile)
+    except ProfileError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    logger.info(f"========== STARTING BATCH GET_INFO for {len(request.urls)} URLs (concurrency {concurrency}) ==========")
+    return StreamingResponse(iter_batch_info(request.urls, concurrency, request.profile), media_type="application/x-ndjson")
+
+@router.post("/playlist")
+def list_playlist(request: PlaylistRequest):
+    """
+    Lists the entries of a playlist or channel with flat extraction, without
+    resolving each video's formats. Streams NDJSON: a ``playlist`` header,
+    one ``entry`` line per item of the page, then a ``page`` line with ``next_cursor``.
+    """
+    logger.info(f"========== STARTING PLAYLIST LISTING for URL: {request.url} (cursor {request.cursor}) ==========")
+    skip_ids = existing_video_ids(download_root()) if request.only_new else None
+    return StreamingResponse(
+        iter_flat_playlist(request.url, base_ydl_opts(), request.cursor, request.page_size, skip_ids),
+        media_type="application/x-ndjson",
+    )
+
+@router.get("/info/cache")
+def get_info_cache_stats():
+    """Returns hit/miss/eviction counters for the video info cache."""
+    return info_cache.stats()
+
+@router.get("/profiles")
+def list_profiles():
+    """Lists the yt-dlp option profiles that requests can select with ``profile``."""
+    return {"default": DEFAULT_PROFILE, "profiles": profile_store.names(), "reloads": profile_store.reloads}
+
 class MyLogger:
+    """Routes yt-dlp output to the rate-limited ``yt_dlp`` logger."""
+
     def debug(self, msg):
         # For compatibility with yt-dlp, we filter out some messages
         if msg.startswith('[debug] '):
-            pass
+            ydl_logger.debug(msg)
         else:
             self.info(msg)
 
@@ -122,151 +255,424 @@ class MyLogger:
         if "Language Name" in msg: # Filter out subtitle listing header
             pass
         elif not msg.startswith('[download]'):
-            print(msg, flush=True)
+            ydl_logger.info(msg)
 
     def warning(self, msg):
-        print(f"WARNING: {msg}", flush=True)
+        ydl_logger.warning(msg)
 
     def error(self, msg):
-        print(f"ERROR: {msg}", flush=True)
+        ydl_logger.error(msg)
 
 class ProgressLogger:
+    """Logs a line per file at 25% milestones; live progress goes to the job's ProgressChannel."""
+
     def __init__(self):
         self.last_reported_milestone = {}
 
     def hook(self, d):
+        filename = d.get('filename')
         if d['status'] == 'downloading':
-            filename = d.get('filename')
             if not filename:
                 return
-
-            percentage = None
-            if 'fragment_index' in d and 'fragment_count' in d:
-                # Progress based on fragments for HLS downloads
-                if d['fragment_count'] > 0:
-                    percentage = (d['fragment_index'] / d['fragment_count']) * 100
-            else:
-                # Progress based on bytes for other downloads
-                total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-                if total_bytes and total_bytes > 0:
-                    percentage = (d['downloaded_bytes'] / total_bytes) * 100
-            
+            percentage = progress_percent(d)
             if percentage is None:
                 return
-
             milestone = int(percentage / 25) * 25
-            
-            last_milestone = self.last_reported_milestone.get(filename, -1)
-
-            if milestone > last_milestone:
-                print(f"Downloading: {filename} - {milestone}% ...", flush=True)
+            if milestone > self.last_reported_milestone.get(filename, -1):
+                ydl_logger.info(f"Downloading: {filename} - {milestone}% ...")
                 self.last_reported_milestone[filename] = milestone
 
         elif d['status'] == 'finished':
-            filename = d.get('filename')
             if not filename:
-                print("Finished downloading a file.", flush=True)
+                ydl_logger.info("Finished downloading a file.")
                 return
+            if self.last_reported_milestone.pop(filename, -1) < 100:
+                ydl_logger.info(f"Downloading: {filename} - 100% ...")
+            ydl_logger.info(f"Finished downloading {filename}")
 
-            last_milestone = self.last_reported_milestone.get(filename, -1)
-            if last_milestone < 100:
-                print(f"Downloading: {filename} - 100% ...", flush=True)
-            
-            print(f"Finished downloading {filename}", flush=True)
-            if filename in self.last_reported_milestone:
-                del self.last_reported_milestone[filename]
-        
         elif d['status'] == 'error':
-            filename = d.get('filename')
-            print(f"Error downloading {filename}", flush=True)
-            if filename and filename in self.last_reported_milestone:
-                del self.last_reported_milestone[filename]
+            ydl_logger.error(f"Error downloading {filename}")
+            self.last_reported_milestone.pop(filename, None)
+
+def resolve_video_id(url: str) -> Optional[str]:
+    """Derives the video_id used to name the download directory for ``url``."""
+    video_id = extract_youtube_id(url)
+    if video_id:
+        return video_id
+    parsed_url = urlparse(url)
+    query_id = parse_qs(parsed_url.query).get('v')
+    if query_id:
+        return query_id[0]
+    return parsed_url.path.lstrip('/') or None
+
+def build_download_opts(download_path: str, subtitles: Optional[List[str]],
+                        channel: Optional[ProgressChannel] = None,
+                        profile: Optional[str] = None,
+                        subtitles_only: bool = False) -> dict:
+    """
+    Builds the yt-dlp options for downloading into ``download_path``. With
+    ``subtitles_only`` (or a profile that sets ``skip_download``) only
+    subtitles and the thumbnail are written; the video itself is never fetched.
+    """
+    ydl_opts = base_ydl_opts(profile)
+    ydl_opts['outtmpl'] = f'{download_path}/%(title)s.%(ext)s'
+    ydl_opts['logger'] = MyLogger()
+    progress_logger = ProgressLogger()
+    ydl_opts['progress_hooks'] = [progress_logger.hook]
+    if channel is not None:
+        ydl_opts['progress_hooks'].append(ProgressHook(channel, PROGRESS_MIN_INTERVAL))
+
+    if subtitles is not None:
+        if subtitles:
+            logger.info(f"Subtitles requested for languages: {subtitles}")
+            ydl_opts['writesubtitles'] = True
+            ydl_opts['subtitleslangs'] = subtitles
+            if 'allsubtitles' in ydl_opts:
+                del ydl_opts['allsubtitles']
+        else:
+            logger.info("No subtitles requested.")
+            ydl_opts['writesubtitles'] = False
+            if 'allsubtitles' in ydl_opts:
+                del ydl_opts['allsubtitles']
+
+    if subtitles_only:
+        ydl_opts['skip_download'] = True
+    if ydl_opts.get('skip_download'):
+        logger.info("Subtitles-only download: skipping video and audio.")
+        # Subtitles and thumbnails are still available when no format matches.
+        ydl_opts['ignore_no_formats_error'] = True
+
+    if 'cookiefile' in ydl_opts:
+        logger.info("Using cookies from file.")
+    return ydl_opts
+
+def safe_filename_title(title: Optional[str]) -> str:
+    return "".join(c for c in (title or 'video') if c.isalnum() or c in (' ', '_')).rstrip()
+
+def ensure_downloaded(url: str, download_path: str, subtitles: Optional[List[str]],
+                      channel: Optional[ProgressChannel] = None,
+                      profile: Optional[str] = None,
+                      subtitles_only: bool = False) -> dict:
+    """
+    Makes sure the files requested for ``url`` exist in ``download_path`` and
+    returns the directory's manifest. Requests already covered by the manifest
+    are answered from disk without calling yt-dlp; otherwise only the missing
+    pieces (media, subtitle languages, thumbnail) are fetched. When no media
+    is needed and the video's info is cached, extraction is skipped as well.
+    """
+    ydl_opts = build_download_opts(download_path, subtitles, channel, profile, subtitles_only)
+    manifest = load_manifest(download_path)
+    cached_info = info_cache.get(info_cache_key(url, profile))
+    fingerprint = info_fingerprint(cached_info) if cached_info else None
+    plan = plan_download(manifest, download_path, ydl_opts, fingerprint)
+
+    if plan.up_to_date:
+        logger.info("Requested files are already on disk; skipping yt-dlp.")
+        return manifest
+
+    if not plan.fresh:
+        logger.info(f"Fetching missing pieces: media={plan.needs_media}, "
+                    f"subtitles={plan.missing_subtitles}, thumbnail={plan.needs_thumbnail}")
+        ydl_opts['skip_download'] = not plan.needs_media
+        ydl_opts['writesubtitles'] = bool(plan.missing_subtitles)
+        ydl_opts['subtitleslangs'] = plan.missing_subtitles
+        ydl_opts['writethumbnail'] = plan.needs_thumbnail
+
+    reuse_info = cached_info is not None and not plan.needs_media
+    # Out-of-process extraction is timed by extract_video_info; inline extraction is split off by the hooks.
+    timer = PhaseTimer(observe_phase, extracting=not reuse_info and not extraction_backend.isolated)
+    ydl_opts['progress_hooks'].append(timer.progress_hook)
+    ydl_opts['postprocessor_hooks'] = [timer.postprocessor_hook]
+
+    existing = set(os.listdir(download_path))
+    logger.info("Starting yt-dlp download...")
+    with span("ydl"), download_governor.session(os.path.basename(download_path), ydl_opts) as session, \
+            ydl_pool.lease(base_ydl_opts(profile), ydl_opts) as ydl:
+        session.bind(ydl.params)
+        timer.start()
+        try:
+            if reuse_info:
+                # Subtitle and thumbnail URLs in the cached info are still fresh; no need to extract again.
+                info = ydl.process_ie_result(copy.deepcopy(cached_info), download=True)
+            elif extraction_backend.isolated:
+                # Extraction already ran in a worker process; only download here.
+                info = ydl.process_ie_result(copy.deepcopy(get_video_info(url, profile)), download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
+        finally:
+            timer.stop()
+    logger.info("yt-dlp download finished.")
+
+    new_files = set(os.listdir(download_path)) - existing
+    with span("manifest"):
+        manifest = update_manifest(manifest, download_path, info, ydl_opts, plan, new_files)
+        save_manifest(download_path, manifest)
+    return manifest
+
+# One yt-dlp run per video_id at a time; identical concurrent requests share it.
+download_flights = SingleFlight()
+
+def download_exclusively(video_id: str, fn):
+    """
+    Runs ``fn`` holding the video's download lease, so other workers downloading
+    the same video wait for this one and then find its files in the manifest.
+    """
+    with state.lease(f"download:{video_id}"):
+        return fn()
+
+class DownloadFailed(Exception):
+    """A download that failed in a way the client should see as ``status_code``."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+def run_download_job(job: Job) -> dict:
+    """Job body shared by /download and /download/jobs: fetch files and return the manifest."""
+    add_span("queue", job.started_at - job.created_at)
+    with log_context(job_id=job.id, video_id=job.params["video_id"]), span("job"):
+        url = job.params["url"]
+        subtitles = job.params.get("subtitles")
+        profile = job.params.get("profile")
+        subtitles_only = job.params.get("subtitles_only", False)
+        video_id = job.params["video_id"]
+        logger.info(f"Starting download for URL: {url}")
+        download_path = os.path.join(download_root(), video_id)
+
+        # Requests for the same video only share a download when they ask for the same files.
+        tag = (profile or DEFAULT_PROFILE, tuple(subtitles) if subtitles is not None else None, subtitles_only)
+        try:
+            with storage.in_use(video_id):
+                os.makedirs(download_path, exist_ok=True)
+                logger.info(f"Download path set to: {download_path}")
+                manifest, shared = download_flights.do_shared(
+                    video_id,
+                    lambda: download_exclusively(video_id, lambda: ensure_downloaded(
+                        url, download_path, subtitles, job.channel, profile, subtitles_only)),
+                    tag=tag,
+                )
+        except yt_dlp.utils.DownloadError as e:
+            raise DownloadFailed(500, f"yt-dlp download error: {str(e)}") from e
+        finally:
+            storage.record(video_id)
+        if shared:
+            logger.info(f"Joined in-flight download for video_id: {video_id}")
+        return manifest
+
+def submit_download_job(request: DownloadRequest) -> Job:
+    video_id = resolve_video_id(request.url)
+    if not video_id:
+        logger.info("Could not extract video_id from URL.")
+        raise DownloadFailed(400, "Could not extract video_id from URL.")
+    try:
+        load_base_ydl_opts(request.profile)
+    except ProfileError as e:
+        raise DownloadFailed(400, str(e)) from e
+    params = {"url": request.url, "subtitles": request.subtitles, "profile": request.profile,
+              "subtitles_only": request.subtitles_only, "video_id": video_id}
+    try:
+        return download_jobs.submit("download", params, run_download_job)
+    except JobQueueFull as e:
+        raise DownloadFailed(429, str(e)) from e
+
+def build_zip_response(manifest: dict, video_id: str) -> StreamingResponse:
+    """
+    Streams a zip of every non-mp4 file recorded in ``manifest``, plus any
+    other finished file in the directory, such as uploads. Entries are
+    compressed and sent as they are read; Starlette iterates the generator in
+    the threadpool, so deflate never runs on the event loop.
+    """
+    download_path = os.path.join(download_root(), video_id)
+    if not os.path.isdir(download_path):
+        raise DownloadFailed(410, f"Files for video_id {video_id} were evicted; download it again.")
+    safe_title = safe_filename_title(manifest.get("title"))
+    with os.scandir(download_path) as it:
+        on_disk = {entry.name for entry in it
+                   if entry.is_file() and not entry.name.startswith('.') and is_artifact(entry.name)}
+    downloaded_files = sorted(on_disk.union(manifest.get("files", {})))
+    logger.info(f"Downloaded files: {downloaded_files}")
+
+    files_to_zip = [f for f in downloaded_files if not f.endswith('.mp4')]
+    if not files_to_zip:
+        logger.info("No non-mp4 files found to zip.")
+        raise DownloadFailed(404, "No non-mp4 files found to zip.")
+
+    zip_filename = f"{safe_title}_subtitles.zip"
+    logger.info(f"Streaming zip of files: {files_to_zip}")
+    entries = [(os.path.join(download_path, f), f) for f in files_to_zip]
+    storage.touch(video_id)
+    return StreamingResponse(
+        storage.hold(video_id, phase_iter(iter_zip(entries), "zip")),
+        media_type='application/zip',
+        headers={"Content-Disposition": content_disposition(zip_filename)},
+    )
 
 @router.post("/download")
-def download_video(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def download_video(request: DownloadRequest):
     """
     Downloads files, then zips and returns all non-mp4 files,
     leaving the original files in the download directory.
+    With ``subtitles_only`` the video is not downloaded at all; only
+    subtitles and the thumbnail are fetched into the same zip.
+    The download runs on the bounded download worker pool; this request
+    waits for it without holding a threadpool thread.
     """
-    print("\n========== STARTING API DOWNLOAD ==========\n", flush=True)
-    zip_path = None
+    logger.info("========== STARTING API DOWNLOAD ==========")
     try:
-        print(f"Starting download for URL: {request.url}", flush=True)
-        download_root = os.environ.get('VIDEO_DOWNLOAD_PATH', 'downloads')
-        parsed_url = urlparse(request.url)
-        video_id = parse_qs(parsed_url.query).get('v')
-        if not video_id:
-            video_id = parsed_url.path.lstrip('/')
-            if not video_id:
-                print("Could not extract video_id from URL.", flush=True)
-                return JSONResponse(status_code=400, content={"error": "Could not extract video_id from URL."})
-        
-        if isinstance(video_id, list): video_id = video_id[0]
-
-        download_path = os.path.join(download_root, video_id)
-        os.makedirs(download_path, exist_ok=True)
-        print(f"Download path set to: {download_path}", flush=True)
-
-        ydl_opts = load_base_ydl_opts()
-        ydl_opts['outtmpl'] = f'{download_path}/%(title)s.%(ext)s'
-        ydl_opts['logger'] = MyLogger()
-        progress_logger = ProgressLogger()
-        ydl_opts['progress_hooks'] = [progress_logger.hook]
-        
-        if request.subtitles is not None:
-            if request.subtitles:
-                print(f"Subtitles requested for languages: {request.subtitles}", flush=True)
-                ydl_opts['writesubtitles'] = True
-                ydl_opts['subtitleslangs'] = request.subtitles
-                if 'allsubtitles' in ydl_opts:
-                    del ydl_opts['allsubtitles']
-            else:
-                print("No subtitles requested.", flush=True)
-                ydl_opts['writesubtitles'] = False
-                if 'allsubtitles' in ydl_opts:
-                    del ydl_opts['allsubtitles']
-
-        cookie_path = os.environ.get('COOKIE_FILE_PATH')
-        if cookie_path and os.path.exists(cookie_path) and os.path.getsize(cookie_path) > 0:
-            print("Using cookies from file.", flush=True)
-            ydl_opts['cookiefile'] = cookie_path
-        
-        print("Starting yt-dlp download...", flush=True)
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(request.url, download=True)
-            video_title = info.get('title', 'video')
-            safe_title = "".join(c for c in video_title if c.isalnum() or c in (' ', '_')).rstrip()
-        print("yt-dlp download finished.", flush=True)
-
-        downloaded_files = os.listdir(download_path)
-        print(f"Downloaded files: {downloaded_files}", flush=True)
-        
-        zip_filename = f"{safe_title}_subtitles.zip"
-        zip_path = os.path.join("/tmp", zip_filename)
-        
-        files_to_zip = [f for f in downloaded_files if not f.endswith('.mp4')]
-
-        if not files_to_zip:
-            print("No non-mp4 files found to zip.", flush=True)
-            return JSONResponse(status_code=404, content={"error": "No non-mp4 files found to zip."})
-
-        print(f"Zipping files: {files_to_zip}", flush=True)
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file in files_to_zip:
-                file_path = os.path.join(download_path, file)
-                zipf.write(file_path, arcname=file)
-        print(f"Zip file created at: {zip_path}", flush=True)
-        
-        background_tasks.add_task(cleanup_zip_file, zip_path)
-        
-        print(f"\n========== API DOWNLOAD COMPLETED SUCCESSFULLY for URL: {request.url} ==========\n", flush=True)
-        return FileResponse(path=zip_path, media_type='application/zip', filename=zip_filename)
-
-    except yt_dlp.utils.DownloadError as e:
-        print(f"\n========== API DOWNLOAD FAILED for URL: {request.url} with error: {e} ==========\n", flush=True)
-        if zip_path: cleanup_zip_file(zip_path)
-        return JSONResponse(status_code=500, content={"error": f"yt-dlp download error: {str(e)}"})
+        # Submitting and pinning may write to the shared state, so they run off the event loop.
+        job = await run_in_threadpool(submit_download_job, request)
+        # Pinned while the zip is prepared; the stream pins the directory again once it starts.
+        async with storage.ain_use(job.params["video_id"]):
+            manifest = await asyncio.wrap_future(job.future)
+            response = await run_in_threadpool(build_zip_response, manifest, job.params["video_id"])
+        logger.info(f"========== API DOWNLOAD COMPLETED SUCCESSFULLY for URL: {request.url} ==========")
+        return response
+    except DownloadFailed as e:
+        logger.error(f"========== API DOWNLOAD FAILED for URL: {request.url} with error: {e} ==========")
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
     except Exception as e:
-        print(f"\n========== API DOWNLOAD FAILED for URL: {request.url} with unexpected error: {e} ==========\n", flush=True)
-        if zip_path: cleanup_zip_file(zip_path)
-        return JSONResponse(status_code=500, content={"error": f"An unexpected error occurred: {str(e)}"})
\ No newline at end of file
+        logger.error(f"========== API DOWNLOAD FAILED for URL: {request.url} with unexpected error: {e} ==========")
+        return JSONResponse(status_code=500, content={"error": f"An unexpected error occurred: {str(e)}"})
+
+@router.post("/download/jobs", status_code=202)
+def create_download_job(request: DownloadRequest):
+    """
+    Queues a download and returns its job id immediately. Poll
+    GET /download/jobs/{job_id} (or subscribe to GET /download/jobs/{job_id}/events
+    or the /ws WebSocket) for progress, then fetch the zip from
+    GET /download/jobs/{job_id}/result.
+    """
+    logger.info(f"========== QUEUEING DOWNLOAD JOB for URL: {request.url} ==========")
+    try:
+        job = submit_download_job(request)
+    except DownloadFailed as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    logger.info(f"Queued download job {job.id} for video_id: {job.params['video_id']}")
+    return {"job_id": job.id, "status": job.status, "video_id": job.params["video_id"]}
+
+@router.get("/download/jobs/{job_id}")
+def get_download_job(job_id: str):
+    """Returns the status and per-file progress of a download job."""
+    job = download_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job not found: {job_id}"})
+    return job.to_dict()
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    """Encodes a progress event as an SSE message; ``None`` becomes a keep-alive comment."""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@router.get("/download/jobs/{job_id}/events")
+async def stream_download_job_events(job_id: str):
+    """
+    Streams a job's progress as Server-Sent Events: the current state of each
+    file, then ``progress`` events (bytes, speed, ETA, fragment index) as they
+    are published, and a final ``end`` event with the job status.
+    """
+    job = await run_in_threadpool(download_jobs.get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job not found: {job_id}"})
+
+    async def events():
+        async for event in job.channel.subscribe(heartbeat=PROGRESS_HEARTBEAT):
+            yield format_sse(event)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/download/jobs/{job_id}/ws")
+async def download_job_events_ws(websocket: WebSocket, job_id: str):
+    """Same events as /download/jobs/{job_id}/events, sent as JSON WebSocket messages."""
+    job = await run_in_threadpool(download_jobs.get, job_id)
+    if job is None:
+        await websocket.close(code=4404, reason=f"Job not found: {job_id}")
+        return
+    await websocket.accept()
+    try:
+        async for event in job.channel.subscribe(heartbeat=PROGRESS_HEARTBEAT):
+            await websocket.send_json(event if event is not None else {"type": "keep-alive"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/download/jobs/{job_id}/result")
+def get_download_job_result(job_id: str):
+    """Returns the zip of a finished download job, like POST /download does."""
+    job = download_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job not found: {job_id}"})
+    if not job.done:
+        return JSONResponse(status_code=409, content={"error": f"Job is still {job.status}.", "status": job.status})
+    if job.status == FAILED:
+        return JSONResponse(status_code=job.status_code or 500, content={"error": job.error, "status": job.status})
+    try:
+        with storage.in_use(job.params["video_id"]):
+            return build_zip_response(job.result, job.params["video_id"])
+    except DownloadFailed as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+
+@router.get("/files/{video_id}")
+def list_video_files(video_id: str, request: Request):
+    """
+    Lists the downloaded files of a video, including the mp4 that the
+    /download zip leaves out. Each file can be fetched from ``url``.
+    """
+    try:
+        files = list_artifacts(download_root(), video_id)
+    except ArtifactNotFound as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    for f in files:
+        f["url"] = quote(request.url_for("get_video_file", video_id=video_id, filename=f["name"]).path)
+    return {"video_id": video_id, "files": files}
+
+@router.api_route("/files/{video_id}/{filename}", methods=["GET", "HEAD"])
+def get_video_file(video_id: str, filename: str, request: Request):
+    """
+    Serves one downloaded file. Supports Range and If-Range for parallel and
+    resumed transfers, and ETag/Last-Modified for conditional requests; the
+    ETag is the file's sha256 from the manifest when it is current.
+    """
+    try:
+        path = artifact_path(download_root(), video_id, filename)
+        st = os.stat(path)
+    except (ArtifactNotFound, FileNotFoundError) as e:
+        return JSONResponse(status_code=404, content={"error": str(e) or f"File not found: {filename}"})
+    manifest_etag = artifact_etag(load_manifest(os.path.dirname(path)), filename, st)
+    etag = manifest_etag or stat_etag(st)
+    storage.touch(video_id)
+    if not_modified(request.headers, etag, st.st_mtime):
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {"ETag": etag}
+    if manifest_etag:
+        # Digest of the whole file (RFC 9530), also for range responses, so clients can verify resumed transfers.
+        headers["Repr-Digest"] = repr_digest(manifest_etag.strip('"'))
+    return ArtifactFileResponse(path, filename=filename, stat_result=st, headers=headers,
+                                content_disposition_type="inline")
+
+@router.get("/download/governor")
+def get_download_governor():
+    """Returns the bandwidth and fragment limits and each active download's current allocation."""
+    return download_governor.stats()
+
+def collect_queue_depths():
+    """Mirrors the download queues into the queue depth gauge at scrape time."""
+    stats = download_jobs.stats()
+    QUEUE_DEPTH.set(stats["queued"], queue="download_jobs", state="queued")
+    QUEUE_DEPTH.set(stats["running"], queue="download_jobs", state="running")
+    QUEUE_DEPTH.set(download_flights.in_flight(), queue="download_videos", state="running")
+    QUEUE_DEPTH.set(download_governor.stats()["active"], queue="download_governor", state="running")
+
+registry.add_collector(collect_queue_depths)
+
+@router.get("/download/stats")
+def get_download_stats():
+    """Returns worker pool and queue depth for download jobs."""
+    stats = download_jobs.stats()
+    stats["in_flight_videos"] = download_flights.in_flight()
+    stats["ydl_pool"] = ydl_pool.stats()
+    stats["extraction_backend"] = extraction_backend.stats()
+    stats["governor"] = download_governor.stats()
+    stats["state"] = state.stats()
+    return stats
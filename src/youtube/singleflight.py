@@ -0,0 +1,70 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Flight:
+    def __init__(self, tag: Hashable = None):
+        self.tag = tag
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs ``fn``; callers that arrive while it is
+    still running block until it finishes and receive the same result, or
+    the same exception. Safe to use from the Starlette threadpool.
+
+    An optional ``tag`` describes what the call will produce. A caller whose
+    tag differs from the running call's waits for it to finish and then runs
+    its own call, so at most one execution per key is ever in progress.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], tag: Hashable = None) -> Any:
+        """Runs ``fn`` for ``key``, or joins the call already in flight."""
+        result, _ = self.do_shared(key, fn, tag)
+        return result
+
+    def do_shared(self, key: Hashable, fn: Callable[[], Any], tag: Hashable = None) -> tuple[Any, bool]:
+        """Like ``do`` but also returns whether the result came from another caller."""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = _Flight(tag)
+                    self._flights[key] = flight
+                    break
+                joinable = flight.tag == tag
+                if joinable:
+                    flight.waiters += 1
+
+            flight.done.wait()
+            if joinable:
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result, True
+            # Incompatible call finished; compete to become the next leader.
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def in_flight(self) -> int:
+        """Returns the number of keys currently being executed."""
+        with self._lock:
+            return len(self._flights)
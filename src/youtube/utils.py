@@ -0,0 +1,55 @@
+import re
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com", "youtu.be")
+YOUTUBE_ID_RE = re.compile(r'^[0-9A-Za-z_-]{11}$')
+# Path prefixes under which the next path segment is the video id.
+YOUTUBE_ID_PATH_PREFIXES = ("shorts", "embed", "live", "v", "e")
+
+
+def _is_youtube_host(host: str) -> bool:
+    host = host.lower().split(':')[0]
+    return any(host == h or host.endswith("." + h) for h in YOUTUBE_HOSTS)
+
+
+def extract_youtube_id(url: str) -> Optional[str]:
+    """
+    Extracts the 11-character YouTube video id from the common URL shapes
+    (watch?v=, youtu.be/, /shorts/, /embed/, /live/). Returns None when the
+    URL is not a recognisable YouTube video URL.
+    """
+    parsed = urlparse(url.strip())
+    if not _is_youtube_host(parsed.netloc):
+        return None
+
+    candidate = None
+    if parsed.netloc.lower().split(':')[0].endswith("youtu.be"):
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    else:
+        v = parse_qs(parsed.query).get('v')
+        if v:
+            candidate = v[0]
+        else:
+            segments = [s for s in parsed.path.split('/') if s]
+            if len(segments) >= 2 and segments[0] in YOUTUBE_ID_PATH_PREFIXES:
+                candidate = segments[1]
+
+    if candidate and YOUTUBE_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def canonical_video_key(url: str) -> str:
+    """
+    Returns a cache key that identifies the video behind ``url``.
+
+    YouTube URLs collapse to ``youtube:<id>`` so that different spellings of
+    the same video share one entry; anything else falls back to the URL with
+    the fragment dropped and the host lower-cased.
+    """
+    video_id = extract_youtube_id(url)
+    if video_id:
+        return f"youtube:{video_id}"
+    parsed = urlparse(url.strip())
+    return parsed._replace(netloc=parsed.netloc.lower(), fragment='').geturl()
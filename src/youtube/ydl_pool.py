@@ -0,0 +1,235 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+# Hook options and the public methods that register them. A pooled instance gets one
+# hook of each kind when it is built, which calls whatever hooks the current lease passed.
+HOOK_KEYS = {
+    'progress_hooks': 'add_progress_hook',
+    'postprocessor_hooks': 'add_postprocessor_hook',
+    'post_hooks': 'add_post_hook',
+}
+# Options YoutubeDL.__init__ acts on rather than reading them from params when used.
+# A lease that changes one of them gets a fresh instance of its own instead of a pooled one.
+INIT_KEYS = frozenset({
+    'format', 'postprocessors', 'restrictfilenames', 'compat_opts', 'http_headers',
+    'cookiefile', 'cookiesfrombrowser', 'proxy', 'source_address',
+})
+_MISSING = object()
+
+
+def profile_key(base_opts: Dict[str, Any]) -> str:
+    """Identifies an options profile; instances are only shared within one profile."""
+    return hashlib.sha1(json.dumps(base_opts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _mtime(path: Optional[str]) -> Optional[float]:
+    if not path:
+        return None
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _poolable(base_opts: Dict[str, Any], request_opts: Dict[str, Any]) -> bool:
+    """Whether ``request_opts`` can be applied to an instance built from ``base_opts`` through its params."""
+    if any(base_opts.get(k, _MISSING) != request_opts.get(k, _MISSING) for k in INIT_KEYS):
+        return False
+    if 'outtmpl' in base_opts and 'outtmpl' not in request_opts:
+        return False
+    # The download count behind max_downloads lives on the instance and would carry over.
+    return not request_opts.get('max_downloads')
+
+
+class _PooledYDL:
+    def __init__(self, base_opts: Dict[str, Any]):
+        self.ydl = yt_dlp.YoutubeDL({k: copy.deepcopy(v) for k, v in base_opts.items() if k not in HOOK_KEYS})
+        # Params as normalised by YoutubeDL.__init__; restored after every lease.
+        self.params_snapshot = copy.deepcopy(self.ydl.params)
+        self.hooks: Dict[str, List[Any]] = {key: [] for key in HOOK_KEYS}
+        for key, add_hook in HOOK_KEYS.items():
+            getattr(self.ydl, add_hook)(self._dispatcher(key))
+        self.cookie_mtime = _mtime(base_opts.get('cookiefile'))
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self.broken = False
+
+    def _dispatcher(self, key: str):
+        def dispatch(arg):
+            for hook in self.hooks[key]:
+                hook(arg)
+        return dispatch
+
+
+class YoutubeDLPool:
+    """
+    Keeps warm YoutubeDL instances per options profile.
+
+    Building a YoutubeDL loads extractors, parses the cookie file and, on
+    first request, sets up HTTP handlers with their connection pools. Leasing
+    a pooled instance keeps all of that and only swaps in the per-request
+    options (outtmpl, hooks, logger and any other differing keys), which are
+    reset when the lease ends. Only public interfaces are used for that: the
+    ``params`` dict YoutubeDL reads its options from, and hooks registered
+    once with ``add_*_hook``. Requests that change an option YoutubeDL only
+    reads in ``__init__`` (INIT_KEYS) get a fresh instance instead.
+
+    Once-only warnings and the download count behind ``%(autonumber)s``
+    carry over between leases, as they do when yt-dlp is given several URLs.
+    Instances are recycled after ``max_uses`` leases, after ``max_age``
+    seconds, when the cookie file changes, or when a lease fails with
+    anything other than a normal yt-dlp DownloadError.
+    """
+
+    def __init__(self, max_uses: int = 50, max_idle: int = 4, max_age: float = 3600):
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[_PooledYDL]] = {}
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+        self.unpooled = 0
+
+    @contextmanager
+    def lease(self, base_opts: Dict[str, Any], request_opts: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Yields a YoutubeDL configured with ``request_opts`` (defaults to
+        ``base_opts``). ``base_opts`` selects the profile the instance comes from.
+        """
+        request_opts = request_opts if request_opts is not None else base_opts
+        if not _poolable(base_opts, request_opts):
+            with self._lock:
+                self.unpooled += 1
+            with yt_dlp.YoutubeDL(dict(request_opts)) as ydl:
+                yield ydl
+            return
+        key = profile_key(base_opts)
+        pooled = self._acquire(key, base_opts)
+        try:
+            self._apply(pooled, base_opts, request_opts)
+            yield pooled.ydl
+        except yt_dlp.utils.DownloadError:
+            raise
+        except BaseException:
+            pooled.broken = True
+            raise
+        finally:
+            pooled.uses += 1
+            self._release(key, pooled)
+
+    def warm(self, base_opts: Dict[str, Any], count: int = 1):
+        """Pre-builds up to ``count`` idle instances for a profile."""
+        key = profile_key(base_opts)
+        for _ in range(count):
+            with self._lock:
+                if len(self._idle.get(key, [])) >= min(count, self.max_idle):
+                    return
+            pooled = self._build(base_opts)
+            self._release(key, pooled)
+
+    def clear(self):
+        with self._lock:
+            idle = [p for instances in self._idle.values() for p in instances]
+            self._idle.clear()
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "profiles": len(self._idle),
+                "idle": sum(len(v) for v in self._idle.values()),
+                "created": self.created,
+                "reused": self.reused,
+                "recycled": self.recycled,
+                "unpooled": self.unpooled,
+                "max_uses": self.max_uses,
+                "max_idle": self.max_idle,
+            }
+
+    def _build(self, base_opts: Dict[str, Any]) -> _PooledYDL:
+        pooled = _PooledYDL(base_opts)
+        with self._lock:
+            self.created += 1
+        return pooled
+
+    def _healthy(self, pooled: _PooledYDL) -> bool:
+        return (not pooled.broken
+                and pooled.uses < self.max_uses
+                and time.monotonic() - pooled.created_at < self.max_age
+                and _mtime(pooled.params_snapshot.get('cookiefile')) == pooled.cookie_mtime)
+
+    def _acquire(self, key: str, base_opts: Dict[str, Any]) -> _PooledYDL:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                pooled = idle.pop() if idle else None
+            if pooled is None:
+                return self._build(base_opts)
+            if self._healthy(pooled):
+                with self._lock:
+                    self.reused += 1
+                return pooled
+            self._close(pooled)
+
+    def _release(self, key: str, pooled: _PooledYDL):
+        if self._healthy(pooled):
+            self._reset(pooled)
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle:
+                    idle.append(pooled)
+                    return
+        self._close(pooled)
+
+    def _close(self, pooled: _PooledYDL):
+        with self._lock:
+            self.recycled += 1
+        try:
+            pooled.ydl.close()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled YoutubeDL: {e}")
+
+    @staticmethod
+    def _apply(pooled: _PooledYDL, base_opts: Dict[str, Any], request_opts: Dict[str, Any]):
+        params = pooled.ydl.params
+        for k, v in request_opts.items():
+            if k in HOOK_KEYS or base_opts.get(k, _MISSING) == v:
+                continue
+            if k == 'outtmpl':
+                # params holds the templates of every type, as YoutubeDL.__init__ filled them in.
+                v = dict(pooled.params_snapshot['outtmpl'], **(v if isinstance(v, dict) else {'default': v}))
+            params[k] = v
+        for k in base_opts:
+            if k not in request_opts and k not in HOOK_KEYS:
+                params.pop(k, None)
+        for key in HOOK_KEYS:
+            pooled.hooks[key] = list(request_opts.get(key, []))
+
+    @staticmethod
+    def _reset(pooled: _PooledYDL):
+        params = pooled.ydl.params
+        params.clear()
+        params.update(copy.deepcopy(pooled.params_snapshot))
+        for key in HOOK_KEYS:
+            pooled.hooks[key] = []
+
+
+ydl_pool = YoutubeDLPool(
+    max_uses=int(os.getenv("YTDLP_POOL_MAX_USES", 50)),
+    max_idle=int(os.getenv("YTDLP_POOL_MAX_IDLE", 4)),
+    max_age=float(os.getenv("YTDLP_POOL_MAX_AGE", 3600)),
+)
@@ -0,0 +1,79 @@
+import io
+import os
+import zipfile
+from typing import Iterable, Iterator, List, Tuple
+from urllib.parse import quote
+
+CHUNK_SIZE = 64 * 1024
+# Formats that are already compressed; deflating them burns CPU for no gain.
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif',
+    '.mp4', '.mkv', '.webm', '.flv', '.mov', '.m4a', '.mp3', '.opus', '.aac', '.ogg',
+    '.zip', '.gz', '.xz', '.zst',
+}
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    Write-only, non-seekable target for ZipFile. Written bytes are held only
+    until the next ``drain()``, so memory stays bounded by one chunk plus
+    the deflate buffer. Because it cannot seek, ZipFile writes data
+    descriptors after each entry instead of patching local headers.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> Iterator[bytes]:
+        if self._chunks:
+            data = b''.join(self._chunks)
+            self._chunks.clear()
+            yield data
+
+
+def compression_for(filename: str) -> int:
+    ext = os.path.splitext(filename)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def iter_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yields a zip archive of ``(path, arcname)`` entries as it is built.
+    Files are read and compressed ``chunk_size`` bytes at a time.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for path, arcname in entries:
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = compression_for(arcname)
+            with open(path, 'rb') as src, zf.open(zinfo, 'w', force_zip64=zinfo.file_size > zipfile.ZIP64_LIMIT) as dst:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def content_disposition(filename: str) -> str:
+    """Builds an attachment Content-Disposition header that survives non-ASCII titles."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
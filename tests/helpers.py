@@ -0,0 +1,16 @@
+"""Test doubles shared by the test modules."""
+
+
+class FakeClock:
+    """A clock the test moves by hand; ``sleep`` advances it instead of waiting."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# The router imports its shared modules as src.*, so the repository root goes on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.youtube import router as youtube_router
+
+
+class StubInfo:
+    """Stands in for get_video_info, recording how many extractions overlap."""
+
+    def __init__(self, delay=0.0, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def __call__(self, url, profile=None):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.delay)
+            if url in self.failing:
+                raise RuntimeError(f"cannot extract {url}")
+            return {"id": url.rsplit("=", 1)[-1], "title": f"Title of {url}", "webpage_url": url}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class TestBatchInfo(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(youtube_router, "load_base_ydl_opts", return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app = FastAPI()
+        app.include_router(youtube_router.router, prefix="/api/v1/youtube")
+        self.client = TestClient(app)
+
+    def batch(self, stub, urls, **body):
+        with patch.object(youtube_router, "get_video_info", stub):
+            response = self.client.post("/api/v1/youtube/info/batch", json={"urls": urls, **body})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def urls(self, count):
+        return [f"https://www.youtube.com/watch?v=v{i}" for i in range(count)]
+
+    def test_one_line_per_url(self):
+        urls = self.urls(5)
+        items = self.batch(StubInfo(), urls)
+        self.assertEqual(sorted(item["index"] for item in items), list(range(5)))
+        for item in items:
+            self.assertEqual(item["url"], urls[item["index"]])
+            self.assertEqual(item["info"]["video_id"], f"v{item['index']}")
+            self.assertIsNone(item["error"])
+
+    def test_a_failing_url_is_reported_inline(self):
+        urls = self.urls(4)
+        items = {item["index"]: item for item in self.batch(StubInfo(failing=[urls[1]]), urls)}
+        self.assertEqual(len(items), 4)
+        self.assertIsNone(items[1]["info"])
+        self.assertIn("cannot extract", items[1]["error"])
+        for index in (0, 2, 3):
+            self.assertEqual(items[index]["info"]["title"], f"Title of {urls[index]}")
+
+    def test_requested_concurrency_is_honoured(self):
+        stub = StubInfo(delay=0.1)
+        self.assertEqual(len(self.batch(stub, self.urls(6), concurrency=2)), 6)
+        self.assertEqual(stub.peak, 2)
+
+    def test_concurrency_is_capped(self):
+        stub = StubInfo(delay=0.1)
+        with patch.object(youtube_router, "INFO_BATCH_CONCURRENCY", 3):
+            self.assertEqual(len(self.batch(stub, self.urls(8), concurrency=100)), 8)
+        self.assertEqual(stub.peak, 3)
+
+    def test_too_many_urls_are_rejected(self):
+        stub = StubInfo()
+        with patch.object(youtube_router, "INFO_BATCH_MAX_URLS", 3), \
+                patch.object(youtube_router, "get_video_info", stub):
+            response = self.client.post("/api/v1/youtube/info/batch", json={"urls": self.urls(4)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("3", response.json()["error"])
+        self.assertEqual(stub.peak, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
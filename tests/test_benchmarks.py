@@ -0,0 +1,43 @@
+import os
+import sys
+import unittest
+
+# The benchmark harness lives next to src/ at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fixtures import make_srt, make_text
+from benchmarks.run import compare, measure
+from helpers import FakeClock
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+
+    def test_measure_doubles_loops_until_a_round_is_long_enough(self):
+        clock = FakeClock()
+        calls = []
+
+        def work():
+            calls.append(1)
+            clock.now += 0.3
+
+        stats = measure(work, rounds=2, min_time=1.0, clock=clock)
+        self.assertEqual(stats["loops"], 4)
+        self.assertEqual(len(calls), 1 + 2 + 4 + 4)
+        self.assertAlmostEqual(stats["median"], 0.3)
+
+    def test_compare_flags_slowdowns_beyond_threshold(self):
+        baseline = {"benchmarks": {"a": {"min": 1.0}, "b": {"min": 1.0}, "gone": {"min": 1.0}}}
+        current = {"benchmarks": {"a": {"min": 1.1}, "b": {"min": 1.5}, "new": {"min": 1.0}}}
+        rows = {row["name"]: row for row in compare(current, baseline, threshold=0.2)}
+        self.assertEqual(set(rows), {"a", "b"})
+        self.assertFalse(rows["a"]["regression"])
+        self.assertTrue(rows["b"]["regression"])
+
+    def test_fixtures_are_deterministic(self):
+        self.assertEqual(make_srt(50), make_srt(50))
+        self.assertEqual(make_srt(3).split("\n\n")[0].splitlines()[0], "1")
+        self.assertGreaterEqual(len(make_text(10_000).encode("utf-8")), 10_000)
+
+
+if __name__ == '__main__':
+    unittest.main()
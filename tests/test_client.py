@@ -0,0 +1,116 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import requests
+
+from youtube.client import IntegrityError, backoff_delay, fetch_file, is_transient, read_urls
+from youtube.files import repr_digest
+
+PAYLOAD = os.urandom(300_000)
+SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD with Range support; the first full response is cut off halfway."""
+    requests_seen = []
+    drop_first = True
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        type(self).requests_seen.append(range_header)
+        start = int(range_header.split("=")[1].rstrip("-")) if range_header else 0
+        body = PAYLOAD[start:]
+        self.send_response(206 if range_header else 200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Repr-Digest", repr_digest(SHA256))
+        if range_header:
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        self.end_headers()
+        if type(self).drop_first:
+            type(self).drop_first = False
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFetchFile(unittest.TestCase):
+
+    def setUp(self):
+        RangeHandler.requests_seen = []
+        RangeHandler.drop_first = True
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/file"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, "video.mp4")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_interrupted_transfer_resumes_with_range(self):
+        fetch_file(self.url, self.dest, expected_size=len(PAYLOAD), retries=2)
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        self.assertIsNone(RangeHandler.requests_seen[0])
+        self.assertEqual(len(RangeHandler.requests_seen), 2)
+        self.assertRegex(RangeHandler.requests_seen[1], r"^bytes=[1-9]\d*-$")
+        self.assertFalse(os.path.exists(self.dest + ".part"))
+
+    def test_digest_mismatch_is_rejected(self):
+        RangeHandler.drop_first = False
+        with self.assertRaises(IntegrityError):
+            fetch_file(self.url, self.dest, expected_sha256="0" * 64)
+        self.assertFalse(os.path.exists(self.dest))
+
+    def test_matching_file_is_not_fetched_again(self):
+        with open(self.dest, "wb") as f:
+            f.write(PAYLOAD)
+        fetch_file(self.url, self.dest, expected_size=len(PAYLOAD), expected_sha256=SHA256)
+        self.assertEqual(RangeHandler.requests_seen, [])
+
+
+class TestBatchHelpers(unittest.TestCase):
+
+    def test_read_urls_skips_comments_blanks_and_repeats(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("https://youtu.be/a\n# backfill\n\n  https://youtu.be/b  \nhttps://youtu.be/a\n")
+        try:
+            self.assertEqual(read_urls(f.name), ["https://youtu.be/a", "https://youtu.be/b"])
+        finally:
+            os.remove(f.name)
+
+    def test_backoff_is_jittered_and_capped(self):
+        delays = [backoff_delay(10, base=1, cap=5) for _ in range(50)]
+        self.assertTrue(all(0 <= d <= 5 for d in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_only_transient_errors_are_retried(self):
+        def http_error(status):
+            response = requests.Response()
+            response.status_code = status
+            return requests.exceptions.HTTPError(str(status), response=response)
+
+        self.assertTrue(is_transient(requests.exceptions.ConnectionError()))
+        self.assertTrue(is_transient(http_error(429)))
+        self.assertTrue(is_transient(http_error(503)))
+        self.assertFalse(is_transient(http_error(400)))
+        self.assertFalse(is_transient(IntegrityError("sha256 mismatch")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# The router imports its shared modules as src.*, so the repository root goes on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.state import MemoryState
+from src.common.storage import StorageManager
+from src.youtube import router as youtube_router
+
+
+class TestBuildZipResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for patcher in (patch.dict(os.environ, {"VIDEO_DOWNLOAD_PATH": self.tmp.name}),
+                        patch.object(youtube_router, "storage", StorageManager(self.tmp.name, state=MemoryState()))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.directory = os.path.join(self.tmp.name, "abc")
+        os.makedirs(self.directory)
+        app = FastAPI()
+        app.get("/zip")(lambda: youtube_router.build_zip_response(self.manifest, "abc"))
+        self.client = TestClient(app)
+        self.manifest = {"title": "Video", "files": {"video.en.srt": {}, "video.mp4": {}}}
+
+    def write(self, *names):
+        for name in names:
+            with open(os.path.join(self.directory, name), "wb") as f:
+                f.write(name.encode())
+
+    def zipped(self):
+        response = self.client.get("/zip")
+        self.assertEqual(response.status_code, 200)
+        return sorted(zipfile.ZipFile(io.BytesIO(response.content)).namelist())
+
+    def test_uploaded_files_are_zipped_with_the_manifest_files(self):
+        self.write("video.en.srt", "video.mp4", "notes.txt", "video.fr.srt")
+        self.assertEqual(self.zipped(), ["notes.txt", "video.en.srt", "video.fr.srt"])
+
+    def test_bookkeeping_and_temp_files_are_left_out(self):
+        self.write("video.en.srt", ".manifest.json", ".hidden", "video.webm.part", "upload.tmp")
+        self.assertEqual(self.zipped(), ["video.en.srt"])
+
+    def test_an_upload_alone_is_zipped(self):
+        self.manifest = {"title": "Video", "files": {}}
+        self.write("notes.txt")
+        self.assertEqual(self.zipped(), ["notes.txt"])
+
+
+if __name__ == '__main__':
+    unittest.main()
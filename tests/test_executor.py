@@ -0,0 +1,94 @@
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+import yt_dlp
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube.executor import PROCESS, THREAD, ExtractionBackend, _extract_in_worker
+
+# file:// URLs keep extraction offline: a media file is a direct link, an empty page is unsupported.
+OPTS = {'quiet': True, 'no_warnings': True, 'enable_file_urls': True}
+
+
+class ExtractorFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.video_url = self._file("clip.mp4", b"\0" * 1024)
+        self.page_url = self._file("page.html", b"<html><body>nothing here</body></html>")
+
+    def _file(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return "file://" + path
+
+
+class TestWorkerErrors(ExtractorFiles):
+
+    def test_download_errors_are_rebuilt_without_their_traceback(self):
+        with self.assertRaises(yt_dlp.utils.DownloadError) as e:
+            _extract_in_worker(self.page_url, OPTS)
+        self.assertIn("Unsupported URL", str(e.exception))
+        self.assertIsInstance(pickle.loads(pickle.dumps(e.exception)), yt_dlp.utils.DownloadError)
+
+    def test_other_errors_become_runtime_errors_naming_the_original(self):
+        with self.assertRaises(RuntimeError) as e:
+            _extract_in_worker("unknown://video", OPTS)
+        self.assertIn("NoSupportingHandlers", str(e.exception))
+        pickle.loads(pickle.dumps(e.exception))
+
+
+class TestThreadBackend(ExtractorFiles):
+
+    def test_extracts_in_the_calling_thread(self):
+        backend = ExtractionBackend(THREAD)
+        info = backend.extract(self.video_url, OPTS)
+        self.assertEqual(info["id"], "clip")
+        self.assertEqual(backend.stats(), {"mode": THREAD, "workers": None, "max_tasks": None, "generations": 0})
+
+    def test_rejects_unknown_modes(self):
+        with self.assertRaises(ValueError):
+            ExtractionBackend("fibers")
+
+
+class TestProcessBackend(ExtractorFiles):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = ExtractionBackend(PROCESS, workers=1, max_tasks=2)
+        self.addCleanup(self.backend.shutdown)
+
+    def test_returns_the_sanitized_info_dict(self):
+        info = self.backend.extract(self.video_url, OPTS)
+        local = ExtractionBackend(THREAD).extract(self.video_url, OPTS)
+        keys = ("id", "ext", "url", "extractor", "webpage_url")
+        self.assertEqual({k: info[k] for k in keys}, {k: local[k] for k in keys})
+        # Sanitized: plain JSON types only, nothing that needs the worker's objects.
+        self.assertEqual(json.loads(json.dumps(info)), info)
+
+    def test_errors_reach_the_caller(self):
+        with self.assertRaises(yt_dlp.utils.DownloadError):
+            self.backend.extract(self.page_url, OPTS)
+        with self.assertRaises(RuntimeError):
+            self.backend.extract("unknown://video", OPTS)
+
+    def test_pool_is_replaced_after_max_tasks(self):
+        for _ in range(2):
+            self.backend.extract(self.video_url, OPTS)
+        self.assertEqual(self.backend.generations, 1)
+        self.backend.extract(self.video_url, OPTS)
+        self.assertEqual(self.backend.generations, 2)
+        self.assertEqual(self.backend.stats(), {"mode": PROCESS, "workers": 1, "max_tasks": 2, "generations": 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import unittest
+from email.utils import formatdate
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube.files import ArtifactNotFound, artifact_etag, artifact_path, list_artifacts, not_modified, stat_etag
+from youtube.manifest import describe_files, save_manifest
+
+
+class TestArtifactFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.dir = os.path.join(self.root, "abc")
+        os.makedirs(self.dir)
+        for name, data in (("Video.mp4", b"video"), ("Video.en.srt", b"subs"), ("Video.mp4.part", b"v")):
+            with open(os.path.join(self.dir, name), "wb") as f:
+                f.write(data)
+        save_manifest(self.dir, {"version": 1, "files": describe_files(self.dir, ["Video.mp4"])})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_listing_skips_bookkeeping_and_temp_files(self):
+        files = list_artifacts(self.root, "abc")
+        self.assertEqual([f["name"] for f in files], ["Video.en.srt", "Video.mp4"])
+        self.assertIsNone(files[0]["sha256"])
+        self.assertEqual(len(files[1]["sha256"]), 64)
+        self.assertEqual(files[1]["media_type"], "video/mp4")
+
+    def test_paths_cannot_escape_the_video_directory(self):
+        self.assertTrue(artifact_path(self.root, "abc", "Video.mp4").endswith("Video.mp4"))
+        for video_id, filename in (("abc", "../abc/Video.mp4"), ("..", "abc"), ("abc", ".manifest.json"),
+                                   ("abc", "Video.mp4.part"), ("abc", "missing.mp4"), ("nope", "Video.mp4")):
+            with self.assertRaises(ArtifactNotFound):
+                artifact_path(self.root, video_id, filename)
+
+    def test_etag_comes_from_manifest_while_file_is_unchanged(self):
+        path = os.path.join(self.dir, "Video.mp4")
+        manifest = {"files": describe_files(self.dir, ["Video.mp4"])}
+        etag = artifact_etag(manifest, "Video.mp4", os.stat(path))
+        self.assertEqual(len(etag), 66)
+        os.utime(path, ns=(1, 1))
+        self.assertIsNone(artifact_etag(manifest, "Video.mp4", os.stat(path)))
+
+    def test_conditional_requests(self):
+        st = os.stat(os.path.join(self.dir, "Video.mp4"))
+        etag = stat_etag(st)
+        self.assertTrue(not_modified({"if-none-match": f'"x", {etag}'}, etag, st.st_mtime))
+        self.assertFalse(not_modified({"if-none-match": '"x"'}, etag, st.st_mtime))
+        since = formatdate(st.st_mtime + 1, usegmt=True)
+        self.assertTrue(not_modified({"if-modified-since": since}, etag, st.st_mtime))
+        self.assertFalse(not_modified({"if-modified-since": "garbage"}, etag, st.st_mtime))
+        self.assertFalse(not_modified({}, etag, st.st_mtime))
+
+
+if __name__ == '__main__':
+    unittest.main()
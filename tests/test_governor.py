@@ -0,0 +1,91 @@
+import os
+import sys
+import unittest
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube.governor import DownloadGovernor, TokenBucket
+from helpers import FakeClock
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_consumers_sleep_off_debt(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, burst=100, clock=clock, sleep=clock.sleep)
+        self.assertEqual(bucket.consume(100), 0)
+        self.assertEqual(bucket.consume(50), 0.5)
+        self.assertEqual(clock.now, 0.5)
+        clock.now += 10
+        self.assertEqual(bucket.available(), 100)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=None)
+        self.assertEqual(bucket.consume(10 ** 9), 0)
+        self.assertIsNone(bucket.available())
+
+
+class TestDownloadGovernor(unittest.TestCase):
+
+    def test_shares_are_rebalanced_as_downloads_start_and_end(self):
+        governor = DownloadGovernor(max_rate=1000, fragments_per_job=4, max_fragments=6)
+        first_opts, second_opts = {}, {}
+        with governor.session("a", first_opts):
+            self.assertEqual((first_opts["ratelimit"], first_opts["concurrent_fragment_downloads"]), (1000, 4))
+            with governor.session("b", second_opts):
+                self.assertEqual((first_opts["ratelimit"], first_opts["concurrent_fragment_downloads"]), (500, 3))
+                self.assertEqual(second_opts["ratelimit"], 500)
+                stats = governor.stats()
+                self.assertEqual((stats["active"], stats["allocated_fragments"]), (2, 6))
+            self.assertEqual(first_opts["ratelimit"], 1000)
+        self.assertEqual(governor.stats()["active"], 0)
+
+    def test_lower_profile_limits_are_kept(self):
+        governor = DownloadGovernor(max_rate=None, fragments_per_job=4, max_fragments=8)
+        opts = {"ratelimit": 300, "concurrent_fragment_downloads": 2}
+        with governor.session("a", opts):
+            self.assertEqual((opts["ratelimit"], opts["concurrent_fragment_downloads"]), (300, 2))
+
+    def test_bound_params_follow_reallocation(self):
+        governor = DownloadGovernor(max_rate=1000)
+        live_params = {}
+        with governor.session("a", {}) as session:
+            session.bind(live_params)
+            self.assertEqual(live_params["ratelimit"], 1000)
+            with governor.session("b", {}):
+                self.assertEqual(live_params["ratelimit"], 500)
+
+    def test_hook_charges_downloaded_bytes(self):
+        governor = DownloadGovernor(max_rate=None)
+        opts = {"progress_hooks": []}
+        with governor.session("a", opts) as session:
+            hook = opts["progress_hooks"][-1]
+            hook({"status": "downloading", "filename": "a.mp4", "downloaded_bytes": 400})
+            hook({"status": "downloading", "filename": "a.mp4", "downloaded_bytes": 700})
+            hook({"status": "finished", "filename": "a.mp4", "downloaded_bytes": 1000})
+            self.assertEqual(session.transferred, 600)
+
+    def test_hook_does_not_charge_a_resumed_part_file(self):
+        governor = DownloadGovernor(max_rate=None)
+        opts = {"progress_hooks": []}
+        with governor.session("a", opts) as session:
+            hook = opts["progress_hooks"][-1]
+            hook({"status": "downloading", "filename": "a.mp4", "downloaded_bytes": 5000})
+            hook({"status": "downloading", "filename": "a.mp4", "downloaded_bytes": 5200})
+            hook({"status": "finished", "filename": "a.mp4", "downloaded_bytes": 5500})
+            self.assertEqual(session.transferred, 500)
+
+    def test_hook_does_not_charge_a_file_already_on_disk(self):
+        sleeps = []
+        governor = DownloadGovernor(max_rate=100)
+        governor.bucket._sleep = sleeps.append
+        opts = {"progress_hooks": []}
+        with governor.session("a", opts) as session:
+            opts["progress_hooks"][-1]({"status": "finished", "filename": "a.mp4", "downloaded_bytes": 10 ** 9})
+            self.assertEqual((session.transferred, session.throttled), (0, 0.0))
+        self.assertEqual(sleeps, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
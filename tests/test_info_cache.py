@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+# The modules import their shared state as src.*, so the repository root goes on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.youtube.cache import InfoCache
+from src.youtube.utils import canonical_video_key
+from helpers import FakeClock
+
+
+class TestCanonicalVideoKey(unittest.TestCase):
+
+    def test_youtube_url_variants_share_a_key(self):
+        """Different spellings of the same YouTube video map to one key."""
+        urls = [
+            "https://www.youtube.com/watch?v=jNQXAC9IVRw",
+            "https://youtube.com/watch?feature=share&v=jNQXAC9IVRw&t=10",
+            "https://youtu.be/jNQXAC9IVRw?si=abc",
+            "https://m.youtube.com/shorts/jNQXAC9IVRw",
+            "https://www.youtube.com/embed/jNQXAC9IVRw",
+        ]
+        self.assertEqual({canonical_video_key(u) for u in urls}, {"youtube:jNQXAC9IVRw"})
+
+    def test_other_urls_fall_back_to_normalised_url(self):
+        self.assertEqual(canonical_video_key("https://Example.COM/a#frag"), "https://example.com/a")
+
+
+class TestInfoCache(unittest.TestCase):
+
+    def test_hit_after_miss(self):
+        cache = InfoCache(ttl=60)
+        calls = []
+        loader = lambda: calls.append(1) or {"id": "a"}
+        self.assertEqual(cache.get_or_load("k", loader), {"id": "a"})
+        self.assertEqual(cache.get_or_load("k", loader), {"id": "a"})
+        self.assertEqual(len(calls), 1)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = InfoCache(ttl=10, clock=clock)
+        cache.put("k", {"id": "a"})
+        clock.now = 11
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_lru_eviction_by_count_and_bytes(self):
+        cache = InfoCache(ttl=60, max_entries=2)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        cache.get("a")  # "b" is now least recently used
+        cache.put("c", {"v": 3})
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+
+        cache = InfoCache(ttl=60, max_entries=100, max_bytes=50)
+        cache.put("a", {"v": "x" * 20})
+        cache.put("b", {"v": "y" * 20})
+        self.assertIsNone(cache.get("a"))
+        self.assertLessEqual(cache.stats()["bytes"], 50)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = InfoCache(ttl=60)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"id": "a"}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"id": "a"}] * 5)
+
+    def test_loader_errors_are_not_cached(self):
+        cache = InfoCache(ttl=60)
+
+        def failing():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            cache.get_or_load("k", failing)
+        self.assertEqual(cache.get_or_load("k", lambda: {"id": "a"}), {"id": "a"})
+
+
+if __name__ == '__main__':
+    unittest.main()
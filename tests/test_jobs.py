@@ -0,0 +1,61 @@
+import os
+import sys
+import threading
+import unittest
+
+# The modules import their shared state as src.*, so the repository root goes on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.youtube.jobs import JobManager, JobQueueFull, FAILED, QUEUED, RUNNING, SUCCEEDED
+
+
+class TestJobManager(unittest.TestCase):
+
+    def test_job_runs_and_keeps_progress(self):
+        manager = JobManager(max_workers=1, max_queued=5)
+
+        def work(job):
+            job.channel.publish({"type": "progress", "file": "a.mp4", "status": "finished", "percent": 100})
+            return {"files": ["a.srt"]}
+
+        job = manager.submit("download", {"url": "u"}, work)
+        self.assertEqual(job.future.result(5), {"files": ["a.srt"]})
+        self.assertEqual(job.status, SUCCEEDED)
+        self.assertEqual(manager.get(job.id).to_dict()["progress"]["a.mp4"]["percent"], 100)
+        self.assertEqual(job.channel.final["status"], SUCCEEDED)
+
+    def test_failure_is_recorded(self):
+        manager = JobManager(max_workers=1, max_queued=5)
+
+        def work(job):
+            raise RuntimeError("boom")
+
+        job = manager.submit("download", {}, work)
+        with self.assertRaises(RuntimeError):
+            job.future.result(5)
+        self.assertEqual((job.status, job.error), (FAILED, "boom"))
+
+    def test_queue_depth_limit(self):
+        manager = JobManager(max_workers=1, max_queued=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking(job):
+            started.set()
+            release.wait(5)
+
+        running = manager.submit("download", {}, blocking)
+        started.wait(5)
+        queued = manager.submit("download", {}, blocking)
+        self.assertEqual((running.status, queued.status), (RUNNING, QUEUED))
+        with self.assertRaises(JobQueueFull):
+            manager.submit("download", {}, blocking)
+        self.assertEqual(manager.stats()["queued"], 1)
+
+        release.set()
+        queued.future.result(5)
+        self.assertEqual(manager.stats()["finished"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
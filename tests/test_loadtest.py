@@ -0,0 +1,107 @@
+import io
+import json
+import os
+import random
+import sys
+import unittest
+import urllib.request
+
+# The load-test harness lives next to src/ at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+
+from loadtest.run import arrivals, compare, percentile, summarize
+from loadtest.standins import FakeBilibili, FakeYouTube, make_png, parse_range
+
+
+# The stand-ins listen on 127.0.0.1; never route to them through an environment proxy.
+opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def fetch(url, method="GET", data=None, headers={}):
+    request = urllib.request.Request(url, data=data, method=method, headers=headers)
+    with opener.open(request, timeout=5) as response:
+        return response.status, response.read()
+
+
+class TestReport(unittest.TestCase):
+
+    def test_percentile_interpolates_between_ranks(self):
+        values = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.assertEqual(percentile(values, 50), 3.0)
+        self.assertEqual(percentile(values, 100), 5.0)
+        self.assertAlmostEqual(percentile(values, 95), 4.8)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_summarize_counts_errors_and_throughput_per_endpoint(self):
+        samples = [{"endpoint": "info", "latency": n / 10, "ok": n != 3, "status": 200 if n != 3 else 500}
+                   for n in range(1, 5)]
+        stats = summarize(samples, elapsed=2.0)["info"]
+        self.assertEqual(stats["requests"], 4)
+        self.assertEqual(stats["error_rate"], 0.25)
+        self.assertEqual(stats["throughput"], 1.5)
+        self.assertEqual(stats["statuses"], {"200": 3, "500": 1})
+        self.assertAlmostEqual(stats["max"], 0.4)
+
+    def test_compare_flags_slower_p95_and_more_errors(self):
+        def run(**endpoints):
+            return {"endpoints": {name: {"p95": p95, "error_rate": errors}
+                                  for name, (p95, errors) in endpoints.items()}}
+        rows = compare(run(info=(1.3, 0.0), download=(1.1, 0.0), upload=(1.0, 0.05), translate=(1.0, 0.0)),
+                       run(info=(1.0, 0.0), download=(1.0, 0.0), upload=(1.0, 0.0)),
+                       threshold=0.2, error_threshold=0.01)
+        flagged = {row["name"]: row["regression"] for row in rows}
+        self.assertEqual(flagged, {"info": True, "download": False, "upload": True})
+
+    def test_arrivals_follow_the_rates_and_are_reproducible(self):
+        schedule = arrivals({"info": 50, "upload": 0}, duration=20, rng=random.Random(1))
+        self.assertEqual(schedule, arrivals({"info": 50, "upload": 0}, duration=20, rng=random.Random(1)))
+        self.assertEqual({name for _, name in schedule}, {"info"})
+        self.assertAlmostEqual(len(schedule) / 20, 50, delta=5)
+        self.assertEqual(schedule, sorted(schedule))
+
+
+class TestStandIns(unittest.TestCase):
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=10-19", 100), (10, 19))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-5", 100), (95, 99))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 100))
+        self.assertIsNone(parse_range(None, 100))
+
+    def test_png_is_decodable(self):
+        image = Image.open(io.BytesIO(make_png(8, 4)))
+        self.assertEqual(image.size, (8, 4))
+
+    def test_fake_youtube_serves_info_and_ranges(self):
+        site = FakeYouTube(video_size=1000, subtitle_cues=3, latency=0).start()
+        self.addCleanup(site.stop)
+        status, body = fetch(f"{site.url}/api/videos/abc")
+        info = json.loads(body)
+        self.assertEqual(info["id"], "abc")
+        status, body = fetch(info["formats"][0]["url"], headers={"Range": "bytes=100-"})
+        self.assertEqual((status, body), (206, site.video[100:]))
+        status, body = fetch(info["subtitles"]["en"][0]["url"])
+        self.assertTrue(body.startswith(b"1\n00:00:01,000 --> "))
+
+    def test_fake_bilibili_accepts_a_chunked_upload(self):
+        site = FakeBilibili(chunk_size=4).start()
+        self.addCleanup(site.stop)
+        status, body = fetch(f"{site.url}/member.bilibili.com/preupload?name=a.mp4&size=8")
+        preupload = json.loads(body)
+        self.assertEqual(preupload["OK"], 1)
+        upload_url = f"{site.url}/{preupload['endpoint'].lstrip('/')}/{preupload['upos_uri'][len('upos://'):]}"
+        status, body = fetch(upload_url + "?uploads&output=json", method="POST", data=b"")
+        self.assertEqual(json.loads(body)["OK"], 1)
+        for part in (b"abcd", b"efgh"):
+            self.assertEqual(fetch(upload_url + "?partNumber=1", method="PUT", data=part)[1], b"MULTIPART_PUT_SUCCESS")
+        status, body = fetch(f"{site.url}/member.bilibili.com/x/vu/web/add/v3", method="POST", data=b"{}")
+        self.assertTrue(json.loads(body)["data"]["bvid"].startswith("BV"))
+        stats = site.stats()
+        self.assertEqual((stats["chunks"], stats["chunk_bytes"], stats["submit"]), (2, 8, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
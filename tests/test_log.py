@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import inspect
+import io
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import unittest
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from common.log import (DroppingQueueHandler, RateLimitFilter, bind_log_context, configure_logging,
+                        current_context, log_context, shutdown_logging)
+from helpers import FakeClock
+
+
+def make_record(msg, level=logging.INFO, name="yt_dlp"):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+class TestRateLimitFilter(unittest.TestCase):
+
+    def test_bursts_pass_then_excess_is_counted_and_reported(self):
+        clock = FakeClock()
+        limiter = RateLimitFilter(rate=1, burst=2, key=lambda r: r.msg.split("]")[0], clock=clock)
+        passed = [limiter.filter(make_record("[youtube] page")) for _ in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.assertTrue(limiter.filter(make_record("[info] other key")))
+        self.assertTrue(limiter.filter(make_record("[youtube] warning", logging.WARNING)))
+
+        clock.now = 1
+        record = make_record("[youtube] later")
+        self.assertTrue(limiter.filter(record))
+        self.assertEqual(record.suppressed, 3)
+        self.assertEqual(limiter.suppressed, 3)
+
+
+class TestQueuedLogging(unittest.TestCase):
+
+    def tearDown(self):
+        shutdown_logging()
+        logging.getLogger().handlers.clear()
+
+    def test_records_are_written_as_json_with_bound_context(self):
+        stream = io.StringIO()
+        configure_logging(level="INFO", fmt="json", stream=stream)
+        log = logging.getLogger("test.log")
+        with log_context(request_id="r1", video_id="abc"):
+            log.info("downloading %s", "abc")
+            # Worker threads started from the context (e.g. run_in_threadpool) carry it along.
+            ctx = contextvars.copy_context()
+            t = threading.Thread(target=ctx.run, args=(log.warning, "from a thread"))
+            t.start()
+            t.join()
+        log.debug("hidden")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("failed")
+        shutdown_logging()
+
+        entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([e["message"] for e in entries], ["downloading abc", "from a thread", "failed"])
+        self.assertEqual(entries[0]["request_id"], "r1")
+        self.assertEqual(entries[1]["video_id"], "abc")
+        self.assertEqual(entries[1]["level"], "WARNING")
+        self.assertNotIn("request_id", entries[2])
+        self.assertIn("ValueError: boom", entries[2]["exc"])
+
+    def test_bind_log_context_binds_fields_from_the_arguments(self):
+        @bind_log_context(lambda video_id, **_: {"video_id": video_id})
+        async def upload(video_id, title=None):
+            return current_context()
+
+        self.assertEqual(asyncio.run(upload("abc")), {"video_id": "abc"})
+        self.assertEqual(asyncio.run(upload(title="t", video_id="def")), {"video_id": "def"})
+        self.assertEqual(current_context(), {})
+        self.assertEqual(list(inspect.signature(upload).parameters), ["video_id", "title"])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+        handler.handle(make_record("one"))
+        handler.handle(make_record("two"))
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "one")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube.manifest import (
+    DownloadPlan,
+    MANIFEST_FILENAME,
+    load_manifest,
+    plan_download,
+    save_manifest,
+    update_manifest,
+)
+
+BASE_OPTS = {
+    "format": "bestvideo[height<=?1080]+bestaudio/best",
+    "writesubtitles": True,
+    "writethumbnail": True,
+    "subtitleslangs": ["en"],
+}
+
+
+class TestDownloadManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, data=b"data"):
+        with open(os.path.join(self.dir, name), "wb") as f:
+            f.write(data)
+        return os.path.join(self.dir, name)
+
+    def _first_download(self):
+        info = {
+            "id": "abc", "title": "Video",
+            "requested_downloads": [{"filepath": self._write("Video.mp4", b"video")}],
+            "requested_subtitles": {"en": {"filepath": self._write("Video.en.srt")}},
+            "thumbnails": [{"filepath": self._write("Video.webp")}],
+        }
+        plan = plan_download(None, self.dir, BASE_OPTS)
+        manifest = update_manifest(None, self.dir, info, BASE_OPTS, plan, [])
+        save_manifest(self.dir, manifest)
+        return manifest
+
+    def test_first_download_records_files_and_hashes(self):
+        manifest = self._first_download()
+        self.assertEqual(set(manifest["files"]), {"Video.mp4", "Video.en.srt", "Video.webp"})
+        self.assertEqual(manifest["files"]["Video.mp4"]["size"], 5)
+        self.assertEqual(len(manifest["files"]["Video.mp4"]["sha256"]), 64)
+        self.assertEqual(manifest["subtitles"]["available"], ["en"])
+        self.assertNotIn(MANIFEST_FILENAME, manifest["files"])
+        self.assertEqual(load_manifest(self.dir), manifest)
+
+    def test_covered_request_needs_nothing(self):
+        manifest = self._first_download()
+        self.assertTrue(plan_download(manifest, self.dir, BASE_OPTS).up_to_date)
+
+    def test_new_subtitle_language_is_a_partial_fetch(self):
+        manifest = self._first_download()
+        opts = dict(BASE_OPTS, subtitleslangs=["en", "zh", "fr"])
+        plan = plan_download(manifest, self.dir, opts)
+        self.assertEqual(plan, DownloadPlan(needs_media=False, missing_subtitles=["zh", "fr"], needs_thumbnail=False))
+
+        info = {"id": "abc", "title": "Video",
+                "requested_subtitles": {"zh": {"filepath": self._write("Video.zh.srt")}}}
+        manifest = update_manifest(manifest, self.dir, info, opts, plan, ["Video.zh.srt"])
+        self.assertEqual(manifest["subtitles"], {"available": ["en", "zh"], "unavailable": ["fr"]})
+        self.assertIn("Video.mp4", manifest["files"])
+        self.assertTrue(plan_download(manifest, self.dir, opts).up_to_date)
+
+    def test_a_listed_subtitle_that_failed_to_download_is_retried(self):
+        manifest = self._first_download()
+        opts = dict(BASE_OPTS, subtitleslangs=["en", "zh"])
+        plan = plan_download(manifest, self.dir, opts)
+        info = {"id": "abc", "title": "Video", "subtitles": {"en": [{}], "zh": [{}]},
+                "requested_subtitles": {"zh": {"ext": "srt"}}}
+        manifest = update_manifest(manifest, self.dir, info, opts, plan, [])
+        self.assertEqual(manifest["subtitles"], {"available": ["en"], "unavailable": []})
+        self.assertEqual(plan_download(manifest, self.dir, opts).missing_subtitles, ["zh"])
+
+    def test_format_change_or_missing_file_requires_media(self):
+        manifest = self._first_download()
+        plan = plan_download(manifest, self.dir, dict(BASE_OPTS, format="bestaudio"))
+        self.assertTrue(plan.needs_media)
+        self.assertFalse(plan.fresh)
+
+        os.remove(os.path.join(self.dir, "Video.mp4"))
+        self.assertTrue(plan_download(manifest, self.dir, BASE_OPTS).fresh)
+
+    def test_subtitles_only_never_requires_media(self):
+        opts = dict(BASE_OPTS, skip_download=True)
+        plan = plan_download(None, self.dir, opts)
+        self.assertFalse(plan.needs_media)
+        info = {"id": "abc", "title": "Video",
+                "requested_subtitles": {"en": {"filepath": self._write("Video.en.srt")}},
+                "thumbnails": [{"filepath": self._write("Video.webp")}]}
+        manifest = update_manifest(None, self.dir, info, opts, plan, [])
+        self.assertNotIn("media", manifest)
+        self.assertTrue(plan_download(manifest, self.dir, opts).up_to_date)
+        self.assertTrue(plan_download(manifest, self.dir, BASE_OPTS).needs_media)
+
+    def test_changed_fingerprint_starts_over(self):
+        manifest = self._first_download()
+        self.assertTrue(plan_download(manifest, self.dir, BASE_OPTS, fingerprint="other").fresh)
+
+
+if __name__ == '__main__':
+    unittest.main()
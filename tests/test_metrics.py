@@ -0,0 +1,125 @@
+import os
+import sys
+import unittest
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from common import metrics
+from common.metrics import Histogram, MetricsMiddleware, MetricsRegistry, timed_iter
+from youtube.progress import PhaseTimer
+from helpers import FakeClock
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_renders_prometheus_text_format(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("jobs", "Jobs run.", ("kind",))
+        depth = registry.gauge("depth", "Queue depth.")
+        latency = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1))
+        requests.inc(kind='say "hi"')
+        depth.set(3)
+        latency.observe(0.05, route="/a")
+        latency.observe(0.5, route="/a")
+        latency.observe(5, route="/a")
+
+        text = registry.render()
+        self.assertIn("# TYPE jobs counter\n", text)
+        self.assertIn('jobs_total{kind="say \\"hi\\""} 1\n', text)
+        self.assertIn("depth 3\n", text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3\n', text)
+        self.assertIn('latency_seconds_sum{route="/a"} 5.55\n', text)
+        self.assertIn('latency_seconds_count{route="/a"} 3\n', text)
+
+    def test_label_combinations_beyond_the_limit_share_one_series(self):
+        histogram = Histogram("h", "h", ("path",), max_series=2)
+        for path in ("/a", "/b", "/c", "/d"):
+            histogram.observe(1, path=path)
+        self.assertEqual(histogram.count(path="/a"), 1)
+        self.assertEqual(histogram.count(path="other"), 2)
+        with self.assertRaises(ValueError):
+            histogram.observe(1, route="/a")
+
+    def test_collectors_run_at_scrape_time(self):
+        registry = MetricsRegistry()
+        depth = registry.gauge("depth", "Queue depth.", ("queue",))
+        queue = [1, 2]
+        registry.add_collector(lambda: depth.set(len(queue), queue="jobs"))
+        self.assertIn('depth{queue="jobs"} 2\n', registry.render())
+        queue.append(3)
+        self.assertIn('depth{queue="jobs"} 3\n', registry.render())
+
+    def test_timed_iter_observes_when_closed_early(self):
+        histogram = Histogram("zip", "zip", ("phase",))
+        chunks = timed_iter(iter([b"a", b"b"]), histogram, phase="zip")
+        next(chunks)
+        chunks.close()
+        self.assertEqual(histogram.count(phase="zip"), 1)
+
+
+    def test_a_metric_kind_must_render_its_samples(self):
+        class Summary(metrics._Metric):
+            kind = "summary"
+
+            def _new(self):
+                return [0.0]
+
+        with self.assertRaises(TypeError):
+            Summary("latency", "Latency.")
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+
+    def test_requests_are_labelled_by_route_template(self):
+        histogram = Histogram("http", "http", ("route", "method", "status"))
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware, histogram=histogram)
+        router = APIRouter()
+
+        @router.get("/files/{video_id}")
+        def files(video_id: str):
+            return {"video_id": video_id}
+
+        app.include_router(router, prefix="/api/v1/youtube")
+        client = TestClient(app)
+        client.get("/api/v1/youtube/files/abc")
+        client.get("/api/v1/youtube/files/def")
+        client.get("/nope")
+        self.assertEqual(histogram.count(route="/api/v1/youtube/files/{video_id}", method="GET", status="2xx"), 2)
+        self.assertEqual(histogram.count(route="unmatched", method="GET", status="4xx"), 1)
+
+
+class TestPhaseTimer(unittest.TestCase):
+
+    def test_splits_a_run_into_extract_download_and_merge(self):
+        clock = FakeClock()
+        observed = []
+        timer = PhaseTimer(lambda phase, seconds: observed.append((phase, seconds)), clock=clock)
+        timer.start()
+        clock.now = 2
+        timer.progress_hook({"status": "downloading"})
+        clock.now = 10
+        timer.progress_hook({"status": "finished"})
+        timer.postprocessor_hook({"status": "started", "postprocessor": "Merger"})
+        clock.now = 13
+        timer.postprocessor_hook({"status": "finished", "postprocessor": "Merger"})
+        timer.postprocessor_hook({"status": "finished", "postprocessor": "MoveFiles"})
+        timer.stop()
+        self.assertEqual(observed, [("merge", 3), ("extract", 2), ("download", 8)])
+
+    def test_extract_is_skipped_when_info_came_from_elsewhere(self):
+        observed = []
+        timer = PhaseTimer(lambda phase, seconds: observed.append(phase), extracting=False, clock=FakeClock())
+        timer.start()
+        timer.stop()
+        self.assertEqual(observed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import OnDemandPagedList
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube import playlist
+from youtube.playlist import existing_video_ids, iter_flat_playlist
+
+PAGE = 5
+VIDEOS = 23
+
+
+class FakePlaylistIE(InfoExtractor):
+    """A playlist of VIDEOS entries served in pages of PAGE, recording which pages were fetched."""
+
+    _VALID_URL = r'fake://list'
+    IE_NAME = 'fakeplaylist'
+    fetched = []
+
+    def _real_extract(self, url):
+        def page(n):
+            self.fetched.append(n)
+            for i in range(n * PAGE, min((n + 1) * PAGE, VIDEOS)):
+                yield self.url_result(f'fake://video/{i}', video_id=f'v{i}', video_title=f'Video {i}')
+        return self.playlist_result(OnDemandPagedList(page, PAGE), 'pl', 'Fake playlist')
+
+
+class FakePool:
+    """Stands in for ydl_pool: a YoutubeDL that knows only the fake extractor."""
+
+    @contextmanager
+    def lease(self, base_opts, request_opts=None):
+        ydl = yt_dlp.YoutubeDL(dict(request_opts or base_opts, quiet=True), auto_init=False)
+        ydl.add_info_extractor(FakePlaylistIE())
+        yield ydl
+
+
+def read_page(cursor, page_size, skip_ids=None):
+    lines = [json.loads(line) for line in iter_flat_playlist('fake://list', {}, cursor, page_size, skip_ids)]
+    return lines[0], lines[1:-1], lines[-1]
+
+
+class TestFlatPlaylist(unittest.TestCase):
+
+    def setUp(self):
+        FakePlaylistIE.fetched = []
+        patcher = patch.object(playlist, "ydl_pool", FakePool())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_page_and_next_cursor(self):
+        header, entries, page = read_page(0, 5)
+        self.assertEqual((header["type"], header["id"], header["title"]), ("playlist", "pl", "Fake playlist"))
+        self.assertEqual([e["id"] for e in entries], ["v0", "v1", "v2", "v3", "v4"])
+        self.assertEqual([e["index"] for e in entries], [0, 1, 2, 3, 4])
+        self.assertEqual((page["cursor"], page["next_cursor"], page["scanned"], page["returned"]), (0, 5, 5, 5))
+
+    def test_a_later_page_fetches_only_its_own_pages(self):
+        _, entries, page = read_page(10, 5)
+        self.assertEqual([e["index"] for e in entries], [10, 11, 12, 13, 14])
+        self.assertEqual(page["next_cursor"], 15)
+        self.assertEqual(FakePlaylistIE.fetched, [2])
+
+    def test_last_page_has_no_next_cursor(self):
+        _, entries, page = read_page(20, 5)
+        self.assertEqual([e["id"] for e in entries], ["v20", "v21", "v22"])
+        self.assertEqual((page["next_cursor"], page["scanned"]), (None, 3))
+
+    def test_only_new_skips_known_ids_but_still_advances_the_cursor(self):
+        with tempfile.TemporaryDirectory() as root:
+            for video_id in ("v1", "v3"):
+                os.makedirs(os.path.join(root, video_id))
+            skip_ids = existing_video_ids(root)
+        _, entries, page = read_page(0, 5, skip_ids)
+        self.assertEqual([e["id"] for e in entries], ["v0", "v2", "v4"])
+        self.assertEqual((page["next_cursor"], page["scanned"], page["returned"]), (5, 5, 3))
+
+    def test_extraction_errors_end_the_stream_with_an_error_line(self):
+        lines = [json.loads(line) for line in iter_flat_playlist('unknown://x', {}, 0, 5)]
+        self.assertEqual([line["type"] for line in lines], ["error"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import importlib
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube import profiles
+from youtube.profiles import DEFAULT_PROFILE, ProfileError, ProfileStore, parse_profiles
+
+BASE = {
+    "quiet": True,
+    "format": "bestvideo[height<=?1080]+bestaudio/best",
+    "subtitleslangs": ["en"],
+}
+
+
+class TestParseProfiles(unittest.TestCase):
+
+    def test_named_profiles_override_the_default(self):
+        profiles = parse_profiles(dict(BASE, profiles={"audio": {"format": "bestaudio/best"}}))
+        self.assertEqual(sorted(profiles), ["audio", DEFAULT_PROFILE])
+        self.assertEqual(profiles[DEFAULT_PROFILE], BASE)
+        self.assertEqual(profiles["audio"]["format"], "bestaudio/best")
+        self.assertEqual(profiles["audio"]["subtitleslangs"], ["en"])
+
+    def test_file_without_profiles_is_the_default(self):
+        self.assertEqual(parse_profiles(BASE), {DEFAULT_PROFILE: BASE})
+
+    def test_invalid_definitions_are_rejected(self):
+        with self.assertRaises(ProfileError):
+            parse_profiles(dict(BASE, profiles={"bad": {"format": "best[height<=?720"}}))
+        with self.assertRaises(ProfileError):
+            parse_profiles(dict(BASE, profiles={"bad": {"subtitleslangs": "en"}}))
+        with self.assertRaises(ProfileError):
+            parse_profiles(dict(BASE, profiles=["audio"]))
+
+
+class TestProfileStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ydl_opts.json")
+        self.write(dict(BASE, profiles={"720p": {"format": "best[height<=?720]"}}))
+        self.store = ProfileStore(self.path, check_interval=0)
+        self.store.load()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, data, mtime_ns=None):
+        with open(self.path, "w") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+        if mtime_ns is not None:
+            os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def test_get_returns_private_copies(self):
+        opts = self.store.get("720p")
+        opts["subtitleslangs"].append("de")
+        self.assertEqual(self.store.get("720p")["subtitleslangs"], ["en"])
+        self.assertEqual(self.store.get()["format"], BASE["format"])
+        with self.assertRaises(ProfileError):
+            self.store.get("missing")
+
+    def test_unchanged_file_is_not_reparsed(self):
+        for _ in range(5):
+            self.store.get()
+        self.assertEqual(self.store.reloads, 1)
+
+    def test_reloads_on_change_and_keeps_last_good_profiles(self):
+        self.write(dict(BASE, profiles={"audio": {"format": "bestaudio"}}), mtime_ns=10**18)
+        self.assertEqual(self.store.names(), ["audio", DEFAULT_PROFILE])
+        self.assertEqual(self.store.reloads, 2)
+
+        self.write("{not json", mtime_ns=2 * 10**18)
+        self.assertEqual(self.store.get("audio")["format"], "bestaudio")
+        self.assertEqual(self.store.reloads, 2)
+
+    def test_load_raises_on_invalid_file(self):
+        self.write(dict(BASE, format="best["))
+        with self.assertRaises(ProfileError):
+            self.store.load()
+
+
+class TestModuleStore(unittest.TestCase):
+
+    def test_a_broken_file_at_import_starts_with_the_empty_default(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ydl_opts.json")
+            with open(path, "w") as f:
+                f.write("{not json")
+            try:
+                with patch.dict(os.environ, {"YTDLP_PROFILES_FILE": path}), \
+                        self.assertLogs("youtube.profiles", "ERROR"):
+                    importlib.reload(profiles)
+                self.assertEqual(profiles.profile_store.get(), {})
+            finally:
+                importlib.reload(profiles)
+
+
+if __name__ == '__main__':
+    unittest.main()
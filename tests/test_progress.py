@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube.progress import ProgressChannel, ProgressHook
+from helpers import FakeClock
+
+
+def downloading(downloaded, total=1000, **extra):
+    return dict({'status': 'downloading', 'filename': '/dl/a.mp4', 'downloaded_bytes': downloaded,
+                 'total_bytes': total, 'speed': 250.0, 'eta': 2}, **extra)
+
+
+class TestProgressHook(unittest.TestCase):
+
+    def test_updates_are_throttled_per_file(self):
+        channel, clock = ProgressChannel(), FakeClock()
+        hook = ProgressHook(channel, min_interval=1.0, clock=clock)
+        hook(downloading(100))
+        hook(downloading(200))
+        self.assertEqual(channel.snapshot()["a.mp4"]["downloaded_bytes"], 100)
+
+        clock.now = 1.5
+        hook(downloading(300))
+        event = channel.snapshot()["a.mp4"]
+        self.assertEqual((event["downloaded_bytes"], event["percent"], event["speed"], event["eta"]),
+                         (300, 30.0, 250.0, 2))
+
+        hook({'status': 'finished', 'filename': '/dl/a.mp4', 'downloaded_bytes': 1000, 'total_bytes': 1000})
+        self.assertEqual(channel.snapshot()["a.mp4"]["status"], "finished")
+        self.assertEqual(hook._last_sent, {})
+
+    def test_fragment_progress(self):
+        channel = ProgressChannel()
+        ProgressHook(channel, min_interval=0)(downloading(100, fragment_index=3, fragment_count=4))
+        event = channel.snapshot()["a.mp4"]
+        self.assertEqual((event["percent"], event["fragment_index"]), (75.0, 3))
+
+
+class TestProgressChannel(unittest.TestCase):
+
+    def test_subscriber_gets_snapshot_live_events_and_end(self):
+        channel = ProgressChannel()
+        channel.publish({"type": "progress", "file": "a.srt", "status": "finished"})
+
+        async def consume():
+            received = []
+            async for event in channel.subscribe(heartbeat=5):
+                received.append(event)
+                if len(received) == 1:
+                    loop = asyncio.get_running_loop()
+                    loop.run_in_executor(None, channel.publish,
+                                         {"type": "progress", "file": "a.mp4", "status": "downloading"})
+                elif len(received) == 2:
+                    loop.run_in_executor(None, channel.close, "succeeded")
+            return received
+
+        received = asyncio.run(asyncio.wait_for(consume(), 5))
+        self.assertEqual([e["type"] for e in received], ["progress", "progress", "end"])
+        self.assertEqual([e["seq"] for e in received], [1, 2, 3])
+        self.assertEqual(received[-1]["status"], "succeeded")
+        self.assertEqual(channel.subscriber_count(), 0)
+
+    def test_close_drops_unfinished_files(self):
+        channel = ProgressChannel()
+        channel.publish({"type": "progress", "file": "a.mp4", "status": "downloading"})
+        channel.publish({"type": "progress", "file": "a.srt", "status": "finished"})
+        channel.close("failed", "boom")
+        self.assertEqual(list(channel.snapshot()), ["a.srt"])
+
+        async def consume():
+            return [event async for event in channel.subscribe()]
+
+        received = asyncio.run(consume())
+        self.assertEqual(received[-1], {"type": "end", "seq": 3, "status": "failed", "error": "boom"})
+
+
+if __name__ == '__main__':
+    unittest.main()
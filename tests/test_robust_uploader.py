@@ -50,17 +50,17 @@ class TestRobustVideoUploader(unittest.TestCase):
         return self.loop.run_until_complete(coro)
 
     @patch('bilibili.robust_uploader.EnhancedVideoMetaValidator.validate', return_value=False)
-    @patch('builtins.print')
-    def test_upload_with_invalid_meta_fails(self, mock_print, mock_validate):
+    def test_upload_with_invalid_meta_fails(self, mock_validate):
         """测试当元数据验证失败时，上传流程是否被中止。"""
         uploader = RobustVideoUploader(self.mock_credential)
         
-        result = self.run_async(uploader.upload([self.test_video_path], self.valid_meta))
+        with self.assertLogs('bilibili.robust_uploader', level='ERROR') as logs:
+            result = self.run_async(uploader.upload([self.test_video_path], self.valid_meta))
         
         # 断言
         self.assertIsNone(result)
         mock_validate.assert_called_once()
-        mock_print.assert_any_call("元数据验证失败:")
+        self.assertIn("元数据验证失败:", [r.getMessage() for r in logs.records])
 
     @patch('bilibili.robust_uploader.video_uploader.VideoUploader')
     def test_successful_upload_flow(self, MockVideoUploader):
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def _run_concurrently(self, flights, calls, tags):
+        """Starts one call per tag while the first one is still running."""
+        started = threading.Event()
+        release = threading.Event()
+        results, errors = [], []
+
+        def fn(tag):
+            def run():
+                calls.append(tag)
+                started.set()
+                release.wait(5)
+                if tag == "fail":
+                    raise RuntimeError("download failed")
+                return f"result-{tag}"
+            return run
+
+        def worker(tag):
+            try:
+                results.append(flights.do("video", fn(tag), tag=tag))
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=worker, args=(tag,)) for tag in tags]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join(5)
+        return results, errors
+
+    def test_same_tag_joins_running_call(self):
+        flights = SingleFlight()
+        calls = []
+        results, errors = self._run_concurrently(flights, calls, ["en", "en", "en"])
+        self.assertEqual(calls, ["en"])
+        self.assertEqual(results, ["result-en"] * 3)
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_error_is_shared_with_waiters(self):
+        flights = SingleFlight()
+        calls = []
+        results, errors = self._run_concurrently(flights, calls, ["fail", "fail"])
+        self.assertEqual(calls, ["fail"])
+        self.assertEqual(errors, ["download failed"] * 2)
+
+    def test_different_tag_runs_after_current_call(self):
+        flights = SingleFlight()
+        calls = []
+        results, errors = self._run_concurrently(flights, calls, ["en", "zh"])
+        self.assertEqual(calls, ["en", "zh"])
+        self.assertCountEqual(results, ["result-en", "result-zh"])
+
+
+if __name__ == '__main__':
+    unittest.main()
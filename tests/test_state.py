@@ -0,0 +1,177 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+# The modules import their shared state as src.*, so the repository root goes on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.state import LeaseTimeout, MemoryState, SQLiteState, StateBackend
+from src.youtube.cache import InfoCache
+from src.youtube.jobs import FAILED, RUNNING, SUCCEEDED, JobManager, RemoteJob
+from helpers import FakeClock
+
+
+class StateContract:
+    """Behaviour both backends share; subclasses provide make_state."""
+
+    def test_values_expire_after_their_ttl(self):
+        state = self.make_state()
+        state.put("ns", "a", {"size": 1}, ttl=10)
+        state.put("ns", "b", [1, 2])
+        self.assertEqual(state.get("ns", "a"), {"size": 1})
+        self.clock.now += 11
+        self.assertIsNone(state.get("ns", "a"))
+        self.assertEqual(state.get("ns", "b"), [1, 2])
+        self.assertIsNone(state.get("other", "b"))
+        state.delete("ns", "b")
+        self.assertIsNone(state.get("ns", "b"))
+
+    def test_a_lease_has_one_holder(self):
+        state = self.make_state()
+        token = state.acquire("download:abc")
+        self.assertIsNotNone(token)
+        self.assertIsNone(state.acquire("download:abc"))
+        self.assertTrue(state.holder("download:abc").startswith(state.owner))
+        state.release("download:abc", "not-the-token")
+        self.assertIsNone(state.acquire("download:abc"))
+        state.release("download:abc", token)
+        self.assertIsNone(state.holder("download:abc"))
+        self.assertIsNotNone(state.acquire("download:abc"))
+
+    def test_lease_times_out_while_held(self):
+        state = self.make_state()
+        state.acquire("refresh")
+        with self.assertRaises(LeaseTimeout):
+            with state.lease("refresh", timeout=0.05, poll=0.01):
+                pass
+
+    def test_pins_count_their_holders(self):
+        state = self.make_state()
+        state.pin("video:abc")
+        state.pin("video:abc")
+        state.unpin("video:abc")
+        self.assertTrue(state.pinned("video:abc"))
+        state.unpin("video:abc")
+        self.assertFalse(state.pinned("video:abc"))
+
+
+class TestStateBackend(unittest.TestCase):
+
+    def test_an_incomplete_backend_cannot_be_created(self):
+        class NoPins(StateBackend):
+            def get(self, namespace, key): pass
+            def put(self, namespace, key, value, ttl=None): pass
+            def delete(self, namespace, key): pass
+            def acquire(self, name): pass
+            def release(self, name, token): pass
+            def holder(self, name): pass
+            def stats(self): pass
+
+        with self.assertRaises(TypeError) as e:
+            NoPins()
+        self.assertIn("pinned", str(e.exception))
+
+
+class TestMemoryState(StateContract, unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+
+    def make_state(self):
+        return MemoryState(clock=self.clock)
+
+    def test_is_not_shared(self):
+        self.assertFalse(self.make_state().shared)
+
+
+class TestSQLiteState(StateContract, unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "state.sqlite3")
+        self.clock = FakeClock(1000.0)
+
+    def make_state(self):
+        # A long TTL keeps the heartbeat thread asleep; the tests move the clock instead.
+        return SQLiteState(self.path, lease_ttl=30, clock=self.clock)
+
+    def test_processes_see_each_others_leases_and_values(self):
+        first, second = self.make_state(), self.make_state()
+        self.assertNotEqual(first.owner, second.owner)
+        token = first.acquire("download:abc")
+        self.assertIsNone(second.acquire("download:abc"))
+        self.assertTrue(second.holder("download:abc").startswith(first.owner))
+        first.put("jobs", "1", {"status": "running"})
+        self.assertEqual(second.get("jobs", "1"), {"status": "running"})
+        first.release("download:abc", token)
+        self.assertIsNotNone(second.acquire("download:abc"))
+
+    def test_leases_and_pins_of_a_dead_process_expire(self):
+        first, second = self.make_state(), self.make_state()
+        first.acquire("download:abc")
+        first.pin("video:abc")
+        self.clock.now += 20
+        first.renew()
+        self.clock.now += 20
+        self.assertIsNone(second.acquire("download:abc"))
+        self.assertTrue(second.pinned("video:abc"))
+        # No renewal for a full TTL: the first process is taken for dead.
+        self.clock.now += 31
+        self.assertFalse(second.pinned("video:abc"))
+        self.assertIsNotNone(second.acquire("download:abc"))
+
+    def test_concurrent_acquires_from_threads_have_one_winner(self):
+        state = self.make_state()
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(state.acquire("upload"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len([token for token in tokens if token is not None]), 1)
+
+
+class TestSharedJobsAndCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "state.sqlite3")
+
+    def test_another_worker_sees_the_job_and_its_result(self):
+        worker, other = (JobManager(max_workers=1, state=SQLiteState(self.path)) for _ in range(2))
+
+        def work(job):
+            job.channel.publish({"type": "progress", "file": "a.mp4", "status": "finished", "percent": 100})
+            return {"files": ["a.srt"]}
+
+        job = worker.submit("download", {"video_id": "abc"}, work)
+        job.future.result(5)
+        remote = other.get(job.id)
+        self.assertIsInstance(remote, RemoteJob)
+        self.assertEqual((remote.status, remote.result), (SUCCEEDED, {"files": ["a.srt"]}))
+        self.assertEqual(remote.to_dict()["progress"]["a.mp4"]["percent"], 100)
+        self.assertEqual(remote.final["status"], SUCCEEDED)
+        self.assertIsNone(other.get("missing"))
+
+    def test_a_job_without_a_live_worker_is_failed(self):
+        manager = JobManager(state=SQLiteState(self.path))
+        manager.state.put("jobs", "gone", {"job_id": "gone", "kind": "download", "params": {},
+                                           "status": RUNNING, "progress": {}})
+        job = manager.get("gone")
+        self.assertEqual(job.status, FAILED)
+        self.assertIn("exited", job.error)
+
+    def test_info_cache_reuses_another_workers_extraction(self):
+        first, second = (InfoCache(state=SQLiteState(self.path)) for _ in range(2))
+        first.get_or_load("v1", lambda: {"title": "one"})
+        self.assertEqual(second.get_or_load("v1", lambda: self.fail("extracted twice")), {"title": "one"})
+        self.assertEqual(second.stats()["shared_hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
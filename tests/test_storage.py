@@ -0,0 +1,207 @@
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from common.state import MemoryState, SQLiteState
+from common.storage import StorageManager
+from helpers import FakeClock
+
+
+class TestStorageManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.clock = FakeClock(time.time() + 60)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _video(self, video_id, size):
+        path = os.path.join(self.root, video_id)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "video.mp4"), "wb") as f:
+            f.write(b"x" * size)
+
+    def _manager(self, **kwargs):
+        manager = StorageManager(self.root, clock=self.clock, **kwargs)
+        manager.run_pass()
+        return manager
+
+    def test_least_recently_used_videos_are_evicted_first(self):
+        for video_id in ("a", "b", "c"):
+            self._video(video_id, 100)
+        manager = self._manager()
+        self.assertEqual(manager.stats()["used_bytes"], 300)
+
+        self.clock.now += 10
+        manager.touch("a")
+        self.clock.now += 10
+        manager.touch("c")
+        manager.quota_bytes = 200
+        self.assertEqual(manager.run_pass(), ["b"])
+        self.assertEqual(sorted(os.listdir(self.root)), ["a", "c"])
+        stats = manager.stats()
+        self.assertEqual((stats["used_bytes"], stats["evictions"], stats["evicted_bytes"]), (200, 1, 100))
+
+    def test_pinned_videos_are_never_evicted(self):
+        self._video("a", 100)
+        self._video("b", 100)
+        manager = self._manager(quota_bytes=50)
+        self.assertEqual(manager.stats()["videos"], 0)
+
+        self._video("a", 100)
+        with manager.in_use("a"):
+            manager.record("a")
+            self.assertEqual(manager.run_pass(), [])
+            self.assertTrue(os.path.isdir(os.path.join(self.root, "a")))
+        self.assertEqual(manager.run_pass(), ["a"])
+
+    def test_record_remeasures_only_the_changed_directory(self):
+        self._video("a", 100)
+        manager = self._manager()
+        self._video("a", 250)
+        self.assertEqual(manager.stats()["used_bytes"], 100)
+        manager.record("a")
+        self.assertEqual(manager.stats()["used_bytes"], 250)
+
+    def test_free_space_watermark(self):
+        self._video("a", 100)
+        manager = self._manager(min_free_bytes=1 << 62)
+        self.assertEqual(manager.stats()["videos"], 0)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "a")))
+
+    def test_hold_pins_while_streaming(self):
+        self._video("a", 100)
+        manager = self._manager()
+        chunks = manager.hold("a", iter([b"1", b"2"]))
+        next(chunks)
+        self.assertEqual(manager.stats()["pinned"], 1)
+        list(chunks)
+        self.assertEqual(manager.stats()["pinned"], 0)
+
+    def test_hold_pins_nothing_until_started(self):
+        self._video("a", 100)
+        manager = self._manager()
+        chunks = manager.hold("a", iter([b"1", b"2"]))
+        self.assertEqual(manager.stats()["pinned"], 0)
+        del chunks
+        gc.collect()
+        self.assertEqual(manager.stats()["pinned"], 0)
+
+    def test_hold_releases_the_pin_when_closed_early(self):
+        self._video("a", 100)
+        manager = self._manager()
+        chunks = manager.hold("a", iter([b"1", b"2"]))
+        next(chunks)
+        chunks.close()
+        self.assertEqual(manager.stats()["pinned"], 0)
+
+    def test_start_sweeps_trash_left_by_a_crashed_eviction(self):
+        self._video(".evicting-a-123", 100)
+        self._video("b", 100)
+        manager = StorageManager(self.root, clock=self.clock)
+        manager.start()
+        manager._thread.join(5)
+        self.assertEqual(os.listdir(self.root), ["b"])
+
+
+class LockCheckingState(MemoryState):
+    """A shared state that records whether the storage lock was held by its callers."""
+
+    shared = True
+
+    def __init__(self):
+        super().__init__()
+        self.manager = None
+        self.calls = []
+
+    def pin(self, name):
+        self.calls.append(("pin", name, self.manager._lock.locked()))
+        super().pin(name)
+
+    def unpin(self, name):
+        self.calls.append(("unpin", name, self.manager._lock.locked()))
+        super().unpin(name)
+
+
+class TestSharedPins(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.state = LockCheckingState()
+        self.manager = self.state.manager = StorageManager(self.tmp.name, state=self.state)
+
+    def test_first_pin_and_last_unpin_are_published_outside_the_lock(self):
+        with self.manager.in_use("a"):
+            with self.manager.in_use("a"):
+                self.assertTrue(self.state.pinned("video:a"))
+        self.assertFalse(self.state.pinned("video:a"))
+        self.assertEqual(self.state.calls, [("pin", "video:a", False), ("unpin", "video:a", False)])
+
+    def test_ain_use_pins_for_the_block(self):
+        async def use():
+            async with self.manager.ain_use("a"):
+                return self.state.pinned("video:a")
+
+        self.assertTrue(asyncio.run(use()))
+        self.assertFalse(self.state.pinned("video:a"))
+
+
+class TestEvictionAcrossWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = os.path.join(self.tmp.name, "downloads")
+        os.makedirs(os.path.join(self.root, "a"))
+        with open(os.path.join(self.root, "a", "video.mp4"), "wb") as f:
+            f.write(b"x" * 100)
+        self.path = os.path.join(self.tmp.name, "state.sqlite3")
+
+    def _manager(self, **kwargs):
+        return StorageManager(self.root, state=SQLiteState(self.path), **kwargs)
+
+    def test_a_pin_from_another_worker_blocks_eviction(self):
+        evicting, reading = self._manager(quota_bytes=1), self._manager()
+        with reading.in_use("a"):
+            self.assertEqual(evicting.run_pass(), [])
+        self.assertEqual(evicting.run_pass(), ["a"])
+
+    def test_a_pin_waits_for_an_eviction_in_progress(self):
+        other = SQLiteState(self.path)
+        lease = other.acquire("evicting:a")
+        manager = self._manager()
+        pinned = threading.Event()
+        worker = threading.Thread(target=lambda: (manager.pin("a"), pinned.set()))
+        worker.start()
+        self.assertFalse(pinned.wait(0.3))
+        # The pin is published first, so the evicting worker's check would already see it.
+        self.assertTrue(other.pinned("video:a"))
+        other.release("evicting:a", lease)
+        self.assertTrue(pinned.wait(5))
+        worker.join(5)
+
+    def test_a_pin_gives_up_waiting_for_a_stuck_eviction(self):
+        other = SQLiteState(self.path)
+        other.acquire("evicting:a")
+        manager = self._manager()
+        manager.EVICTION_WAIT = 0.2
+        started = time.monotonic()
+        with self.assertLogs("common.storage", "WARNING"):
+            manager.pin("a")
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(other.pinned("video:a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import types
+import unittest
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+# The gateway imports its modules as src.*, so the repository root goes on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.api_gateway.subsystems import Subsystem, SubsystemMiddleware, Subsystems
+
+
+def fake_router_module(name, calls):
+    """Registers a router module under ``name`` that records its warm-up."""
+    router = APIRouter()
+
+    @router.get("/ping")
+    def ping():
+        return {"module": name}
+
+    module = types.ModuleType(name)
+    module.router = router
+    module.warm_up = lambda: calls.append(name)
+    sys.modules[name] = module
+    return module
+
+
+class TestSubsystems(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        for name in ("fake_alpha_router", "fake_beta_router"):
+            fake_router_module(name, self.calls)
+            self.addCleanup(sys.modules.pop, name, None)
+
+    def make_app(self, mode):
+        @asynccontextmanager
+        async def lifespan(app):
+            subsystems.start()
+            yield
+            await subsystems.stop()
+
+        app = FastAPI(lifespan=lifespan)
+        subsystems = Subsystems(app, [
+            Subsystem("fake_alpha_router", "/alpha", "Alpha"),
+            Subsystem("fake_beta_router", "/beta", "Beta"),
+        ], mode=mode)
+        app.add_middleware(SubsystemMiddleware, subsystems=subsystems)
+        return app, subsystems
+
+    def test_lazy_mode_loads_only_the_router_a_request_needs(self):
+        app, subsystems = self.make_app("lazy")
+        client = TestClient(app)
+        self.assertEqual(self.calls, [])
+
+        self.assertEqual(client.get("/alpha/ping").json(), {"module": "fake_alpha_router"})
+        self.assertEqual(self.calls, ["fake_alpha_router"])
+        self.assertEqual([s.loaded for s in subsystems.subsystems], [True, False])
+        # A path that merely shares the prefix is not the router's.
+        self.assertEqual(client.get("/alphabet").status_code, 404)
+        self.assertFalse(subsystems.subsystems[1].loaded)
+
+    def test_schema_requests_load_every_router(self):
+        app, _ = self.make_app("lazy")
+        paths = TestClient(app).get("/openapi.json").json()["paths"]
+        self.assertEqual(sorted(paths), ["/alpha/ping", "/beta/ping"])
+
+    def test_eager_mode_loads_before_serving(self):
+        app, subsystems = self.make_app("eager")
+        self.assertEqual(self.calls, ["fake_alpha_router", "fake_beta_router"])
+        self.assertTrue(all(s.seconds is not None for s in subsystems.subsystems))
+
+    def test_background_mode_loads_after_startup(self):
+        app, subsystems = self.make_app("background")
+        with TestClient(app) as client:
+            self.assertIsNotNone(subsystems.loader)
+            self.assertEqual(client.get("/beta/ping").status_code, 200)
+        # Shutdown waits for the loader, so both routers are in by now.
+        self.assertIsNone(subsystems.loader)
+        self.assertEqual(sorted(self.calls), ["fake_alpha_router", "fake_beta_router"])
+        self.assertTrue(all(s.loaded for s in subsystems.subsystems))
+
+    def test_a_failed_import_is_retried_by_the_next_request(self):
+        app = FastAPI()
+        subsystems = Subsystems(app, [Subsystem("fake_missing_router", "/missing", "Missing")], mode="lazy")
+        app.add_middleware(SubsystemMiddleware, subsystems=subsystems)
+        client = TestClient(app, raise_server_exceptions=False)
+        self.assertEqual(client.get("/missing/ping").status_code, 500)
+
+        fake_router_module("fake_missing_router", self.calls)
+        self.addCleanup(sys.modules.pop, "fake_missing_router", None)
+        self.assertEqual(client.get("/missing/ping").status_code, 200)
+
+    def test_rejects_unknown_modes(self):
+        with self.assertRaises(ValueError):
+            Subsystems(FastAPI(), [], mode="sometimes")
+
+
+if __name__ == '__main__':
+    unittest.main()
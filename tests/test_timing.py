@@ -0,0 +1,134 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from common import timing
+from common.timing import Span, TimingMiddleware, add_span, server_timing, span, start_span
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(TimingMiddleware)
+
+    @app.get("/work")
+    def work():
+        # Sync endpoints run in the threadpool; the spans still land under the request.
+        with span("job"):
+            for _ in range(2):
+                with span("step"):
+                    time.sleep(0.001)
+        add_span("queue", 0.25)
+        return {"ok": True}
+
+    @app.get("/async")
+    async def work_async(request: Request):
+        with span("outer"):
+            pending = start_span("pending")
+        return {"pending": pending.ended is None}
+
+    return app
+
+
+class TestSpans(unittest.TestCase):
+
+    def test_spans_are_no_ops_outside_a_request(self):
+        with span("anything") as current:
+            self.assertIsNone(current)
+        self.assertIsNone(start_span("anything"))
+        add_span("anything", 1.0)
+
+    def test_server_timing_joins_nested_names_and_sums_repeats(self):
+        root = Span("request", started=0.0)
+        root.ended = 3.0
+        job = Span("job", started=0.0)
+        job.ended = 2.0
+        for started in (0.0, 1.0):
+            step = Span("step", started=started)
+            step.ended = started + 0.5
+            job.children.append(step)
+        running = Span("running", started=0.0)
+        root.children.extend([job, running])
+
+        self.assertEqual(server_timing(root),
+                         'total;dur=3000.0, job;dur=2000.0, job.step;dur=1000.0;desc="2x"')
+
+    def test_to_dict_marks_spans_still_running(self):
+        root = Span("request")
+        root.children.append(Span("upload"))
+        root.finish()
+        tree = root.to_dict()
+        self.assertEqual(tree["children"][0]["name"], "upload")
+        self.assertTrue(tree["children"][0]["running"])
+        self.assertNotIn("running", tree)
+
+
+class TestTimingMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(make_app())
+
+    def test_server_timing_header_includes_threadpool_spans(self):
+        response = self.client.get("/work")
+        header = response.headers["server-timing"]
+        self.assertTrue(header.startswith("total;dur="))
+        self.assertIn("job;dur=", header)
+        self.assertIn('job.step;dur=', header)
+        self.assertIn('desc="2x"', header)
+        self.assertIn("queue;dur=250.0", header)
+        self.assertNotIn("x-profile", response.headers)
+
+    def test_spans_not_finished_before_the_headers_are_left_out(self):
+        response = self.client.get("/async")
+        self.assertTrue(response.json()["pending"])
+        self.assertIn("outer;dur=", response.headers["server-timing"])
+        self.assertNotIn("pending", response.headers["server-timing"])
+
+    def test_slow_requests_log_their_span_tree(self):
+        with patch.object(timing, "SLOW_REQUEST_SECONDS", 0), \
+                self.assertLogs(timing.logger, level="WARNING") as logs:
+            self.client.get("/work")
+        self.assertIn("Slow request GET /work", logs.output[0])
+        self.assertIn('"name": "step"', logs.output[0])
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        for name, value in (("PROFILE_TOKEN", "secret"), ("PROFILE_DIR", self.profile_dir)):
+            patcher = patch.object(timing, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(make_app())
+
+    def test_profiles_requests_with_the_token(self):
+        response = self.client.get("/work", headers={"X-Profile-Token": "secret"})
+        name = response.headers["x-profile"]
+        self.assertEqual(sorted(os.listdir(self.profile_dir)), [f"{name}.html", f"{name}.speedscope.json"])
+        self.assertEqual([p["name"] for p in timing.list_profiles()].count(f"{name}.html"), 1)
+        self.assertIsNotNone(timing.profile_path(f"{name}.html"))
+
+    def test_ignores_a_wrong_token(self):
+        response = self.client.get("/work", headers={"X-Profile-Token": "guess"})
+        self.assertNotIn("x-profile", response.headers)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_profile_path_rejects_names_outside_the_directory(self):
+        self.assertIsNone(timing.profile_path("../secret.html"))
+        self.assertIsNone(timing.profile_path("missing.html"))
+        self.assertFalse(timing.profile_authorized(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
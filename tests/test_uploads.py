@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from common import router as common_router
+from common import uploads as common_uploads
+from common.state import MemoryState
+from common.storage import StorageManager
+from common.uploads import ResumableUploads, UploadError
+
+
+def checksum(data: bytes) -> str:
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+
+
+class TestResumableUploadAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.uploads = ResumableUploads(StorageManager(self.tmp.name), MemoryState())
+        patcher = patch.object(common_router, "uploads", self.uploads)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app = FastAPI()
+        app.include_router(common_router.router, prefix="/api/v1/common")
+        self.client = TestClient(app)
+        self.data = os.urandom(3 * 1024 * 1024 + 17)
+
+    def create(self, length=None):
+        response = self.client.post("/api/v1/common/uploads",
+                                    json={"video_id": "abc", "fileName": "video.mp4", "length": length})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.headers["location"].endswith(response.json()["upload_id"]))
+        return response.json()["upload_id"]
+
+    def append(self, upload_id, offset, data, **headers):
+        return self.client.patch(f"/api/v1/common/uploads/{upload_id}", content=data,
+                                 headers={"Upload-Offset": str(offset), **headers})
+
+    def test_upload_in_chunks_and_finalize(self):
+        upload_id = self.create(len(self.data))
+        cut = 1024 * 1024 + 5
+        response = self.append(upload_id, 0, self.data[:cut], **{"Upload-Checksum": checksum(self.data[:cut])})
+        self.assertEqual((response.status_code, response.headers["upload-offset"]), (204, str(cut)))
+
+        head = self.client.head(f"/api/v1/common/uploads/{upload_id}")
+        self.assertEqual((head.headers["upload-offset"], head.headers["upload-length"]), (str(cut), str(len(self.data))))
+        self.assertEqual(self.client.post(f"/api/v1/common/uploads/{upload_id}/finalize").status_code, 409)
+
+        self.assertEqual(self.append(upload_id, cut, self.data[cut:]).status_code, 204)
+        target = os.path.join(self.tmp.name, "abc", "video.mp4")
+        self.assertFalse(os.path.exists(target))
+        response = self.client.post(f"/api/v1/common/uploads/{upload_id}/finalize",
+                                    json={"sha256": hashlib.sha256(self.data).hexdigest()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["size"], len(self.data))
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, "abc")), ["video.mp4"])
+        self.assertEqual(self.client.get(f"/api/v1/common/uploads/{upload_id}").status_code, 404)
+
+    def test_append_at_the_wrong_offset_is_rejected(self):
+        upload_id = self.create()
+        self.append(upload_id, 0, b"hello")
+        response = self.append(upload_id, 2, b"llo world")
+        self.assertEqual((response.status_code, response.headers["upload-offset"]), (409, "5"))
+
+    def test_checksum_mismatch_drops_the_chunk(self):
+        upload_id = self.create()
+        self.append(upload_id, 0, b"hello ")
+        response = self.append(upload_id, 6, b"world", **{"Upload-Checksum": checksum(b"earth")})
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.client.head(f"/api/v1/common/uploads/{upload_id}").headers["upload-offset"], "6")
+        self.append(upload_id, 6, b"world")
+        response = self.client.post(f"/api/v1/common/uploads/{upload_id}/finalize")
+        self.assertEqual(response.json()["sha256"], hashlib.sha256(b"hello world").hexdigest())
+
+    def test_digest_mismatch_keeps_the_upload(self):
+        upload_id = self.create(5)
+        self.append(upload_id, 0, b"hello")
+        response = self.client.post(f"/api/v1/common/uploads/{upload_id}/finalize", json={"sha256": "00" * 32})
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.client.delete(f"/api/v1/common/uploads/{upload_id}").status_code, 204)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, "abc")), [])
+
+    def test_bytes_past_the_length_are_refused(self):
+        upload_id = self.create(4)
+        self.assertEqual(self.append(upload_id, 0, b"hello").status_code, 413)
+        self.assertEqual(self.client.head(f"/api/v1/common/uploads/{upload_id}").headers["upload-offset"], "0")
+
+    def assert_rejected(self, video_id, file_name):
+        response = self.client.post("/api/v1/common/uploads", json={"video_id": video_id, "fileName": file_name})
+        self.assertEqual(response.status_code, 400, (video_id, file_name))
+
+    def test_rejects_path_traversal(self):
+        self.assert_rejected("..", "x")
+        self.assert_rejected("abc", "../x")
+        self.assert_rejected("a/b", "x")
+
+    def test_rejects_the_download_root_itself(self):
+        self.assert_rejected(".", "video.mp4")
+        self.assert_rejected("", "video.mp4")
+
+    def test_rejects_internal_files(self):
+        self.assert_rejected(".", ".state.sqlite3")
+        self.assert_rejected("abc", ".state.sqlite3")
+        self.assert_rejected("abc", ".manifest.json")
+        self.assert_rejected("abc", ".hidden")
+        self.assert_rejected("abc", "video.mp4.part")
+        self.assert_rejected("abc", "")
+
+    def test_rejects_dot_directories(self):
+        self.assert_rejected(".hidden", "video.mp4")
+        self.assert_rejected(".evicting-abc-1", "video.mp4")
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_rejects_the_state_database_and_its_wal_files(self):
+        state_path = os.path.join(self.tmp.name, "abc", "state.db")
+        with patch.object(common_uploads, "STATE_PATH", state_path):
+            for file_name in ("state.db", "state.db-wal", "state.db-shm"):
+                self.assert_rejected("abc", file_name)
+
+    def test_rejects_a_video_directory_that_links_elsewhere(self):
+        outside = tempfile.TemporaryDirectory()
+        self.addCleanup(outside.cleanup)
+        os.symlink(outside.name, os.path.join(self.tmp.name, "linked"))
+        self.assert_rejected("linked", "video.mp4")
+        self.assertEqual(os.listdir(outside.name), [])
+
+    def test_single_shot_upload_rejects_internal_files(self):
+        with patch.dict(os.environ, {"VIDEO_DOWNLOAD_PATH": self.tmp.name}):
+            for video_id, file_name in ((".", ".state.sqlite3"), ("abc", ".manifest.json")):
+                response = self.client.post("/api/v1/common/upload", data={"video_id": video_id, "fileName": file_name},
+                                            files={"file": ("x", b"pwn")})
+                self.assertEqual(response.status_code, 400)
+            self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class TestResumableUploads(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.state = MemoryState()
+
+    def test_a_broken_connection_keeps_what_arrived(self):
+        uploads = ResumableUploads(StorageManager(self.tmp.name), self.state)
+        record = uploads.create("abc", "video.mp4", 10)
+
+        async def broken():
+            yield b"hello"
+            raise ClientDisconnect()
+
+        record = asyncio.run(uploads.append(record["upload_id"], 0, broken()))
+        self.assertEqual(record["offset"], 5)
+
+        # Another process resumes it, rebuilding the digest from the part file.
+        resumed = ResumableUploads(StorageManager(self.tmp.name), self.state)
+
+        async def rest():
+            yield b"world"
+
+        asyncio.run(resumed.append(record["upload_id"], 5, rest()))
+        result = resumed.finalize(record["upload_id"])
+        self.assertEqual(result["sha256"], hashlib.sha256(b"helloworld").hexdigest())
+
+    def test_one_writer_at_a_time(self):
+        uploads = ResumableUploads(StorageManager(self.tmp.name), self.state)
+        record = uploads.create("abc", "video.mp4")
+        self.state.acquire(f"upload:{record['upload_id']}")
+        with self.assertRaises(UploadError) as e:
+            uploads.finalize(record["upload_id"])
+        self.assertEqual(e.exception.status_code, 409)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import yt_dlp
+from youtube.ydl_pool import YoutubeDLPool
+
+BASE_OPTS = {
+    "quiet": True,
+    "noplaylist": True,
+    "writesubtitles": True,
+    "allsubtitles": True,
+    "format": "bestvideo[height<=?1080]+bestaudio/best",
+    "outtmpl": "~/Downloads/%(title)s.%(ext)s",
+}
+
+
+class TestYoutubeDLPool(unittest.TestCase):
+
+    def test_instances_are_reused_within_a_profile(self):
+        pool = YoutubeDLPool(max_uses=10)
+        with pool.lease(BASE_OPTS) as first:
+            pass
+        with pool.lease(BASE_OPTS) as second:
+            pass
+        self.assertIs(first, second)
+        with pool.lease(dict(BASE_OPTS, format="best")) as other_profile:
+            self.assertIsNot(other_profile, first)
+        self.assertEqual(pool.stats()["created"], 2)
+
+    def test_request_options_are_applied_and_reset(self):
+        pool = YoutubeDLPool()
+        hook = lambda d: None
+        request_opts = dict(BASE_OPTS, outtmpl="/tmp/abc/%(title)s.%(ext)s",
+                            progress_hooks=[hook], subtitleslangs=["en"])
+        del request_opts["allsubtitles"]
+
+        with pool.lease(BASE_OPTS, request_opts) as ydl:
+            self.assertEqual(ydl.params["outtmpl"]["default"], "/tmp/abc/%(title)s.%(ext)s")
+            self.assertIn("chapter", ydl.params["outtmpl"])
+            self.assertEqual(ydl.params["subtitleslangs"], ["en"])
+            self.assertNotIn("allsubtitles", ydl.params)
+            leased = ydl
+
+        with pool.lease(BASE_OPTS) as ydl:
+            self.assertIs(ydl, leased)
+            self.assertEqual(ydl.params["outtmpl"]["default"], "~/Downloads/%(title)s.%(ext)s")
+            self.assertTrue(ydl.params["allsubtitles"])
+            self.assertNotIn("subtitleslangs", ydl.params)
+
+    def test_hooks_reach_only_the_lease_that_passed_them(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        with open(os.path.join(tmp, "clip.mp4"), "wb") as f:
+            f.write(b"\0" * 1024)
+        url = "file://" + os.path.join(tmp, "clip.mp4")
+        base_opts = {"quiet": True, "no_warnings": True, "noprogress": True, "enable_file_urls": True}
+        pool = YoutubeDLPool()
+        calls = []
+        request_opts = dict(base_opts, outtmpl=os.path.join(tmp, "first", "%(id)s.%(ext)s"),
+                            progress_hooks=[lambda d: calls.append(d["status"])],
+                            post_hooks=[lambda filename: calls.append(filename)])
+        with pool.lease(base_opts, request_opts) as ydl:
+            ydl.extract_info(url, download=True)
+        self.assertEqual(calls[-2:], ["finished", os.path.join(tmp, "first", "clip.mp4")])
+
+        calls.clear()
+        with pool.lease(base_opts, dict(base_opts, outtmpl=os.path.join(tmp, "second", "%(id)s.%(ext)s"))) as ydl:
+            ydl.extract_info(url, download=True)
+        self.assertEqual(calls, [])
+        self.assertTrue(os.path.exists(os.path.join(tmp, "second", "clip.mp4")))
+        self.assertEqual(pool.stats()["created"], 1)
+
+    def test_options_read_only_at_construction_get_a_fresh_instance(self):
+        pool = YoutubeDLPool()
+        with pool.lease(BASE_OPTS) as pooled:
+            pass
+        with pool.lease(BASE_OPTS, dict(BASE_OPTS, format="bestaudio")) as ydl:
+            self.assertIsNot(ydl, pooled)
+            self.assertEqual(ydl.params["format"], "bestaudio")
+        with pool.lease(BASE_OPTS) as ydl:
+            self.assertIs(ydl, pooled)
+        self.assertEqual((pool.stats()["created"], pool.stats()["unpooled"]), (1, 1))
+
+    def test_leases_rebind_no_youtubedl_attributes(self):
+        # The pool only goes through params and the hooks it registered, so a yt-dlp
+        # release that renames its internals cannot break it.
+        pool = YoutubeDLPool()
+        with pool.lease(BASE_OPTS) as ydl:
+            before = {name: id(value) for name, value in vars(ydl).items()}
+        with pool.lease(BASE_OPTS, dict(BASE_OPTS, outtmpl="/tmp/abc/%(title)s.%(ext)s",
+                                         progress_hooks=[lambda d: None], logger=None)) as leased:
+            self.assertIs(leased, ydl)
+        self.assertEqual({name: id(value) for name, value in vars(ydl).items()}, before)
+
+    def test_instances_are_recycled(self):
+        pool = YoutubeDLPool(max_uses=2)
+        with pool.lease(BASE_OPTS) as first:
+            pass
+        with pool.lease(BASE_OPTS):
+            pass
+        with pool.lease(BASE_OPTS) as third:
+            pass
+        self.assertIsNot(first, third)
+        self.assertEqual(pool.stats()["recycled"], 1)
+
+    def test_unexpected_errors_discard_the_instance(self):
+        pool = YoutubeDLPool()
+        with self.assertRaises(RuntimeError):
+            with pool.lease(BASE_OPTS) as first:
+                raise RuntimeError("broken")
+        with pool.lease(BASE_OPTS) as second:
+            pass
+        self.assertIsNot(first, second)
+
+        with self.assertRaises(yt_dlp.utils.DownloadError):
+            with pool.lease(BASE_OPTS) as third:
+                raise yt_dlp.utils.DownloadError("video unavailable")
+        with pool.lease(BASE_OPTS) as fourth:
+            pass
+        self.assertIs(third, fourth)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+# Adjust the path to import from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from youtube.zipstream import content_disposition, iter_zip
+
+
+class TestZipStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = {
+            "video.en.srt": ("1\n00:00:01,000 --> 00:00:02,000\nhello\n\n" * 2000).encode(),
+            "video.webp": os.urandom(200 * 1024),
+        }
+        for name, data in self.files.items():
+            with open(os.path.join(self.tmp.name, name), "wb") as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_streamed_archive_round_trips(self):
+        entries = [(os.path.join(self.tmp.name, n), n) for n in sorted(self.files)]
+        chunks = list(iter_zip(entries, chunk_size=16 * 1024))
+
+        # The archive is produced incrementally, not as a single blob.
+        self.assertGreater(len(chunks), 2)
+        self.assertLessEqual(max(len(c) for c in chunks), 64 * 1024)
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+            self.assertIsNone(zf.testzip())
+            for name, data in self.files.items():
+                self.assertEqual(zf.read(name), data)
+            self.assertEqual(zf.getinfo("video.en.srt").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(zf.getinfo("video.webp").compress_type, zipfile.ZIP_STORED)
+
+    def test_content_disposition_handles_unicode(self):
+        self.assertEqual(content_disposition("a_subtitles.zip"), 'attachment; filename="a_subtitles.zip"')
+        self.assertTrue(content_disposition("视频_subtitles.zip").startswith("attachment; filename*=utf-8''"))
+
+
+if __name__ == '__main__':
+    unittest.main()